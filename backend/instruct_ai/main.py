@@ -1,64 +1,363 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from io import BytesIO
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
 from utils.pipeline import (
-    generate_questions,
-    evaluate_answer,
+    agenerate_questions,
+    aevaluate_answer,
+    aevaluate_answers,
+    aexplain_answers,
     load_or_create_index,
     initialize_generator_agent,
-    generate_coding_question,
-    evaluate_coding_answer,
+    agenerate_coding_question,
+    adirect_generate_questions,
+    adirect_generate_coding_question,
+    afanout_generate_questions,
+    afanout_generate_coding_question,
+    aevaluate_coding_answer,
+    astream_questions,
+    astream_coding_questions,
+    llm_in_flight,
+    llm_gateway,
+    retrieval_cache,
 )
 from utils.schema import *
+from utils.agent_pool import AgentPool
+from utils.course_registry import Course, CourseRegistry
+from utils.ingestion import load_index
+from utils.vector_store import build_vector_store
+from utils.embedding_cache import CachedEmbedding
+from utils.sandbox import shutdown_sandbox_pool
+from utils.question_bank import QuestionBank, QuestionBankRefiller, bucket_key
+from utils.response_cache import ResponseCache, request_key
+from utils.singleflight import SingleFlight
+from utils.json_repair import repair_stats
+from utils.usage import track_usage, usage_stats
+from utils.metrics import observe_request, render_metrics, request_timing, span
+from utils.llm_gateway import LLMOverloaded, Priority, llm_priority, set_llm_priority
+from utils.course_ingest import (
+    IngestionJobStore,
+    IngestionRunner,
+    course_slug,
+    new_job_id,
+)
+from utils.config import (
+    QUESTION_BANK_ENABLED,
+    QUESTION_BANK_IDLE_MAX_IN_FLIGHT,
+    RESPONSE_CACHE_ENABLED,
+    PIPELINE_MODE,
+    UPLOAD_DIR,
+    UPLOAD_CHUNK_BYTES,
+    UPLOAD_MAX_BYTES,
+)
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
 from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_index.core import StorageContext
+from llama_index.core import StorageContext, Settings
 from pinecone import Pinecone
 import os
+import json
+import asyncio
+import logging
 
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refiller = None
+    if question_bank is not None:
+        refiller = QuestionBankRefiller(
+            question_bank,
+            generate=refill_questions,
+            is_idle=lambda: llm_in_flight() < QUESTION_BANK_IDLE_MAX_IN_FLIGHT,
+        )
+        refiller.start()
+    courses.start()
+    yield
+    await courses.stop()
+    if refiller is not None:
+        await refiller.stop()
+    ingestion_runner.shutdown()
+    await shutdown_sandbox_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
 
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """
+    Record request latency and report the time spent in each pipeline stage
+    in a Server-Timing header.
+    """
+    with request_timing() as timings:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    observe_request(
+        request.method,
+        route.path if route is not None else "unmatched",
+        response.status_code,
+        timings,
+    )
+    response.headers["Server-Timing"] = timings.server_timing()
+    return response
+
+
 PDF_PATH = "data/SE_Merged.pdf"
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-pinecone_index = pc.Index("instructor-ai")
-documents = SimpleDirectoryReader(input_files=[PDF_PATH]).load_data()
-vector_store = PineconeVectorStore(pinecone_index=pinecone_index)
-storage_context = StorageContext.from_defaults(vector_store=vector_store)
-index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-generator_agent = initialize_generator_agent(index)
+vector_store = build_vector_store()
+index = load_index([PDF_PATH], vector_store)
+agent_pool = AgentPool(lambda: initialize_generator_agent(index))
+courses = CourseRegistry(Course(None, index, agent_pool))
+question_bank = QuestionBank() if QUESTION_BANK_ENABLED else None
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+generation_flights = SingleFlight()
+ingestion_jobs = IngestionJobStore()
+ingestion_runner = IngestionRunner(ingestion_jobs)
+
+
+def pipeline_mode(request):
+    return request.mode or PipelineMode(PIPELINE_MODE)
+
+
+def course_params(request, params):
+    """
+    Question bank bucket params, with the course when it is not the default.
+    """
+    if request.course_id:
+        params["course_id"] = request.course_id
+    return params
+
+
+def skip_cache(request):
+    # A caller the question bank tracks has already been offered everything
+    # it has not seen, so a cached response would only repeat questions.
+    return request.fresh or (question_bank is not None and request.client_id)
+
+
+async def cached(key, compute, fresh=False):
+    """
+    Run compute through the response cache, when it is enabled, with
+    concurrent identical requests sharing a single in-flight computation.
+    """
+    if response_cache is None:
+        return await generation_flights.do(key, compute)
+    return await generation_flights.do(
+        f"{key}:fresh" if fresh else key,
+        lambda: response_cache.get_or_compute(key, compute, fresh=fresh),
+    )
+
+
+async def refill_questions(kind, params, count):
+    """
+    Generate questions for a question bank bucket, behind every LLM call a
+    user is waiting for.
+    """
+    course = await courses.get(params.get("course_id"))
+    with llm_priority(Priority.BULK):
+        async with course.agent_pool.agent() as agent:
+            if kind == "coding":
+                generated = await agenerate_coding_question(
+                    agent,
+                    programming_language=params["programming_language"],
+                    difficulty=DifficultyLevel(params["difficulty"]),
+                    topic=params.get("topic"),
+                    num_questions=min(count, 10),
+                )
+            else:
+                generated = await agenerate_questions(
+                    agent, params["topic"], params["question_type"], count
+                )
+    return generated["questions"]
+
+
+async def grading_priority():
+    """
+    Queue the request's LLM calls ahead of question generation.
+    """
+    set_llm_priority(Priority.GRADING)
+
+
+def check_llm_capacity():
+    # A streamed response cannot turn into a 429 once it has started.
+    if llm_gateway is not None:
+        llm_gateway.check()
 
 
 @app.post("/generate_questions", response_model=QuestionsResponse)
 async def api_generate_questions(request: QuestionRequest):
-    questions = generate_questions(
-        generator_agent, request.topic, request.question_type, request.num_questions
+    course = await courses.get(request.course_id)
+    if question_bank is not None:
+        bucket = bucket_key(
+            "questions",
+            request.topic,
+            request.question_type,
+            course_id=request.course_id,
+        )
+        await question_bank.arecord_demand(
+            bucket,
+            "questions",
+            course_params(
+                request,
+                {"topic": request.topic, "question_type": request.question_type},
+            ),
+        )
+        if not request.fresh:
+            banked = await question_bank.atake(
+                bucket, request.num_questions, request.client_id
+            )
+            if banked is not None:
+                return {"questions": banked}
+
+    mode = pipeline_mode(request)
+
+    async def generate():
+        with track_usage(f"questions:{mode.value}"):
+            if mode == PipelineMode.DIRECT:
+                return await adirect_generate_questions(
+                    course.index,
+                    request.topic,
+                    request.question_type,
+                    request.num_questions,
+                )
+            if mode == PipelineMode.FANOUT:
+                return await afanout_generate_questions(
+                    course.index,
+                    request.topic,
+                    request.question_type,
+                    request.num_questions,
+                )
+            async with course.agent_pool.agent() as agent:
+                return await agenerate_questions(
+                    agent, request.topic, request.question_type, request.num_questions
+                )
+
+    key = request_key(
+        "questions",
+        topic=request.topic,
+        question_type=request.question_type,
+        num_questions=request.num_questions,
+        mode=mode,
+        course_id=request.course_id,
     )
+    questions = await cached(key, generate, fresh=skip_cache(request))
+    if question_bank is not None:
+        await question_bank.aadd(
+            bucket, questions["questions"], served=True, served_to=request.client_id
+        )
     return questions
 
 
-@app.post("/evaluate_answer", response_model=EvaluationResponse)
+@app.post(
+    "/evaluate_answer",
+    response_model=EvaluationResponse,
+    dependencies=[Depends(grading_priority)],
+)
 async def api_evaluate_answer(submission: AnswerSubmission):
-    evaluation = evaluate_answer(
-        submission.question, submission.user_answer, submission.model_answer
+    evaluation = await aevaluate_answer(
+        submission.question,
+        submission.user_answer,
+        submission.model_answer,
+        options=submission.options,
+        question_type=submission.question_type,
     )
     return evaluation
 
 
-@app.post("/upload_file/")
-async def upload_file(request: FileSchema = File(...)):
-    if request.content_type != "application/pdf":
+@app.post(
+    "/evaluate_answers",
+    response_model=BatchEvaluationResponse,
+    dependencies=[Depends(grading_priority)],
+)
+async def api_evaluate_answers(request: BatchEvaluationRequest):
+    """
+    Evaluate a whole set of answers in one request. Items that could not be
+    graded carry an error instead of failing the batch.
+    """
+    results = await aevaluate_answers([answer.dict() for answer in request.answers])
+    failed = sum(1 for result in results if result["error"] is not None)
+    return BatchEvaluationResponse(
+        results=results, succeeded=len(results) - failed, failed=failed
+    )
+
+
+@app.post(
+    "/explain_answers",
+    response_model=ExplanationResponse,
+    dependencies=[Depends(grading_priority)],
+)
+async def api_explain_answers(request: ExplanationRequest):
+    """
+    Explain a batch of already graded MCQ answers in one LLM call.
+    """
+    return await aexplain_answers([answer.dict() for answer in request.answers])
+
+
+async def save_upload(file: UploadFile, path: str) -> int:
+    """
+    Copy an uploaded PDF to path in UPLOAD_CHUNK_BYTES pieces, so it is never
+    held in memory whole. Returns its size.
+    """
+    size = 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                if size == 0 and not chunk.startswith(b"%PDF-"):
+                    raise HTTPException(
+                        status_code=400, detail="The file is not a PDF."
+                    )
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"PDFs larger than {UPLOAD_MAX_BYTES} bytes are not accepted.",
+                    )
+                await asyncio.to_thread(out.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="The file is empty.")
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return size
+
+
+@app.post("/upload_file/", response_model=IngestionJobResponse, status_code=202)
+async def upload_file(course_name: str = Form(...), file: UploadFile = File(...)):
+    """
+    Accept a course PDF and queue it for ingestion into the course's own
+    index. Poll /ingestion_jobs/{job_id} for progress.
+    """
+    if file.content_type != "application/pdf":
         raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
-    contents = await request.read()
-    pdf_io = BytesIO(contents)
-    return {"filename": request.course_name}
+    try:
+        course_id = course_slug(course_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job_id = new_job_id()
+    path = os.path.join(UPLOAD_DIR, f"{job_id}.pdf")
+    size = await save_upload(file, path)
+    filename = os.path.basename(file.filename or f"{job_id}.pdf")
+    job = await ingestion_jobs.acreate(job_id, course_id, course_name, filename, size)
+    ingestion_runner.submit(job_id, course_id, filename, path)
+    return job
+
+
+@app.get("/ingestion_jobs/{job_id}", response_model=IngestionJobResponse)
+async def api_ingestion_job(job_id: str):
+    job = await ingestion_jobs.aget(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job.")
+    return job
 
 
 from fastapi import FastAPI, HTTPException
@@ -73,49 +372,99 @@ async def api_generate_coding_questions(request: CodingQuestionRequest):
     """
     Generate coding questions based on specified parameters.
     """
+    course = await courses.get(request.course_id)
     try:
-        raw_questions = generate_coding_question(
-            generator_agent,
-            programming_language=request.programming_language,
-            difficulty=request.difficulty,
-            topic=request.topic,
-            num_questions=request.num_questions,
-        )
+        raw_questions = None
+        if question_bank is not None:
+            bucket = bucket_key(
+                "coding",
+                request.topic,
+                request.difficulty.value,
+                request.programming_language,
+                course_id=request.course_id,
+            )
+            await question_bank.arecord_demand(
+                bucket,
+                "coding",
+                course_params(
+                    request,
+                    {
+                        "programming_language": request.programming_language,
+                        "difficulty": request.difficulty.value,
+                        "topic": request.topic,
+                    },
+                ),
+            )
+            if not request.fresh:
+                banked = await question_bank.atake(
+                    bucket, request.num_questions, request.client_id
+                )
+                if banked is not None:
+                    raw_questions = {"questions": banked}
+
+        if raw_questions is None:
+
+            mode = pipeline_mode(request)
+
+            async def generate():
+                with track_usage(f"coding_questions:{mode.value}"):
+                    if mode == PipelineMode.DIRECT:
+                        return await adirect_generate_coding_question(
+                            course.index,
+                            programming_language=request.programming_language,
+                            difficulty=request.difficulty,
+                            topic=request.topic,
+                            num_questions=request.num_questions,
+                        )
+                    if mode == PipelineMode.FANOUT:
+                        return await afanout_generate_coding_question(
+                            course.index,
+                            programming_language=request.programming_language,
+                            difficulty=request.difficulty,
+                            topic=request.topic,
+                            num_questions=request.num_questions,
+                        )
+                    async with course.agent_pool.agent() as agent:
+                        return await agenerate_coding_question(
+                            agent,
+                            programming_language=request.programming_language,
+                            difficulty=request.difficulty,
+                            topic=request.topic,
+                            num_questions=request.num_questions,
+                        )
+
+            key = request_key(
+                "coding_questions",
+                programming_language=request.programming_language,
+                difficulty=request.difficulty,
+                topic=request.topic,
+                num_questions=request.num_questions,
+                mode=mode,
+                course_id=request.course_id,
+            )
+            raw_questions = await cached(key, generate, fresh=skip_cache(request))
+            if question_bank is not None and isinstance(raw_questions, dict):
+                await question_bank.aadd(
+                    bucket,
+                    raw_questions.get("questions", []),
+                    served=True,
+                    served_to=request.client_id,
+                )
 
         # Validate and transform the raw response
         if not isinstance(raw_questions, dict) or "questions" not in raw_questions:
             raise ValueError("Invalid response format from question generator")
 
         # Transform and validate each question
-        validated_questions = []
-        for q in raw_questions["questions"]:
-            # Ensure difficulty is in the correct format
-            if isinstance(q["difficulty"], str):
-                q["difficulty"] = {"level": q["difficulty"], "explanation": None}
-            elif isinstance(q["difficulty"], dict) and "level" not in q["difficulty"]:
-                q["difficulty"] = {
-                    "level": request.difficulty.value,
-                    "explanation": None,
-                }
-
-            # Ensure test cases are in the correct format
-            formatted_test_cases = []
-            for tc in q["test_cases"]:
-                if isinstance(tc, dict) and "input" in tc and "expected" in tc:
-                    formatted_test_cases.append(tc)
-                else:
-                    # Handle malformed test cases
-                    raise ValueError(f"Invalid test case format: {tc}")
-            q["test_cases"] = formatted_test_cases
-
-            # Initialize optional fields if they don't exist
-            q["hints"] = q.get("hints", [])
-            q["learning_points"] = q.get("learning_points", [])
-
-            validated_questions.append(q)
-
-        return CodingQuestionsResponse(questions=validated_questions)
+        with span("transform"):
+            validated_questions = [
+                normalize_coding_question(q, request.difficulty)
+                for q in raw_questions["questions"]
+            ]
+            return CodingQuestionsResponse(questions=validated_questions)
 
+    except LLMOverloaded:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -124,36 +473,188 @@ async def api_generate_coding_questions(request: CodingQuestionRequest):
         )
 
 
-@app.post("/evaluate_coding_answer", response_model=CodingEvaluationResponse)
+def normalize_coding_question(q, difficulty):
+    """
+    Coerce a generated coding question into the CodingQuestion shape.
+    """
+    # Ensure difficulty is in the correct format
+    if isinstance(q["difficulty"], str):
+        q["difficulty"] = {"level": q["difficulty"], "explanation": None}
+    elif isinstance(q["difficulty"], dict) and "level" not in q["difficulty"]:
+        q["difficulty"] = {
+            "level": difficulty.value,
+            "explanation": None,
+        }
+
+    # Ensure test cases are in the correct format
+    formatted_test_cases = []
+    for tc in q["test_cases"]:
+        if isinstance(tc, dict) and "input" in tc and "expected" in tc:
+            formatted_test_cases.append(tc)
+        else:
+            # Handle malformed test cases
+            raise ValueError(f"Invalid test case format: {tc}")
+    q["test_cases"] = formatted_test_cases
+
+    # Initialize optional fields if they don't exist
+    q["hints"] = q.get("hints", [])
+    q["learning_points"] = q.get("learning_points", [])
+    return q
+
+
+def stream_events(events, format):
+    """
+    Serialise an async iterator of event dicts as NDJSON or server-sent events.
+    """
+
+    async def body():
+        async for event in events:
+            data = json.dumps(event)
+            if format == StreamFormat.SSE:
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+            else:
+                yield data + "\n"
+
+    media_type = (
+        "text/event-stream" if format == StreamFormat.SSE else "application/x-ndjson"
+    )
+    return StreamingResponse(
+        body(), media_type=media_type, headers={"Cache-Control": "no-cache"}
+    )
+
+
+async def question_events(questions, validate, bucket, client_id):
+    """
+    Turn streamed questions into "question" events, ending with "done" or
+    "error". Everything streamed is banked once the stream finishes.
+    """
+    emitted = []
+    try:
+        async for question in questions:
+            try:
+                question = validate(question)
+            except (ValueError, TypeError, KeyError) as e:
+                logger.warning("Dropping invalid streamed question: %s", e)
+                continue
+            emitted.append(question)
+            yield {"type": "question", "index": len(emitted) - 1, "question": question}
+    except HTTPException as e:
+        yield {"type": "error", "detail": e.detail}
+        return
+    except Exception as e:
+        yield {"type": "error", "detail": f"Failed to generate questions: {e}"}
+        return
+    if question_bank is not None and emitted:
+        await question_bank.aadd(bucket, emitted, served=True, served_to=client_id)
+    yield {"type": "done", "count": len(emitted)}
+
+
+def validate_question(question):
+    model = MCQQuestion if question.get("options") else SubjectiveQuestion
+    return model(**question).dict()
+
+
+@app.post("/generate_questions/stream")
+async def api_stream_questions(
+    request: QuestionRequest, format: StreamFormat = StreamFormat.NDJSON
+):
+    """
+    Stream generated questions one at a time as the LLM writes them.
+    """
+    course = await courses.get(request.course_id)
+    check_llm_capacity()
+    bucket = bucket_key(
+        "questions", request.topic, request.question_type, course_id=request.course_id
+    )
+
+    async def questions():
+        async with course.agent_pool.agent() as agent:
+            async for question in astream_questions(
+                agent, request.topic, request.question_type, request.num_questions
+            ):
+                yield question
+
+    return stream_events(
+        question_events(questions(), validate_question, bucket, request.client_id),
+        format,
+    )
+
+
+@app.post("/generate_coding_questions/stream")
+async def api_stream_coding_questions(
+    request: CodingQuestionRequest, format: StreamFormat = StreamFormat.NDJSON
+):
+    """
+    Stream generated coding questions one at a time as they validate.
+    """
+    course = await courses.get(request.course_id)
+    check_llm_capacity()
+    bucket = bucket_key(
+        "coding",
+        request.topic,
+        request.difficulty.value,
+        request.programming_language,
+        course_id=request.course_id,
+    )
+
+    async def questions():
+        async with course.agent_pool.agent() as agent:
+            async for question in astream_coding_questions(
+                agent,
+                programming_language=request.programming_language,
+                difficulty=request.difficulty,
+                topic=request.topic,
+                num_questions=request.num_questions,
+            ):
+                yield question
+
+    def validate(question):
+        question = normalize_coding_question(question, request.difficulty)
+        return CodingQuestion(**question).dict()
+
+    return stream_events(
+        question_events(questions(), validate, bucket, request.client_id), format
+    )
+
+
+@app.post(
+    "/evaluate_coding_answer",
+    response_model=CodingEvaluationResponse,
+    dependencies=[Depends(grading_priority)],
+)
 async def api_evaluate_coding_answer(submission: CodingAnswerSubmission):
     """
     Evaluate a submitted coding solution against test cases.
     """
     try:
-        raw_evaluation = evaluate_coding_answer(
-            generator_agent,
+        raw_evaluation = await aevaluate_coding_answer(
+            agent_pool,
             question=submission.question,
             user_code=submission.user_code,
             programming_language=submission.programming_language,
+            mode=submission.mode.value,
         )
 
         # Transform test results into the correct format
-        if isinstance(raw_evaluation.get("test_results"), list):
-            formatted_test_results = []
-            for result in raw_evaluation["test_results"]:
-                if isinstance(result, dict):
-                    test_result = TestResult(
-                        passed=result.get("passed", False),
-                        input=result.get("input", {}),
-                        expected=result.get("expected"),
-                        actual=result.get("actual"),
-                        error=result.get("error"),
-                    )
-                    formatted_test_results.append(test_result)
-            raw_evaluation["test_results"] = formatted_test_results
-
-        return CodingEvaluationResponse(**raw_evaluation)
+        with span("transform"):
+            if isinstance(raw_evaluation.get("test_results"), list):
+                formatted_test_results = []
+                for result in raw_evaluation["test_results"]:
+                    if isinstance(result, dict):
+                        test_result = TestResult(
+                            passed=result.get("passed", False),
+                            input=result.get("input", {}),
+                            expected=result.get("expected"),
+                            actual=result.get("actual"),
+                            error=result.get("error"),
+                            duration_ms=result.get("duration_ms"),
+                        )
+                        formatted_test_results.append(test_result)
+                raw_evaluation["test_results"] = formatted_test_results
+            return CodingEvaluationResponse(**raw_evaluation)
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -162,6 +663,53 @@ async def api_evaluate_coding_answer(submission: CodingAnswerSubmission):
         )
 
 
+@app.get("/cache_stats")
+async def api_cache_stats():
+    stats = {}
+    if isinstance(Settings.embed_model, CachedEmbedding):
+        stats["embeddings"] = await Settings.embed_model.astats()
+    if response_cache is not None:
+        stats["responses"] = response_cache.stats()
+    if retrieval_cache is not None:
+        stats["retrieval"] = retrieval_cache.stats()
+    stats["coalesced_generations"] = generation_flights.stats()
+    stats["courses"] = courses.stats()
+    stats["json_repair"] = repair_stats.stats()
+    if question_bank is not None:
+        stats["question_bank"] = await question_bank.astats()
+    return stats
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def api_metrics():
+    """
+    Prometheus metrics of this worker.
+    """
+    return PlainTextResponse(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/pipeline_stats")
+async def api_pipeline_stats():
+    """
+    Latency, LLM calls and tokens per generated response, by endpoint and
+    pipeline mode, for comparing the agent and direct modes.
+    """
+    return usage_stats.stats()
+
+
+@app.get("/llm_gateway_stats")
+async def api_llm_gateway_stats():
+    """
+    Rate limit budgets, queue depth by priority and refusals of the LLM
+    gateway of this worker.
+    """
+    if llm_gateway is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_gateway.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Callable, List
+
+from utils.config import AGENT_POOL_SIZE, AGENT_POOL_REUSE, AGENT_POOL_RESET
+
+
+class AgentPool:
+    """
+    Hands out generator agents one request at a time so concurrent requests
+    never share (or inherit) an agent's chat memory.
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        size: int = AGENT_POOL_SIZE,
+        reuse: bool = AGENT_POOL_REUSE,
+        reset: bool = AGENT_POOL_RESET,
+    ):
+        if size < 1:
+            raise ValueError("Agent pool size must be at least 1")
+        self._factory = factory
+        self._reuse = reuse
+        self._reset = reset
+        self._idle: List = []
+        self._slots = asyncio.Semaphore(size)
+        self.size = size
+        self.created = 0
+
+    def _checkout(self):
+        if self._reuse and self._idle:
+            return self._idle.pop()
+        self.created += 1
+        return self._factory()
+
+    def _checkin(self, agent):
+        if not self._reuse:
+            return
+        if self._reset:
+            agent.reset()
+        self._idle.append(agent)
+
+    @asynccontextmanager
+    async def agent(self):
+        """
+        Check an agent out of the pool for the duration of one request.
+        """
+        async with self._slots:
+            agent = self._checkout()
+            try:
+                yield agent
+            finally:
+                self._checkin(agent)
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle), "created": self.created}
@@ -0,0 +1,156 @@
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.config import BM25_K1, BM25_B
+
+INDEX_VERSION = 1
+
+_STOPWORDS = frozenset(
+    """a an and are as at be been but by can do does for from has have how in
+    into is it its of on or that the their then there these this those to was
+    were what when where which who why will with""".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        word
+        for word in re.findall(r"[a-z0-9]+", text.lower())
+        if word not in _STOPWORDS
+    ]
+
+
+def bm25_path(manifest_path: str) -> str:
+    """
+    Where the BM25 index of the chunks described by a manifest is kept.
+    """
+    return os.path.join(os.path.dirname(manifest_path) or ".", "bm25.json")
+
+
+class BM25Index:
+    """
+    Inverted index over chunk text, scored with Okapi BM25.
+
+    Documents are the same chunks (and ids) as in the vector store, grouped
+    by source file so a changed file can be replaced as a whole. Postings are
+    persisted with the documents, so loading does not re-tokenize.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.docs: List[Dict[str, Any]] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._total_length = 0
+
+    def sources(self) -> set:
+        return {doc["source"] for doc in self.docs}
+
+    def add(self, source: str, nodes: List) -> None:
+        for node in nodes:
+            self._add_doc(
+                {
+                    "id": node.node_id,
+                    "source": source,
+                    "text": node.get_content(),
+                    "metadata": node.metadata,
+                }
+            )
+
+    def _add_doc(self, doc: Dict[str, Any]) -> None:
+        counts = Counter(tokenize(doc["text"]))
+        doc["length"] = sum(counts.values())
+        row = len(self.docs)
+        self.docs.append(doc)
+        self._total_length += doc["length"]
+        for term, frequency in counts.items():
+            self._postings.setdefault(term, []).append((row, frequency))
+
+    def remove_source(self, source: str) -> None:
+        if not any(doc["source"] == source for doc in self.docs):
+            return
+        docs = [doc for doc in self.docs if doc["source"] != source]
+        self.docs, self._postings, self._total_length = [], {}, 0
+        for doc in docs:
+            self._add_doc(doc)
+
+    def search(self, query: str, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Top k documents for query, best first, as (document, score) pairs.
+        """
+        if not self.docs or k <= 0:
+            return []
+        n = len(self.docs)
+        average_length = self._total_length / n
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, frequency in postings:
+                norm = self.k1 * (
+                    1 - self.b + self.b * self.docs[row]["length"] / average_length
+                )
+                scores[row] = scores.get(row, 0.0) + idf * frequency * (self.k1 + 1) / (
+                    frequency + norm
+                )
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.docs[row], score) for row, score in best]
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "docs": self.docs,
+                    "postings": self._postings,
+                },
+                f,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            return index
+        index.docs = data["docs"]
+        index._postings = {
+            term: [tuple(posting) for posting in postings]
+            for term, postings in data["postings"].items()
+        }
+        index._total_length = sum(doc["length"] for doc in index.docs)
+        return index
+
+
+_loaded: Dict[str, tuple] = {}
+
+
+def load_bm25(path: str) -> Optional[BM25Index]:
+    """
+    The BM25 index at path, re-read only when the file changes, or None if
+    there is none yet.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    generation = (stat.st_ino, stat.st_mtime_ns)
+    cached = _loaded.get(path)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    index = BM25Index.load(path)
+    _loaded[path] = (generation, index)
+    return index
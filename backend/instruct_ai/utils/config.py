@@ -0,0 +1,223 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Maximum number of LLM / agent calls a single worker keeps in flight at once.
+LLM_MAX_CONCURRENCY = _env_int("LLM_MAX_CONCURRENCY", 32)
+
+# Generator agent pool: how many agents may be checked out at once, whether
+# returned agents are kept for reuse, and whether their memory is cleared on
+# return so no chat history leaks between requests.
+AGENT_POOL_SIZE = _env_int("AGENT_POOL_SIZE", LLM_MAX_CONCURRENCY)
+AGENT_POOL_REUSE = _env_bool("AGENT_POOL_REUSE", True)
+AGENT_POOL_RESET = _env_bool("AGENT_POOL_RESET", True)
+
+# Local state (ingestion manifest, caches, local indexes) lives under here.
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+
+# Vector store backend: "pinecone" (remote, default) or "local" (memory-mapped
+# matrix on disk, see utils/vector_store.py).
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "instructor-ai")
+LOCAL_VECTOR_STORE_DIR = os.getenv(
+    "LOCAL_VECTOR_STORE_DIR", os.path.join(STORAGE_DIR, "saved_index")
+)
+# Store local vectors as int8 with a per-row scale (4x smaller, slightly lossy).
+LOCAL_VECTOR_STORE_QUANTIZE = _env_bool("LOCAL_VECTOR_STORE_QUANTIZE", False)
+
+# The manifest describes what is in a particular vector store, so the local
+# backend keeps it next to its vectors.
+INGESTION_MANIFEST_PATH = os.getenv(
+    "INGESTION_MANIFEST_PATH",
+    os.path.join(
+        LOCAL_VECTOR_STORE_DIR if VECTOR_STORE_BACKEND == "local" else STORAGE_DIR,
+        "ingestion_manifest.json",
+    ),
+)
+
+# Persistent embedding cache in front of the configured embed model.
+EMBEDDING_CACHE_ENABLED = _env_bool("EMBEDDING_CACHE_ENABLED", True)
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH", os.path.join(STORAGE_DIR, "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_ENTRIES = _env_int("EMBEDDING_CACHE_MAX_ENTRIES", 200_000)
+
+# Limits applied to every sandboxed test-case run of submitted code.
+SANDBOX_CPU_SECONDS = _env_int("SANDBOX_CPU_SECONDS", 2)
+SANDBOX_WALL_SECONDS = _env_float("SANDBOX_WALL_SECONDS", 5.0)
+SANDBOX_MEMORY_MB = _env_int("SANDBOX_MEMORY_MB", 256)
+
+# Warm sandbox worker pool: number of pre-forked workers, runs before a worker
+# is recycled, and how many test cases may wait before submissions get a 503.
+SANDBOX_POOL_SIZE = _env_int("SANDBOX_POOL_SIZE", os.cpu_count() or 1)
+SANDBOX_MAX_RUNS_PER_WORKER = _env_int("SANDBOX_MAX_RUNS_PER_WORKER", 500)
+SANDBOX_MAX_QUEUE_DEPTH = _env_int("SANDBOX_MAX_QUEUE_DEPTH", 1000)
+
+# Sandbox isolation (utils/sandbox_worker.py): each worker runs in its own
+# user, mount, PID and network namespaces, with a read-only view of the
+# system's programs and libraries, SANDBOX_READONLY_PATHS (separated like
+# PATH) and the toolchains, and no network. Each job gets its own /tmp of
+# SANDBOX_TMP_MB and runs as an unprivileged uid, SANDBOX_UID plus the
+# worker's index when the server runs as root, with at most
+# SANDBOX_MAX_PROCESSES processes and threads. Only disable isolation on
+# development machines without Linux namespaces.
+SANDBOX_ISOLATION = _env_bool("SANDBOX_ISOLATION", True)
+SANDBOX_UID = _env_int("SANDBOX_UID", 100_000)
+SANDBOX_MAX_PROCESSES = _env_int("SANDBOX_MAX_PROCESSES", 64)
+SANDBOX_TMP_MB = _env_int("SANDBOX_TMP_MB", 64)
+SANDBOX_READONLY_PATHS = [
+    path for path in os.getenv("SANDBOX_READONLY_PATHS", "").split(os.pathsep) if path
+]
+
+# Compiled-language runners (utils/runners.py): built test harnesses are cached
+# on disk by a hash of their source, so resubmissions skip the compile step.
+ARTIFACT_CACHE_DIR = os.getenv(
+    "ARTIFACT_CACHE_DIR", os.path.join(STORAGE_DIR, "artifacts")
+)
+ARTIFACT_CACHE_MAX_ENTRIES = _env_int("ARTIFACT_CACHE_MAX_ENTRIES", 2000)
+COMPILE_TIMEOUT_SECONDS = _env_float("COMPILE_TIMEOUT_SECONDS", 30.0)
+
+# Batch answer evaluation: subjective answers are packed into one grading
+# prompt until it reaches roughly this many tokens (or items), and answers a
+# batch failed to grade are retried one at a time this many times.
+EVAL_BATCH_TOKEN_BUDGET = _env_int("EVAL_BATCH_TOKEN_BUDGET", 3000)
+EVAL_BATCH_MAX_ITEMS = _env_int("EVAL_BATCH_MAX_ITEMS", 10)
+EVAL_BATCH_ITEM_RETRIES = _env_int("EVAL_BATCH_ITEM_RETRIES", 2)
+
+# Subjective answer pre-grading (utils/grading.py). Answers whose embedding is
+# at least PREGRADE_HIGH_SIMILARITY to the model answer and that cover enough
+# of its key terms are marked correct; empty answers and answers at or below
+# PREGRADE_LOW_SIMILARITY are marked incorrect, the latter with feedback that
+# calls them too short when they have fewer than PREGRADE_MIN_WORDS words.
+# Everything in between is escalated to the LLM.
+PREGRADE_ENABLED = _env_bool("PREGRADE_ENABLED", True)
+PREGRADE_HIGH_SIMILARITY = _env_float("PREGRADE_HIGH_SIMILARITY", 0.92)
+PREGRADE_LOW_SIMILARITY = _env_float("PREGRADE_LOW_SIMILARITY", 0.35)
+PREGRADE_MIN_COVERAGE = _env_float("PREGRADE_MIN_COVERAGE", 0.6)
+PREGRADE_MIN_WORDS = _env_int("PREGRADE_MIN_WORDS", 2)
+
+# Pre-generated question bank (utils/question_bank.py). Popular buckets asked
+# for within the demand window are refilled in batches, while the LLM is idle,
+# whenever fewer than the low-water mark of never-served questions remain.
+QUESTION_BANK_ENABLED = _env_bool("QUESTION_BANK_ENABLED", True)
+QUESTION_BANK_PATH = os.getenv(
+    "QUESTION_BANK_PATH", os.path.join(STORAGE_DIR, "question_bank.sqlite3")
+)
+QUESTION_BANK_LOW_WATER = _env_int("QUESTION_BANK_LOW_WATER", 20)
+QUESTION_BANK_REFILL_BATCH = _env_int("QUESTION_BANK_REFILL_BATCH", 10)
+QUESTION_BANK_REFILL_INTERVAL = _env_float("QUESTION_BANK_REFILL_INTERVAL", 30.0)
+QUESTION_BANK_POPULAR_BUCKETS = _env_int("QUESTION_BANK_POPULAR_BUCKETS", 20)
+QUESTION_BANK_DEMAND_WINDOW = _env_float("QUESTION_BANK_DEMAND_WINDOW", 24 * 3600.0)
+# The LLM counts as idle while fewer than this many calls are in flight.
+QUESTION_BANK_IDLE_MAX_IN_FLIGHT = _env_int(
+    "QUESTION_BANK_IDLE_MAX_IN_FLIGHT", max(1, LLM_MAX_CONCURRENCY // 4)
+)
+
+# Response cache for question generation (utils/response_cache.py): entries
+# live for the TTL, the in-process tier is capped by serialised size, and a
+# SQLite tier under STORAGE_DIR is shared by all workers on the host.
+RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+RESPONSE_CACHE_TTL_SECONDS = _env_float("RESPONSE_CACHE_TTL_SECONDS", 3600.0)
+RESPONSE_CACHE_MAX_BYTES = _env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+RESPONSE_CACHE_PATH = os.getenv(
+    "RESPONSE_CACHE_PATH", os.path.join(STORAGE_DIR, "response_cache.sqlite3")
+)
+RESPONSE_CACHE_MAX_DISK_ENTRIES = _env_int("RESPONSE_CACHE_MAX_DISK_ENTRIES", 50_000)
+
+# When an LLM response is truncated or has invalid items, ask again for only
+# the missing items at most this many times (0 disables re-asking).
+JSON_REASK_MAX_ATTEMPTS = _env_int("JSON_REASK_MAX_ATTEMPTS", 1)
+
+# Question generation pipeline: "agent" runs the ReAct agent with the study
+# material tool, "direct" does one top-k retrieval and one completion, and
+# "fanout" shares one retrieval between concurrent smaller completions. Can be
+# overridden per request.
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "agent").lower()
+DIRECT_RAG_TOP_K = _env_int("DIRECT_RAG_TOP_K", 10)
+
+# Retrieval cache (utils/retrieval_cache.py): top-k chunks and synthesised
+# study_material_query answers, keyed by normalised query, top_k and the
+# ingestion index version, so a re-ingest invalidates them automatically.
+RETRIEVAL_CACHE_ENABLED = _env_bool("RETRIEVAL_CACHE_ENABLED", True)
+RETRIEVAL_CACHE_TTL_SECONDS = _env_float("RETRIEVAL_CACHE_TTL_SECONDS", 7 * 24 * 3600.0)
+RETRIEVAL_CACHE_MAX_BYTES = _env_int("RETRIEVAL_CACHE_MAX_BYTES", 32 * 1024 * 1024)
+RETRIEVAL_CACHE_PATH = os.getenv(
+    "RETRIEVAL_CACHE_PATH", os.path.join(STORAGE_DIR, "retrieval_cache.sqlite3")
+)
+
+# Fan-out generation: large requests are split into concurrent shards of this
+# many questions (at most FANOUT_MAX_SHARDS) over one shared retrieval, and
+# merged questions at least FANOUT_DEDUPE_SIMILARITY alike are dropped.
+FANOUT_QUESTIONS_PER_SHARD = _env_int("FANOUT_QUESTIONS_PER_SHARD", 3)
+FANOUT_CODING_QUESTIONS_PER_SHARD = _env_int("FANOUT_CODING_QUESTIONS_PER_SHARD", 1)
+FANOUT_MAX_SHARDS = _env_int("FANOUT_MAX_SHARDS", 5)
+FANOUT_DEDUPE_SIMILARITY = _env_float("FANOUT_DEDUPE_SIMILARITY", 0.7)
+
+# Course uploads (utils/course_ingest.py): PDFs are streamed to UPLOAD_DIR in
+# UPLOAD_CHUNK_BYTES pieces, then parsed page by page and embedded in batches
+# of INGESTION_EMBED_BATCH chunks by a pool of background processes. Each
+# course gets its own vector store namespace and manifest under COURSES_DIR.
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(STORAGE_DIR, "uploads"))
+UPLOAD_CHUNK_BYTES = _env_int("UPLOAD_CHUNK_BYTES", 1024 * 1024)
+UPLOAD_MAX_BYTES = _env_int("UPLOAD_MAX_BYTES", 200 * 1024 * 1024)
+COURSES_DIR = os.getenv("COURSES_DIR", os.path.join(STORAGE_DIR, "courses"))
+INGESTION_JOBS_PATH = os.getenv(
+    "INGESTION_JOBS_PATH", os.path.join(STORAGE_DIR, "ingestion_jobs.sqlite3")
+)
+INGESTION_MAX_WORKERS = _env_int("INGESTION_MAX_WORKERS", 1)
+INGESTION_EMBED_BATCH = _env_int("INGESTION_EMBED_BATCH", 64)
+
+# Course registry (utils/course_registry.py): course indexes and their agents
+# are loaded on first use and kept in an LRU bounded by an estimate of their
+# memory, and dropped after COURSE_IDLE_SECONDS without a request.
+COURSE_CACHE_MAX_BYTES = _env_int("COURSE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+COURSE_BASE_BYTES = _env_int("COURSE_BASE_BYTES", 8 * 1024 * 1024)
+COURSE_IDLE_SECONDS = _env_float("COURSE_IDLE_SECONDS", 1800.0)
+COURSE_SWEEP_INTERVAL = _env_float("COURSE_SWEEP_INTERVAL", 60.0)
+
+# Retrieval: "hybrid" fuses vector search with a BM25 index of the same chunks
+# (built at ingest time, kept next to the manifest) by reciprocal rank fusion;
+# "vector" is dense retrieval only. The k of each retriever is configurable.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_VECTOR_TOP_K = _env_int("HYBRID_VECTOR_TOP_K", 10)
+HYBRID_BM25_TOP_K = _env_int("HYBRID_BM25_TOP_K", 10)
+HYBRID_RRF_K = _env_int("HYBRID_RRF_K", 60)
+BM25_K1 = _env_float("BM25_K1", 1.5)
+BM25_B = _env_float("BM25_B", 0.75)
+
+# LLM gateway (utils/llm_gateway.py): every LLM call is admitted against
+# requests-per-minute and tokens-per-minute token buckets, with at most
+# LLM_MAX_CONCURRENCY calls in flight. Waiting calls queue by priority
+# (grading, then interactive generation, then question bank refills). A call
+# that would wait longer than LLM_GATEWAY_MAX_WAIT_SECONDS, or find the queue
+# full, is refused with a 429 and a Retry-After. Budgets are per worker, so
+# split the provider's limits between workers. Calls reserve their estimated
+# prompt plus LLM_GATEWAY_COMPLETION_TOKENS and are settled against the usage
+# the provider reports.
+LLM_GATEWAY_ENABLED = _env_bool("LLM_GATEWAY_ENABLED", True)
+LLM_RPM_LIMIT = _env_int("LLM_RPM_LIMIT", 30)
+LLM_TPM_LIMIT = _env_int("LLM_TPM_LIMIT", 6000)
+LLM_GATEWAY_MAX_WAIT_SECONDS = _env_float("LLM_GATEWAY_MAX_WAIT_SECONDS", 30.0)
+LLM_GATEWAY_MAX_QUEUE = _env_int("LLM_GATEWAY_MAX_QUEUE", 256)
+LLM_GATEWAY_COMPLETION_TOKENS = _env_int("LLM_GATEWAY_COMPLETION_TOKENS", 1024)
+# Pooled HTTP connections to the LLM provider, reused across calls.
+LLM_HTTP_MAX_CONNECTIONS = _env_int("LLM_HTTP_MAX_CONNECTIONS", LLM_MAX_CONCURRENCY)
+LLM_HTTP_MAX_KEEPALIVE = _env_int("LLM_HTTP_MAX_KEEPALIVE", LLM_MAX_CONCURRENCY)
+LLM_HTTP_TIMEOUT_SECONDS = _env_float("LLM_HTTP_TIMEOUT_SECONDS", 60.0)
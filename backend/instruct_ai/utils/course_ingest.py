@@ -0,0 +1,323 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from llama_index.core import Document, Settings
+from llama_index.core.schema import MetadataMode
+
+from utils.config import (
+    INGESTION_JOBS_PATH,
+    INGESTION_MAX_WORKERS,
+    INGESTION_EMBED_BATCH,
+)
+from utils.bm25 import BM25Index, bm25_path
+from utils.ingestion import (
+    assign_chunk_ids,
+    course_manifest_path,
+    file_sha256,
+    manifest_lock,
+    read_manifest,
+    write_manifest,
+)
+
+logger = logging.getLogger(__name__)
+
+_JOB_FIELDS = (
+    "job_id",
+    "course_id",
+    "course_name",
+    "filename",
+    "bytes",
+    "status",
+    "pages_total",
+    "pages_done",
+    "chunks_total",
+    "chunks_new",
+    "chunks_removed",
+    "error",
+    "created_at",
+    "updated_at",
+)
+
+
+def course_slug(course_name: str) -> str:
+    """
+    Course id used for the course's namespace and storage directory.
+    """
+    slug = re.sub(r"[^a-z0-9]+", "-", course_name.lower()).strip("-")[:64]
+    if not slug:
+        raise ValueError("Course name must contain at least one letter or digit")
+    return slug
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+class IngestionJobStore:
+    """
+    SQLite table of ingestion jobs and their progress, written by the
+    ingestion processes and read by every uvicorn worker. Routes use the
+    a-prefixed methods, which run the SQLite work in a thread.
+    """
+
+    def __init__(self, path: str = INGESTION_JOBS_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, course_id TEXT NOT NULL, "
+            "course_name TEXT NOT NULL, filename TEXT NOT NULL, "
+            "bytes INTEGER NOT NULL, status TEXT NOT NULL, "
+            "pages_total INTEGER, pages_done INTEGER NOT NULL DEFAULT 0, "
+            "chunks_total INTEGER NOT NULL DEFAULT 0, "
+            "chunks_new INTEGER NOT NULL DEFAULT 0, "
+            "chunks_removed INTEGER NOT NULL DEFAULT 0, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def create(
+        self, job_id: str, course_id: str, course_name: str, filename: str, size: int
+    ) -> Dict:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, course_id, course_name, filename, bytes, "
+                "status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, course_id, course_name, filename, size, now, now),
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                (*fields.values(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_JOB_FIELDS)} FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(zip(_JOB_FIELDS, row)) if row else None
+
+    async def acreate(
+        self, job_id: str, course_id: str, course_name: str, filename: str, size: int
+    ) -> Dict:
+        return await asyncio.to_thread(
+            self.create, job_id, course_id, course_name, filename, size
+        )
+
+    async def aget(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _embed_and_add(nodes: List, vector_store, embed_model) -> None:
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    for node, embedding in zip(nodes, embed_model.get_text_embedding_batch(texts)):
+        node.embedding = embedding
+    vector_store.add(nodes)
+
+
+def ingest_pdf(
+    course_id: str,
+    source: str,
+    pdf_path: str,
+    vector_store,
+    manifest_path: str,
+    batch_size: int = INGESTION_EMBED_BATCH,
+    progress: Callable[..., None] = lambda **fields: None,
+) -> Dict:
+    """
+    Parse a PDF one page at a time and upsert its chunks into a course's
+    vector store, embedding only chunks the course manifest does not have,
+    and into the course's BM25 index.
+
+    Only the current page's chunks and one embedding batch are held in
+    memory. Chunks never span pages, so each one keeps its page number.
+
+    Returns:
+        Dict with pages_total, chunks_total, chunks_new and chunks_removed
+    """
+    from pypdf import PdfReader
+
+    with manifest_lock(manifest_path):
+        manifest = read_manifest(manifest_path)
+        doc_hash = file_sha256(pdf_path)
+        entry = manifest["documents"].get(source)
+        bm25 = BM25Index.load(bm25_path(manifest_path))
+        reader = PdfReader(pdf_path)
+        pages_total = len(reader.pages)
+        if entry and entry["sha256"] == doc_hash and source in bm25.sources():
+            return {
+                "pages_total": pages_total,
+                "pages_done": pages_total,
+                "chunks_total": len(entry["chunks"]),
+                "chunks_new": 0,
+                "chunks_removed": 0,
+            }
+        progress(pages_total=pages_total)
+
+        known = set(entry["chunks"]) if entry else set()
+        current, seen, pending = [], set(), []
+        chunks_new = 0
+        bm25.remove_source(source)
+        for page_number, page in enumerate(reader.pages, start=1):
+            text = page.extract_text() or ""
+            if text.strip():
+                document = Document(
+                    text=text,
+                    metadata={
+                        "file_name": source,
+                        "page_label": str(page_number),
+                        "course_id": course_id,
+                    },
+                )
+                nodes = assign_chunk_ids(
+                    source, Settings.node_parser.get_nodes_from_documents([document])
+                )
+                nodes = [node for node in nodes if node.id_ not in seen]
+                for node in nodes:
+                    seen.add(node.id_)
+                    current.append(node.id_)
+                    if node.id_ not in known:
+                        pending.append(node)
+                bm25.add(source, nodes)
+            while len(pending) >= batch_size:
+                _embed_and_add(pending[:batch_size], vector_store, Settings.embed_model)
+                chunks_new += batch_size
+                pending = pending[batch_size:]
+            progress(
+                pages_done=page_number, chunks_total=len(current), chunks_new=chunks_new
+            )
+        if pending:
+            _embed_and_add(pending, vector_store, Settings.embed_model)
+            chunks_new += len(pending)
+
+        stale = list(known - seen)
+        if stale:
+            vector_store.delete_nodes(node_ids=stale)
+        bm25.save(bm25_path(manifest_path))
+        manifest["documents"][source] = {"sha256": doc_hash, "chunks": current}
+        write_manifest(manifest, manifest_path)
+
+    logger.info(
+        "Ingested %s into course %s: %d pages, %d new chunks, %d removed",
+        source,
+        course_id,
+        pages_total,
+        chunks_new,
+        len(stale),
+    )
+    return {
+        "pages_total": pages_total,
+        "pages_done": pages_total,
+        "chunks_total": len(current),
+        "chunks_new": chunks_new,
+        "chunks_removed": len(stale),
+    }
+
+
+def run_ingestion_job(
+    job_id: str, course_id: str, source: str, pdf_path: str, jobs_path: str
+) -> None:
+    """
+    Entry point of an ingestion process: ingest one uploaded PDF, recording
+    progress and the outcome in the job store, then delete the upload.
+    """
+    # Configures Settings.embed_model (and its cache) in this process.
+    import utils.pipeline  # noqa: F401
+    from utils.vector_store import build_vector_store
+
+    jobs = IngestionJobStore(jobs_path)
+    try:
+        jobs.update(job_id, status="running")
+        result = ingest_pdf(
+            course_id,
+            source,
+            pdf_path,
+            build_vector_store(course_id=course_id),
+            course_manifest_path(course_id),
+            progress=lambda **fields: jobs.update(job_id, **fields),
+        )
+        jobs.update(job_id, status="done", **result)
+    except Exception as e:
+        logger.exception("Ingestion job %s failed", job_id)
+        jobs.update(job_id, status="failed", error=str(e))
+    finally:
+        jobs.close()
+        if os.path.exists(pdf_path):
+            os.remove(pdf_path)
+
+
+class IngestionRunner:
+    """
+    Runs ingestion jobs in a pool of spawned processes, so parsing and
+    embedding never block the event loop or hold the GIL of a web worker.
+    initializer(*initargs) runs once in each process before its first job.
+    """
+
+    def __init__(
+        self,
+        jobs: IngestionJobStore,
+        max_workers: int = INGESTION_MAX_WORKERS,
+        initializer: Optional[Callable] = None,
+        initargs: tuple = (),
+    ):
+        self._jobs = jobs
+        self._max_workers = max_workers
+        self._initializer = initializer
+        self._initargs = initargs
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def submit(self, job_id: str, course_id: str, source: str, pdf_path: str) -> None:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self._initializer,
+                initargs=self._initargs,
+            )
+        future = self._executor.submit(
+            run_ingestion_job, job_id, course_id, source, pdf_path, self._jobs.path
+        )
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: str, future) -> None:
+        # run_ingestion_job records its own errors; this only sees the pool
+        # itself failing, e.g. a worker process being killed.
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled() or error is not None:
+            self._jobs.update(
+                job_id, status="failed", error=str(error or "Cancelled at shutdown")
+            )
+            if error is not None:
+                self._executor = None
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
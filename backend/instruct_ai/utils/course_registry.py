@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from fastapi import HTTPException
+from llama_index.core import VectorStoreIndex
+
+from utils.agent_pool import AgentPool
+from utils.config import (
+    COURSE_CACHE_MAX_BYTES,
+    COURSE_BASE_BYTES,
+    COURSE_IDLE_SECONDS,
+    COURSE_SWEEP_INTERVAL,
+)
+from utils.ingestion import course_manifest_path
+from utils.pipeline import initialize_generator_agent, register_index
+from utils.vector_store import MmapVectorStore, build_vector_store
+
+logger = logging.getLogger(__name__)
+
+
+class Course:
+    """
+    A course's index and the pool of generator agents querying it.
+    """
+
+    def __init__(
+        self,
+        course_id: Optional[str],
+        index: VectorStoreIndex,
+        agent_pool: AgentPool,
+        size_bytes: int = 0,
+    ):
+        self.course_id = course_id
+        self.index = index
+        self.agent_pool = agent_pool
+        self.size_bytes = size_bytes
+        self.last_used = time.monotonic()
+
+
+def _estimate_bytes(vector_store) -> int:
+    size = COURSE_BASE_BYTES
+    if isinstance(vector_store, MmapVectorStore):
+        usage = vector_store.disk_usage()
+        # Mapped vectors count once; node records are parsed into dicts,
+        # which take a few times their size on disk.
+        size += usage["vectors"] + 3 * usage["records"]
+    return size
+
+
+def load_course(course_id: str) -> Course:
+    """
+    Attach to an ingested course's vector store namespace.
+
+    Raises:
+        HTTPException: 404 if nothing was ever ingested for the course
+    """
+    manifest_path = course_manifest_path(course_id)
+    if not os.path.exists(manifest_path):
+        raise HTTPException(status_code=404, detail=f"Unknown course: {course_id}")
+    vector_store = build_vector_store(course_id=course_id)
+    index = VectorStoreIndex.from_vector_store(vector_store)
+    register_index(index, manifest_path, course_id)
+    return Course(
+        course_id,
+        index,
+        AgentPool(lambda: initialize_generator_agent(index)),
+        _estimate_bytes(vector_store),
+    )
+
+
+class CourseRegistry:
+    """
+    Lazily loaded courses, least recently used first out.
+
+    A course is loaded on its first request and kept while the estimated
+    size of all loaded courses fits max_bytes and it has been used within
+    max_idle seconds. Evicting a course only drops the registry's reference,
+    so requests already holding it finish normally. The default course
+    (course_id None) is always loaded.
+    """
+
+    def __init__(
+        self,
+        default: Course,
+        load: Callable[[str], Course] = load_course,
+        max_bytes: int = COURSE_CACHE_MAX_BYTES,
+        max_idle: float = COURSE_IDLE_SECONDS,
+        sweep_interval: float = COURSE_SWEEP_INTERVAL,
+    ):
+        self.default = default
+        self._load = load
+        self.max_bytes = max_bytes
+        self.max_idle = max_idle
+        self.sweep_interval = sweep_interval
+        self._courses: "OrderedDict[str, Course]" = OrderedDict()
+        self._loading: Dict[str, asyncio.Lock] = {}
+        self._bytes = 0
+        self._task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    async def get(self, course_id: Optional[str]) -> Course:
+        if course_id is None:
+            return self.default
+        course = self._courses.get(course_id)
+        if course is None:
+            lock = self._loading.setdefault(course_id, asyncio.Lock())
+            try:
+                async with lock:
+                    course = self._courses.get(course_id)
+                    if course is None:
+                        course = await asyncio.to_thread(self._load, course_id)
+                        self._add(course)
+            finally:
+                self._loading.pop(course_id, None)
+        else:
+            self.hits += 1
+        self._courses.move_to_end(course_id)
+        course.last_used = time.monotonic()
+        return course
+
+    def _add(self, course: Course):
+        self.loads += 1
+        self._courses[course.course_id] = course
+        self._bytes += course.size_bytes
+        # The newest course stays even if it alone is over budget.
+        while self._bytes > self.max_bytes and len(self._courses) > 1:
+            self._evict(next(iter(self._courses)))
+        logger.info(
+            "Loaded course %s (~%d MB)", course.course_id, course.size_bytes >> 20
+        )
+
+    def _evict(self, course_id: str):
+        course = self._courses.pop(course_id)
+        self._bytes -= course.size_bytes
+        self.evictions += 1
+        logger.info("Evicted course %s", course_id)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.max_idle
+        idle = [cid for cid, c in self._courses.items() if c.last_used < cutoff]
+        for course_id in idle:
+            self._evict(course_id)
+        return len(idle)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": len(self._courses),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from utils.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+
+# SQLite caps the number of bound parameters per statement.
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCacheStore:
+    """
+    SQLite-backed LRU map from cache key to float32 vector.
+
+    SQLite in WAL mode lets every uvicorn worker on the host share one cache
+    file. Eviction is amortised: the table is only counted once every
+    hundredth of max_entries inserted rows, and once it has grown past
+    max_entries the least recently used tenth is dropped in one statement.
+    """
+
+    def __init__(
+        self,
+        path: str = EMBEDDING_CACHE_PATH,
+        max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._evict_every = max(1, max_entries // 100)
+        self._since_evict = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        now = time.time()
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_BATCH):
+                batch = keys[start : start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({placeholders})",
+                        [now, *batch],
+                    )
+            self._conn.commit()
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [
+                    (key, array("f", vector).tobytes(), now)
+                    for key, vector in items.items()
+                ],
+            )
+            self._since_evict += len(items)
+            if self._since_evict >= self._evict_every:
+                self._since_evict = 0
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        if count > self.max_entries:
+            excess = count - int(self.max_entries * 0.9)
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+class CachedEmbedding(BaseEmbedding):
+    """
+    Wraps an embedding model and serves repeated texts from an
+    EmbeddingCacheStore keyed by (model name, query/text, sha256 of text).
+    The async methods do their SQLite lookups and writes in a thread.
+    """
+
+    embed_model: BaseEmbedding
+
+    _store: EmbeddingCacheStore = PrivateAttr()
+    _hits: int = PrivateAttr(default=0)
+    _misses: int = PrivateAttr(default=0)
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        store: Optional[EmbeddingCacheStore] = None,
+        **kwargs,
+    ):
+        super().__init__(
+            embed_model=embed_model,
+            model_name=embed_model.model_name,
+            embed_batch_size=embed_model.embed_batch_size,
+            **kwargs,
+        )
+        self._store = store if store is not None else EmbeddingCacheStore()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    def _key(self, kind: str, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{self.model_name}:{kind}:{digest}"
+
+    def _lookup(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, text) for text in texts]
+        return self._split(texts, keys, self._store.get_many(list(dict.fromkeys(keys))))
+
+    async def _alookup(self, kind: str, texts: List[str]):
+        keys = [self._key(kind, text) for text in texts]
+        found = await asyncio.to_thread(self._store.get_many, list(dict.fromkeys(keys)))
+        return self._split(texts, keys, found)
+
+    def _split(self, texts: List[str], keys: List[str], found: Dict):
+        missed = [text for text, key in zip(texts, keys) if key not in found]
+        self._hits += len(texts) - len(missed)
+        self._misses += len(missed)
+        return keys, found, list(dict.fromkeys(missed))
+
+    def _merge(self, kind, keys, found, missing, computed) -> List[Embedding]:
+        fresh = {self._key(kind, t): e for t, e in zip(missing, computed)}
+        self._store.put_many(fresh)
+        found.update(fresh)
+        return [found[key] for key in keys]
+
+    async def _amerge(self, kind, keys, found, missing, computed) -> List[Embedding]:
+        fresh = {self._key(kind, t): e for t, e in zip(missing, computed)}
+        if fresh:
+            await asyncio.to_thread(self._store.put_many, fresh)
+        found.update(fresh)
+        return [found[key] for key in keys]
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        keys, found, missing = self._lookup("query", [query])
+        computed = [self.embed_model._get_query_embedding(q) for q in missing]
+        return self._merge("query", keys, found, missing, computed)[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        keys, found, missing = await self._alookup("query", [query])
+        computed = [await self.embed_model._aget_query_embedding(q) for q in missing]
+        return (await self._amerge("query", keys, found, missing, computed))[0]
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = self._lookup("text", texts)
+        computed = self.embed_model._get_text_embeddings(missing) if missing else []
+        return self._merge("text", keys, found, missing, computed)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        keys, found, missing = await self._alookup("text", texts)
+        computed = (
+            await self.embed_model._aget_text_embeddings(missing) if missing else []
+        )
+        return await self._amerge("text", keys, found, missing, computed)
+
+    def stats(self) -> dict:
+        total = self._hits + self._misses
+        return {
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_ratio": self._hits / total if total else 0.0,
+            "entries": len(self._store),
+        }
+
+    async def astats(self) -> dict:
+        return await asyncio.to_thread(self.stats)
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import math
+import re
+from typing import Any, Awaitable, Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def shard_sizes(total: int, per_shard: int, max_shards: int) -> List[int]:
+    """
+    Split total items into at most max_shards shards of about per_shard each.
+    """
+    if total <= 0:
+        return []
+    shards = max(1, min(max_shards, math.ceil(total / max(1, per_shard))))
+    base, extra = divmod(total, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def _words(text: str) -> set:
+    return set(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def _jaccard(words_a: set, words_b: set) -> float:
+    if not words_a or not words_b:
+        return 1.0 if words_a == words_b else 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def dedupe(
+    items: List[Any], text_of: Callable[[Any], str], threshold: float
+) -> Tuple[List[Any], int]:
+    """
+    Keep the first of every group of items whose texts are at least
+    threshold similar. Returns the kept items and the number dropped.
+    """
+    kept, kept_words = [], []
+    for item in items:
+        words = _words(text_of(item))
+        if any(_jaccard(words, other) >= threshold for other in kept_words):
+            continue
+        kept.append(item)
+        kept_words.append(words)
+    return kept, len(items) - len(kept)
+
+
+async def gather_shards(shards: List[Awaitable[List[Any]]]) -> List[Any]:
+    """
+    Run shards concurrently and concatenate their items in shard order. A
+    failed shard only loses its own items; the first error is raised when
+    every shard failed.
+    """
+    results = await asyncio.gather(*shards, return_exceptions=True)
+    items, errors = [], []
+    for result in results:
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            errors.append(result)
+            logger.warning("Generation shard failed: %s", result)
+            continue
+        items.extend(result)
+    if errors and not items:
+        raise errors[0]
+    return items
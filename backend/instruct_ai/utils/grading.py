@@ -0,0 +1,212 @@
+import math
+import re
+import string
+from typing import Dict, List, Optional
+
+from utils.config import (
+    PREGRADE_HIGH_SIMILARITY,
+    PREGRADE_LOW_SIMILARITY,
+    PREGRADE_MIN_COVERAGE,
+    PREGRADE_MIN_WORDS,
+)
+
+LETTERS = string.ascii_uppercase
+
+# "B", "(b)", "B)", "b.", "Option B", "Answer: B" and "B. Some option text".
+_LETTER_PATTERN = re.compile(
+    r"^\s*(?:(?:the\s+)?(?:correct\s+)?(?:option|answer|choice)\s*(?:is)?\s*[:\-]?\s*)?"
+    r"[\(\[]?([A-Za-z])(?:[\)\]\.:]\s*(.*?))?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+# Options are often stored with their letter, e.g. "A) Waterfall model".
+_OPTION_PREFIX = re.compile(r"^\s*[\(\[]?[A-Za-z][\)\]\.:]\s+")
+
+
+def _normalize_text(text: str) -> str:
+    text = _OPTION_PREFIX.sub("", text)
+    text = text.lower().translate(str.maketrans("", "", string.punctuation))
+    return " ".join(text.split())
+
+
+def resolve_choice(answer: str, options: Optional[List[str]] = None) -> Optional[int]:
+    """
+    Map an MCQ answer to a zero-based option index.
+
+    Accepts a bare or decorated option letter, or the text of one of the
+    options (case, punctuation and whitespace insensitive). Returns None when
+    the answer cannot be matched to exactly one option.
+    """
+    if not answer or not answer.strip():
+        return None
+    count = len(options) if options else 4
+    match = _LETTER_PATTERN.match(answer)
+    if match:
+        index = LETTERS.index(match.group(1).upper())
+        rest = match.group(2)
+        # "B. Some text" must agree with option B when the options are known.
+        if index < count and (
+            not rest
+            or not options
+            or _normalize_text(rest) == _normalize_text(options[index])
+        ):
+            return index
+    if options:
+        normalized = _normalize_text(answer)
+        matches = [
+            i
+            for i, option in enumerate(options)
+            if _normalize_text(option) == normalized
+        ]
+        if len(matches) == 1:
+            return matches[0]
+    return None
+
+
+def is_mcq(
+    model_answer: str,
+    options: Optional[List[str]] = None,
+    question_type: Optional[str] = None,
+) -> bool:
+    """
+    Whether a submission is a multiple choice answer that can be graded locally.
+    """
+    if question_type is not None:
+        return question_type.strip().lower() in ("mcq", "multiple choice")
+    if options:
+        return True
+    # MCQQuestion.model_answer is just the correct option letter.
+    return re.fullmatch(r"\s*[\(\[]?[A-Za-z][\)\]\.:]?\s*", model_answer) is not None
+
+
+def _option_label(index: int, options: Optional[List[str]]) -> str:
+    if options and index < len(options):
+        return f"{LETTERS[index]} ({_OPTION_PREFIX.sub('', options[index]).strip()})"
+    return LETTERS[index]
+
+
+def grade_mcq(
+    user_answer: str, model_answer: str, options: Optional[List[str]] = None
+) -> Optional[Dict]:
+    """
+    Grade a multiple choice answer without calling the LLM.
+
+    Returns:
+        Dict shaped like EvaluationResponse, or None when the correct option
+        itself cannot be determined and the answer should go to the LLM
+    """
+    correct = resolve_choice(model_answer, options)
+    if correct is None:
+        return None
+    chosen = resolve_choice(user_answer, options)
+    if chosen is None:
+        return {
+            "grade": "Incorrect",
+            "feedback": (
+                f"Your answer '{user_answer.strip()}' does not match any of the "
+                f"options. The correct answer is {_option_label(correct, options)}."
+            ),
+            "graded_by": "rule",
+        }
+    if chosen == correct:
+        return {
+            "grade": "Correct",
+            "feedback": f"Correct! The answer is {_option_label(correct, options)}.",
+            "graded_by": "rule",
+        }
+    return {
+        "grade": "Incorrect",
+        "feedback": (
+            f"You chose {_option_label(chosen, options)}, but the correct answer "
+            f"is {_option_label(correct, options)}."
+        ),
+        "graded_by": "rule",
+    }
+
+
+_STOPWORDS = frozenset(
+    """a an and are as at be been but by can do does for from has have how in
+    into is it its may of on or that the their then there these this those to
+    was were what when where which while who why will with would you your""".split()
+)
+
+
+def _key_terms(text: str) -> set:
+    words = re.findall(r"[a-z0-9]+", text.lower())
+    return {w for w in words if len(w) > 2 and w not in _STOPWORDS}
+
+
+def lexical_coverage(user_answer: str, model_answer: str) -> float:
+    """
+    Fraction of the model answer's key terms that appear in the user's answer.
+    """
+    expected = _key_terms(model_answer)
+    if not expected:
+        return 1.0
+    return len(expected & _key_terms(user_answer)) / len(expected)
+
+
+def cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def pregrade_answer(
+    user_answer: str,
+    model_answer: str,
+    similarity: Optional[float],
+    high_similarity: float = PREGRADE_HIGH_SIMILARITY,
+    low_similarity: float = PREGRADE_LOW_SIMILARITY,
+    min_coverage: float = PREGRADE_MIN_COVERAGE,
+    min_words: int = PREGRADE_MIN_WORDS,
+) -> Dict:
+    """
+    Decide whether a subjective answer is clear-cut enough to grade without
+    the LLM.
+
+    Returns:
+        Dict with the routing decision ("auto_correct", "auto_incorrect" or
+        "escalated"), the similarity and coverage features, and for the
+        auto_* routes an evaluation shaped like EvaluationResponse
+    """
+    coverage = round(lexical_coverage(user_answer, model_answer), 4)
+    decision = {
+        "routing": "escalated",
+        "similarity": None if similarity is None else round(similarity, 4),
+        "lexical_coverage": coverage,
+        "evaluation": None,
+    }
+    if not user_answer.strip():
+        decision["routing"] = "auto_incorrect"
+        feedback = "The answer is empty."
+    elif similarity is None:
+        return decision
+    elif similarity >= high_similarity and coverage >= min_coverage:
+        # Short answers can be right too, e.g. "Spiral" for "Spiral".
+        decision["routing"] = "auto_correct"
+        feedback = (
+            "Your answer closely matches the model answer and covers its key points."
+        )
+    elif similarity <= low_similarity:
+        decision["routing"] = "auto_incorrect"
+        if len(user_answer.split()) < min_words:
+            feedback = (
+                "The answer is too short to address the question. "
+                f"A complete answer would be: {model_answer}"
+            )
+        else:
+            feedback = (
+                "Your answer does not appear to address the question. "
+                f"A complete answer would be: {model_answer}"
+            )
+    else:
+        return decision
+    decision["evaluation"] = {
+        "grade": "Correct" if decision["routing"] == "auto_correct" else "Incorrect",
+        "feedback": feedback,
+        "graded_by": "similarity",
+        "routing": decision["routing"],
+        "similarity": decision["similarity"],
+        "lexical_coverage": coverage,
+    }
+    return decision
@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict, List
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from utils.bm25 import load_bm25
+from utils.config import HYBRID_BM25_TOP_K, HYBRID_RRF_K
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses a vector retriever with the BM25 index of the same chunks by
+    reciprocal rank fusion, so exact syllabus terms that dense retrieval
+    misses still surface.
+
+    Each result scores sum(1 / (rrf_k + rank)) over the lists it appears in.
+    Without a BM25 index on disk this is just the vector retriever.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        bm25_path: str,
+        top_k: int,
+        bm25_top_k: int = HYBRID_BM25_TOP_K,
+        rrf_k: int = HYBRID_RRF_K,
+    ):
+        super().__init__(callback_manager=vector_retriever.callback_manager)
+        self._vector_retriever = vector_retriever
+        self._bm25_path = bm25_path
+        self._top_k = top_k
+        self._bm25_top_k = bm25_top_k
+        self._rrf_k = rrf_k
+
+    def _lexical(self, query: str) -> List[NodeWithScore]:
+        bm25 = load_bm25(self._bm25_path)
+        if bm25 is None:
+            return []
+        return [
+            NodeWithScore(
+                node=TextNode(
+                    id_=doc["id"], text=doc["text"], metadata=doc["metadata"]
+                ),
+                score=score,
+            )
+            for doc, score in bm25.search(query, self._bm25_top_k)
+        ]
+
+    def _fuse(self, *rankings: List[NodeWithScore]) -> List[NodeWithScore]:
+        scores: Dict[str, float] = {}
+        nodes: Dict[str, NodeWithScore] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, start=1):
+                node_id = result.node.node_id
+                scores[node_id] = scores.get(node_id, 0.0) + 1 / (self._rrf_k + rank)
+                nodes.setdefault(node_id, result)
+        best = sorted(scores, key=scores.get, reverse=True)[: self._top_k]
+        return [NodeWithScore(node=nodes[i].node, score=scores[i]) for i in best]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        return self._fuse(
+            self._vector_retriever.retrieve(query_bundle),
+            self._lexical(query_bundle.query_str),
+        )
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Reloading a changed BM25 index and searching it are CPU-bound, so
+        # they run in a thread alongside the vector retrieval.
+        vector, lexical = await asyncio.gather(
+            self._vector_retriever.aretrieve(query_bundle),
+            asyncio.to_thread(self._lexical, query_bundle.query_str),
+        )
+        return self._fuse(vector, lexical)
@@ -0,0 +1,185 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+from contextlib import contextmanager
+from typing import Dict, List
+
+from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, Settings
+
+from utils.config import INGESTION_MANIFEST_PATH, COURSES_DIR
+from utils.bm25 import BM25Index, bm25_path
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source: str, text: str) -> str:
+    """
+    Deterministic node id for a chunk, so an unchanged chunk keeps the same
+    vector id across re-ingests and upserts overwrite instead of duplicating.
+    """
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _empty_manifest() -> Dict:
+    return {"version": MANIFEST_VERSION, "documents": {}}
+
+
+def course_manifest_path(course_id: str) -> str:
+    return os.path.join(COURSES_DIR, course_id, "ingestion_manifest.json")
+
+
+def read_manifest(path: str = INGESTION_MANIFEST_PATH) -> Dict:
+    if not os.path.exists(path):
+        return _empty_manifest()
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return _empty_manifest()
+    return manifest
+
+
+def write_manifest(manifest: Dict, path: str = INGESTION_MANIFEST_PATH) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def index_version(manifest: Dict) -> str:
+    """
+    Short hash identifying the set of chunks currently in the index.
+    """
+    digest = hashlib.sha256()
+    for source in sorted(manifest["documents"]):
+        digest.update(source.encode("utf-8"))
+        digest.update(manifest["documents"][source]["sha256"].encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+_version_cache: Dict[str, tuple] = {}
+
+
+def current_index_version(path: str = INGESTION_MANIFEST_PATH) -> str:
+    """
+    index_version of the manifest on disk, re-read only when the file changes,
+    so every worker sees an ingest done by another one.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    cached = _version_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    version = index_version(read_manifest(path))
+    _version_cache[path] = (mtime, version)
+    return version
+
+
+@contextmanager
+def manifest_lock(path: str):
+    # Several uvicorn workers boot at once; only one of them should ingest.
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def assign_chunk_ids(source: str, nodes: List) -> List:
+    """
+    Give nodes their chunk_id, keeping the links between them intact, and
+    drop repeated chunks.
+    """
+    new_ids = {node.node_id: chunk_id(source, node.get_content()) for node in nodes}
+    unique = {}
+    for node in nodes:
+        node.id_ = new_ids[node.node_id]
+        for related in node.relationships.values():
+            if not isinstance(related, list) and related.node_id in new_ids:
+                related.node_id = new_ids[related.node_id]
+        unique.setdefault(node.id_, node)
+    return list(unique.values())
+
+
+def _chunk_document(path: str) -> List:
+    documents = SimpleDirectoryReader(
+        input_files=[path], filename_as_id=True
+    ).load_data()
+    return assign_chunk_ids(
+        path, Settings.node_parser.get_nodes_from_documents(documents)
+    )
+
+
+def load_index(
+    paths: List[str], vector_store, manifest_path: str = INGESTION_MANIFEST_PATH
+) -> VectorStoreIndex:
+    """
+    Attach to the vector store, embedding and upserting only chunks that are
+    not already recorded in the ingestion manifest, and keep the BM25 index
+    next to the manifest in step with it.
+
+    Args:
+        paths: Source documents that should be present in the index
+        vector_store: The vector store backing the index
+        manifest_path: Where the chunk manifest is kept
+
+    Returns:
+        VectorStoreIndex over the vector store
+    """
+    with manifest_lock(manifest_path):
+        manifest = read_manifest(manifest_path)
+        index = VectorStoreIndex.from_vector_store(vector_store)
+        bm25 = BM25Index.load(bm25_path(manifest_path))
+        bm25_sources = bm25.sources()
+
+        for path in paths:
+            doc_hash = file_sha256(path)
+            entry = manifest["documents"].get(path)
+            if entry and entry["sha256"] == doc_hash:
+                if path not in bm25_sources:
+                    # Ingested before BM25 existed: chunking is deterministic,
+                    # so the chunks can be indexed without embedding again.
+                    bm25.add(path, _chunk_document(path))
+                    bm25.save(bm25_path(manifest_path))
+                continue
+
+            nodes = _chunk_document(path)
+            known = set(entry["chunks"]) if entry else set()
+            current = [node.id_ for node in nodes]
+            new_nodes = [node for node in nodes if node.id_ not in known]
+            stale = list(known - set(current))
+
+            if new_nodes:
+                index.insert_nodes(new_nodes)
+            if stale:
+                vector_store.delete_nodes(node_ids=stale)
+
+            bm25.remove_source(path)
+            bm25.add(path, nodes)
+            bm25.save(bm25_path(manifest_path))
+            manifest["documents"][path] = {"sha256": doc_hash, "chunks": current}
+            write_manifest(manifest, manifest_path)
+            logger.info(
+                "Ingested %s: %d new chunks, %d removed, %d unchanged",
+                path,
+                len(new_nodes),
+                len(stale),
+                len(current) - len(new_nodes),
+            )
+
+    return index
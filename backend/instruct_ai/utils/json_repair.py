@@ -0,0 +1,153 @@
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+from utils.json_stream import JsonArrayStreamer
+from utils.metrics import span
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)\s*```", re.DOTALL)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class RepairStats:
+    """
+    Process-wide counts of how LLM JSON had to be handled.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {
+            "clean": 0,
+            "repaired": 0,
+            "salvaged": 0,
+            "failed": 0,
+            "invalid_items": 0,
+            "reasks": 0,
+            "reask_items": 0,
+        }
+
+    def add(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counts[name] += amount
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+repair_stats = RepairStats()
+
+
+def _strip_wrappers(text: str) -> str:
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text.strip()
+    start = min(starts)
+    end = max(text.rfind("}"), text.rfind("]"))
+    return text[start : end + 1] if end > start else text[start:]
+
+
+def _fix_tokens(text: str) -> str:
+    """
+    Outside of strings: drop trailing commas and map Python literals to JSON.
+    """
+    out = []
+    i, n = 0, len(text)
+    in_string = escaped = False
+    while i < n:
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                # Raw newlines are invalid inside JSON strings.
+                out[-1] = "\\n"
+            i += 1
+            continue
+        if char == '"':
+            in_string = True
+        elif char == ",":
+            j = i + 1
+            while j < n and text[j] in " \t\r\n":
+                j += 1
+            if j < n and text[j] in "}]":
+                i += 1
+                continue
+        elif char.isalpha():
+            match = re.match(r"[A-Za-z]+", text[i:])
+            word = match.group(0)
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def parse_llm_json(text: str, array_key: Optional[str] = None) -> Any:
+    """
+    Parse JSON produced by an LLM, repairing common defects.
+
+    Tries, in order: the text as is; the text with markdown fences and any
+    prose around the JSON stripped, trailing commas removed, raw newlines in
+    strings escaped and Python literals converted; and, when array_key is
+    given, salvaging the complete items of a truncated {array_key: [...]}
+    object. Salvaged results are marked with a "_truncated" key.
+
+    Raises:
+        json.JSONDecodeError: If nothing could be recovered
+    """
+    with span("json_parse"):
+        return _parse_llm_json(text, array_key)
+
+
+def _parse_llm_json(text: str, array_key: Optional[str]) -> Any:
+    try:
+        data = json.loads(text)
+        repair_stats.add("clean")
+        return data
+    except json.JSONDecodeError as e:
+        error = e
+
+    candidate = _fix_tokens(_strip_wrappers(text))
+    try:
+        data = json.loads(candidate)
+        repair_stats.add("repaired")
+        return data
+    except json.JSONDecodeError:
+        pass
+
+    if array_key is not None:
+        streamer = JsonArrayStreamer(array_key)
+        items = streamer.feed(candidate)
+        if items:
+            repair_stats.add("salvaged")
+            return {array_key: items, "_truncated": not streamer.done}
+
+    repair_stats.add("failed")
+    raise error
+
+
+def missing_items_prompt(
+    original_prompt: str, kept: List[Dict], missing: int, describe_key: str
+) -> str:
+    """
+    Ask for only the items that were lost, without repeating the kept ones.
+    """
+    kept_list = "\n".join(f"- {item.get(describe_key, '')}" for item in kept)
+    return f"""{original_prompt}
+
+Your previous response was incomplete or partly invalid. These items were kept and must NOT be repeated:
+{kept_list or '- (none)'}
+
+Generate only {missing} more item(s) in exactly the same JSON structure.
+"""
@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Any, List
+
+
+class JsonArrayStreamer:
+    """
+    Incrementally pull the elements of a JSON array out of streamed text.
+
+    Feed it text as it arrives; every object (or nested array) element of
+    the array under `key` is returned as soon as its closing bracket is seen.
+    Text before the array (such as a ReAct "Answer:" prefix) and after it is
+    ignored, and elements that fail to parse are skipped rather than ending
+    the stream.
+    """
+
+    def __init__(self, key: str = "questions"):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._start = None
+        self.skipped = 0
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, text: str) -> List[Any]:
+        elements = []
+        if self._done:
+            return elements
+        self._buffer += text
+        if not self._in_array:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return elements
+            self._in_array = True
+            self._pos = match.end()
+
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char in "]}":
+                if self._depth == 0:
+                    # The closing bracket of the array itself.
+                    self._done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._start : i + 1], elements)
+            i += 1
+
+        # Keep only what is still needed: drop everything already consumed.
+        keep_from = self._start if self._start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._start is not None:
+            self._start = 0
+        return elements
+
+    def _emit(self, text: str, elements: List[Any]):
+        self._start = None
+        try:
+            elements.append(json.loads(text))
+        except ValueError:
+            self.skipped += 1
@@ -0,0 +1,461 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+from enum import IntEnum
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+from fastapi import HTTPException
+from llama_index.core.base.llms.types import ChatMessage, LLMMetadata
+from llama_index.core.llms.llm import LLM
+from openai import RateLimitError
+from pydantic import PrivateAttr
+
+from utils.config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    LLM_GATEWAY_MAX_WAIT_SECONDS,
+    LLM_GATEWAY_MAX_QUEUE,
+    LLM_GATEWAY_COMPLETION_TOKENS,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    LLM_HTTP_TIMEOUT_SECONDS,
+)
+from utils.metrics import LLM_GATEWAY_REJECTIONS, record_stage
+from utils.usage import response_token_counts
+
+logger = logging.getLogger(__name__)
+
+# How long to hold all calls back after a provider 429 without Retry-After.
+_DEFAULT_PROVIDER_BACKOFF = 10.0
+# How often queued calls re-check while every concurrency slot is taken.
+_FULL_POLL_SECONDS = 1.0
+
+
+class Priority(IntEnum):
+    GRADING = 0  # students waiting on a grade
+    INTERACTIVE = 1  # question generation someone is waiting for
+    BULK = 2  # question bank refills
+
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar(
+    "llm_priority", default=Priority.INTERACTIVE
+)
+
+
+def set_llm_priority(priority: Priority) -> None:
+    _priority.set(priority)
+
+
+@contextmanager
+def llm_priority(priority: Priority):
+    """
+    Queue the LLM calls made in the enclosed block at priority.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMOverloaded(HTTPException):
+    """
+    The LLM budget is used up for longer than a caller should wait. FastAPI
+    turns it into a 429 with a Retry-After header.
+    """
+
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=429,
+            detail=f"The LLM is at its rate limit, retry in {self.retry_after} s.",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+def pooled_http_clients():
+    """
+    Sync and async HTTP clients for the LLM provider, keeping connections
+    alive between calls.
+    """
+    limits = httpx.Limits(
+        max_connections=LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+    )
+    timeout = httpx.Timeout(LLM_HTTP_TIMEOUT_SECONDS)
+    return (
+        httpx.Client(limits=limits, timeout=timeout),
+        httpx.AsyncClient(limits=limits, timeout=timeout),
+    )
+
+
+class TokenBucket:
+    """
+    Holds up to per_minute units and refills at per_minute / 60 a second.
+    The level may go negative when a call turns out to cost more than it
+    reserved; later calls then wait for the debt to refill.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self, now: float) -> float:
+        self._refill(now)
+        return self.level
+
+    def wait_time(self, amount: float, now: float) -> float:
+        return max(0.0, (amount - self.available(now)) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def give(self, amount: float) -> None:
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LLMGateway:
+    """
+    Admission control for LLM calls.
+
+    A call is admitted once a request and its estimated tokens are available
+    in the per-minute token buckets and fewer than max_concurrency calls are
+    in flight. Until then it waits in a queue ordered by the priority of the
+    context it was made in, then by arrival. A call that is expected to wait
+    more than max_wait seconds, or that finds max_queue calls waiting, is
+    refused with LLMOverloaded. A 429 from the provider holds back every call
+    for as long as its Retry-After asks.
+    """
+
+    def __init__(
+        self,
+        rpm: int = LLM_RPM_LIMIT,
+        tpm: int = LLM_TPM_LIMIT,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_wait: float = LLM_GATEWAY_MAX_WAIT_SECONDS,
+        max_queue: int = LLM_GATEWAY_MAX_QUEUE,
+        completion_tokens: int = LLM_GATEWAY_COMPLETION_TOKENS,
+    ):
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.completion_tokens = completion_tokens
+        self.in_flight = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        # [priority, arrival, tokens, future]; only touched on the event loop.
+        self._waiters: List[list] = []
+        self._arrivals = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+        self._pump: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.provider_rate_limited = 0
+        self._wait_seconds = 0.0
+
+    def queued_now(self) -> int:
+        return sum(not w[3].done() for w in self._waiters)
+
+    def estimate(self, prompt: str) -> int:
+        """
+        Tokens to reserve for a call with this prompt.
+        """
+        tokens = len(prompt) // 4 + 1 + self.completion_tokens
+        # A call bigger than the whole budget must still get through eventually.
+        return int(min(tokens, self._tokens.capacity))
+
+    def _wait_time(self, requests: int, tokens: float, now: float) -> float:
+        return max(
+            self._paused_until - now,
+            self._requests.wait_time(requests, now),
+            self._tokens.wait_time(tokens, now),
+        )
+
+    def _admit(self, tokens: int, now: float) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            return False
+        if self._wait_time(1, tokens, now) > 0:
+            return False
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self.in_flight += 1
+        self.admitted += 1
+        return True
+
+    def _refuse(self, reason: str, retry_after: float, priority: Priority):
+        self.rejected += 1
+        LLM_GATEWAY_REJECTIONS.inc(priority=priority.name.lower(), reason=reason)
+        raise LLMOverloaded(retry_after)
+
+    def _check(self, priority: Priority, tokens: int, now: float) -> None:
+        # Cancelled waiters stay in the heap until the pump reaches them.
+        waiting = [w for w in self._waiters if not w[3].done()]
+        if len(waiting) >= self.max_queue:
+            self._refuse("queue_full", self.max_wait, priority)
+        ahead = [w for w in waiting if w[0] <= priority]
+        wait = self._wait_time(len(ahead) + 1, sum(w[2] for w in ahead) + tokens, now)
+        if wait > self.max_wait:
+            self._refuse("budget", wait, priority)
+
+    def check(self, prompt: str = "") -> None:
+        """
+        Raise LLMOverloaded if a call made now would be refused, e.g. before
+        starting a streamed response that can no longer become a 429.
+        """
+        with self._lock:
+            self._check(_priority.get(), self.estimate(prompt), time.monotonic())
+
+    async def acquire(self, tokens: int) -> None:
+        priority = _priority.get()
+        with self._lock:
+            now = time.monotonic()
+            if not self.queued_now() and self._admit(tokens, now):
+                return
+            self._check(priority, tokens, now)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._arrivals), tokens, future])
+        self.queued += 1
+        self._kick()
+        started = time.perf_counter()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up.
+                self.release(tokens)
+            raise
+        waited = time.perf_counter() - started
+        self._wait_seconds += waited
+        record_stage("llm_queue", waited)
+
+    def acquire_sync(self, tokens: int) -> None:
+        """
+        Blocking admission for calls made outside the event loop. These do not
+        queue; they poll until the budget allows them through.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self._admit(tokens, now):
+                    return
+                wait = self._wait_time(1, tokens, now)
+            time.sleep(min(max(wait, 0.05), 1.0))
+
+    def release(self, tokens: int, response: Any = None) -> None:
+        """
+        End an admitted call, settling its reservation against the tokens the
+        provider reports having used.
+        """
+        counts = response_token_counts(response) if response is not None else None
+        with self._lock:
+            self.in_flight -= 1
+            if counts is not None:
+                self._tokens.give(
+                    tokens - counts["prompt_tokens"] - counts["completion_tokens"]
+                )
+        self._kick()
+
+    def rate_limited(self, error: RateLimitError) -> LLMOverloaded:
+        """
+        Hold back every call for as long as the provider's 429 asks, and
+        return the error to report to the client.
+        """
+        retry_after = _DEFAULT_PROVIDER_BACKOFF
+        try:
+            retry_after = float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            pass
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self.provider_rate_limited += 1
+        logger.warning("LLM provider rate limit hit, pausing %.1f s", retry_after)
+        LLM_GATEWAY_REJECTIONS.inc(
+            priority=_priority.get().name.lower(), reason="provider"
+        )
+        return LLMOverloaded(retry_after)
+
+    def _kick(self) -> None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Called from a thread; the pump polls until it is woken anyway.
+            return
+        if self._pump is None:
+            if not self._waiters:
+                return
+            self._changed = asyncio.Event()
+            self._pump = asyncio.create_task(self._run())
+        self._changed.set()
+
+    async def _run(self):
+        try:
+            while self._waiters:
+                priority, _, tokens, future = self._waiters[0]
+                if future.done():
+                    heapq.heappop(self._waiters)
+                    continue
+                with self._lock:
+                    now = time.monotonic()
+                    if self._admit(tokens, now):
+                        heapq.heappop(self._waiters)
+                        future.set_result(None)
+                        continue
+                    wait = (
+                        # Releases from other threads cannot wake the pump.
+                        _FULL_POLL_SECONDS
+                        if self.in_flight >= self.max_concurrency
+                        else self._wait_time(1, tokens, now)
+                    )
+                self._changed.clear()
+                try:
+                    # A release or a new, more urgent call wakes this early.
+                    await asyncio.wait_for(self._changed.wait(), max(wait, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._pump = None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            now = time.monotonic()
+            waiting = [w for w in self._waiters if not w[3].done()]
+            return {
+                "rpm_limit": int(self._requests.capacity),
+                "tpm_limit": int(self._tokens.capacity),
+                "requests_available": round(self._requests.available(now), 1),
+                "tokens_available": round(self._tokens.available(now)),
+                "in_flight": self.in_flight,
+                "waiting": {
+                    p.name.lower(): sum(w[0] == p for w in waiting) for p in Priority
+                },
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+                "provider_rate_limited": self.provider_rate_limited,
+                "paused_for": round(max(0.0, self._paused_until - now), 1),
+                "mean_queue_wait_ms": round(
+                    self._wait_seconds / self.queued * 1000 if self.queued else 0.0, 1
+                ),
+            }
+
+
+def _messages_text(messages: Sequence[ChatMessage]) -> str:
+    return "\n".join(str(message.content or "") for message in messages)
+
+
+class GatewayLLM(LLM):
+    """
+    Passes every call of the wrapped LLM through an LLMGateway. The wrapped
+    LLM still reports each call to the instrumentation itself.
+
+    Streams are admitted like any other call but give back their concurrency
+    slot as soon as they are open, and keep their reservation as is, since
+    they report no usage.
+    """
+
+    _llm: LLM = PrivateAttr()
+    _gateway: LLMGateway = PrivateAttr()
+
+    def __init__(self, llm: LLM, gateway: LLMGateway, **kwargs: Any):
+        super().__init__(callback_manager=llm.callback_manager, **kwargs)
+        self._llm = llm
+        self._gateway = gateway
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "GatewayLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return self._llm.metadata
+
+    def _call(self, prompt: str, call, stream: bool = False):
+        tokens = self._gateway.estimate(prompt)
+        self._gateway.acquire_sync(tokens)
+        response = None
+        try:
+            response = call()
+            return response
+        except RateLimitError as e:
+            raise self._gateway.rate_limited(e) from e
+        finally:
+            self._gateway.release(tokens, None if stream else response)
+
+    async def _acall(self, prompt: str, call, stream: bool = False):
+        tokens = self._gateway.estimate(prompt)
+        await self._gateway.acquire(tokens)
+        response = None
+        try:
+            response = await call()
+            return response
+        except RateLimitError as e:
+            raise self._gateway.rate_limited(e) from e
+        finally:
+            self._gateway.release(tokens, None if stream else response)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return self._call(
+            _messages_text(messages), lambda: self._llm.chat(messages, **kwargs)
+        )
+
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return self._call(
+            prompt, lambda: self._llm.complete(prompt, formatted=formatted, **kwargs)
+        )
+
+    def stream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return self._call(
+            _messages_text(messages),
+            lambda: self._llm.stream_chat(messages, **kwargs),
+            stream=True,
+        )
+
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return self._call(
+            prompt,
+            lambda: self._llm.stream_complete(prompt, formatted=formatted, **kwargs),
+            stream=True,
+        )
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return await self._acall(
+            _messages_text(messages), lambda: self._llm.achat(messages, **kwargs)
+        )
+
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        return await self._acall(
+            prompt, lambda: self._llm.acomplete(prompt, formatted=formatted, **kwargs)
+        )
+
+    async def astream_chat(self, messages: Sequence[ChatMessage], **kwargs: Any):
+        return await self._acall(
+            _messages_text(messages),
+            lambda: self._llm.astream_chat(messages, **kwargs),
+            stream=True,
+        )
+
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ):
+        return await self._acall(
+            prompt,
+            lambda: self._llm.astream_complete(prompt, formatted=formatted, **kwargs),
+            stream=True,
+        )
@@ -0,0 +1,322 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.agent import (
+    AgentRunStepEndEvent,
+    AgentRunStepStartEvent,
+)
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMChatStartEvent,
+    LLMCompletionEndEvent,
+    LLMCompletionStartEvent,
+)
+from llama_index.core.instrumentation.events.retrieval import (
+    RetrievalEndEvent,
+    RetrievalStartEvent,
+)
+
+from utils.usage import llm_token_counts
+
+_SECONDS_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+_TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+_ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15)
+
+
+def _format_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(
+                    f"{self.name}{_format_labels(self.labels, key)} {_format_number(value)}"
+                )
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float],
+        labels: Sequence[str] = (),
+    ):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        # label values -> [per-bucket counts..., sum, count]
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = _format_labels(self.labels, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {count}")
+                le = _format_labels(self.labels, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{le} {series[-1]}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {_format_number(series[-2])}")
+                lines.append(f"{self.name}_count{labels} {series[-1]}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "instruct_ai_request_seconds",
+    "HTTP request latency by route.",
+    _SECONDS_BUCKETS,
+    ("method", "route", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "instruct_ai_stage_seconds",
+    "Time spent in each pipeline stage.",
+    _SECONDS_BUCKETS,
+    ("stage",),
+)
+LLM_TOKENS = Histogram(
+    "instruct_ai_llm_tokens",
+    "Prompt and completion tokens per LLM call.",
+    _TOKEN_BUCKETS,
+    ("kind",),
+)
+LLM_TOKENS_TOTAL = Counter(
+    "instruct_ai_llm_tokens_total",
+    "Prompt and completion tokens across all LLM calls.",
+    ("kind",),
+)
+AGENT_ITERATIONS = Histogram(
+    "instruct_ai_agent_iterations",
+    "Agent reasoning iterations per request that ran the agent.",
+    _ITERATION_BUCKETS,
+    ("route",),
+)
+LLM_CALLS = Histogram(
+    "instruct_ai_llm_calls",
+    "LLM calls per request that made any.",
+    _ITERATION_BUCKETS,
+    ("route",),
+)
+LLM_GATEWAY_REJECTIONS = Counter(
+    "instruct_ai_llm_gateway_rejections_total",
+    "LLM calls refused by the gateway, by priority and reason.",
+    ("priority", "reason"),
+)
+
+_METRICS = (
+    REQUEST_SECONDS,
+    STAGE_SECONDS,
+    LLM_TOKENS,
+    LLM_TOKENS_TOTAL,
+    AGENT_ITERATIONS,
+    LLM_CALLS,
+    LLM_GATEWAY_REJECTIONS,
+)
+
+
+def render_metrics() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """
+    Time per stage and stage counts of one HTTP request. Shared by every
+    task and thread the request starts, hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def server_timing(self) -> str:
+        """
+        Server-Timing header value: the summed time of each stage (stages
+        may overlap when they run concurrently) and the total so far.
+        """
+        with self._lock:
+            entries = [
+                f"{stage};dur={seconds * 1000:.1f}"
+                for stage, seconds in self.seconds.items()
+            ]
+        total = (time.perf_counter() - self.started) * 1000
+        entries.append(f"total;dur={total:.1f}")
+        return ", ".join(entries)
+
+
+_request: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _request.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time the enclosed block as one occurrence of stage.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+@contextmanager
+def request_timing():
+    """
+    Collect the stage timings of one HTTP request.
+    """
+    timings = RequestTimings()
+    token = _request.set(timings)
+    try:
+        yield timings
+    finally:
+        _request.reset(token)
+
+
+def observe_request(
+    method: str, route: str, status: int, timings: RequestTimings
+) -> None:
+    REQUEST_SECONDS.observe(
+        time.perf_counter() - timings.started,
+        method=method,
+        route=route,
+        status=status,
+    )
+    if timings.counts.get("agent_iteration"):
+        AGENT_ITERATIONS.observe(timings.counts["agent_iteration"], route=route)
+    if timings.counts.get("llm"):
+        LLM_CALLS.observe(timings.counts["llm"], route=route)
+
+
+_START_EVENTS = {
+    LLMChatStartEvent: "llm",
+    LLMCompletionStartEvent: "llm",
+    RetrievalStartEvent: "retrieval",
+    AgentRunStepStartEvent: "agent_iteration",
+}
+_END_EVENTS = {
+    LLMChatEndEvent: "llm",
+    LLMCompletionEndEvent: "llm",
+    RetrievalEndEvent: "retrieval",
+    AgentRunStepEndEvent: "agent_iteration",
+}
+
+
+# Start times of LLM calls, retrievals and agent steps still running.
+_started: Dict[Tuple[str, str], float] = {}
+_MAX_OPEN_SPANS = 10_000
+
+
+class StageEventHandler(BaseEventHandler):
+    """
+    Times LLM calls, retrievals and agent steps from llama-index's start and
+    end events, which share the span id of the call they belong to, and
+    records the tokens of every LLM call.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StageEventHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        stage = _START_EVENTS.get(type(event))
+        if stage is not None:
+            if len(_started) >= _MAX_OPEN_SPANS:
+                # Calls that raised never send their end event.
+                _started.clear()
+            _started[(stage, event.span_id)] = time.perf_counter()
+            return
+        stage = _END_EVENTS.get(type(event))
+        if stage is None:
+            return
+        started = _started.pop((stage, event.span_id), None)
+        if started is not None:
+            record_stage(stage, time.perf_counter() - started)
+        counts = llm_token_counts(event)
+        if counts is not None:
+            for kind in ("prompt", "completion"):
+                tokens = counts[f"{kind}_tokens"]
+                LLM_TOKENS.observe(tokens, kind=kind)
+                LLM_TOKENS_TOTAL.inc(tokens, kind=kind)
+
+
+get_dispatcher().add_event_handler(StageEventHandler())
@@ -1,6 +1,11 @@
 from fastapi import HTTPException
 import os
 import json
+import asyncio
+import contextlib
+import logging
+import time
+import weakref
 from fastapi import HTTPException
 from typing import Dict, List, Optional, Literal, Union
 from enum import Enum
@@ -14,23 +19,112 @@ from llama_index.core import (
     Settings,
 )
 from llama_index.core.tools import QueryEngineTool, ToolMetadata
+from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.memory import ChatMemoryBuffer
 from llama_index.llms.groq import Groq
 from llama_index.embeddings.jinaai import JinaEmbedding
 from llama_index.core.agent import ReActAgent
 from dotenv import load_dotenv
+from utils.config import (
+    LLM_MAX_CONCURRENCY,
+    EMBEDDING_CACHE_ENABLED,
+    EVAL_BATCH_TOKEN_BUDGET,
+    EVAL_BATCH_MAX_ITEMS,
+    EVAL_BATCH_ITEM_RETRIES,
+    JSON_REASK_MAX_ATTEMPTS,
+    DIRECT_RAG_TOP_K,
+    FANOUT_QUESTIONS_PER_SHARD,
+    FANOUT_CODING_QUESTIONS_PER_SHARD,
+    FANOUT_MAX_SHARDS,
+    FANOUT_DEDUPE_SIMILARITY,
+    PREGRADE_ENABLED,
+    RETRIEVAL_CACHE_ENABLED,
+    RETRIEVAL_CACHE_TTL_SECONDS,
+    RETRIEVAL_CACHE_MAX_BYTES,
+    RETRIEVAL_CACHE_PATH,
+    RETRIEVAL_MODE,
+    HYBRID_VECTOR_TOP_K,
+    INGESTION_MANIFEST_PATH,
+    LLM_GATEWAY_ENABLED,
+)
+from utils.embedding_cache import CachedEmbedding
+from utils.ingestion import current_index_version
+from utils.response_cache import ResponseCache
+from utils.retrieval_cache import CachedQueryEngine, CachedRetriever
+from utils.bm25 import bm25_path
+from utils.hybrid_retriever import HybridRetriever
+from utils.sandbox import (
+    SandboxBusy,
+    SUPPORTED_LANGUAGES as SANDBOX_LANGUAGES,
+    run_test_cases,
+    summarize_results,
+)
+from utils.runners import can_run, run_compiled_test_cases
+from utils.json_stream import JsonArrayStreamer
+from utils.metrics import record_stage, span
+from utils.llm_gateway import (
+    GatewayLLM,
+    LLMGateway,
+    LLMOverloaded,
+    pooled_http_clients,
+)
+from utils.fanout import dedupe, gather_shards, shard_sizes
+from utils.json_repair import missing_items_prompt, parse_llm_json, repair_stats
+from utils.schema import MCQQuestion, SubjectiveQuestion
+from utils.grading import cosine_similarity, grade_mcq, is_mcq, pregrade_answer
 
 load_dotenv()
 
-Settings.llm = Groq(model="llama-3.1-70b-versatile", api_key=os.getenv("GROQ_API_KEY"))
+logger = logging.getLogger(__name__)
+
+_http_client, _async_http_client = pooled_http_clients()
+Settings.llm = Groq(
+    model="llama-3.1-70b-versatile",
+    api_key=os.getenv("GROQ_API_KEY"),
+    http_client=_http_client,
+    async_http_client=_async_http_client,
+)
+llm_gateway = LLMGateway() if LLM_GATEWAY_ENABLED else None
+if llm_gateway is not None:
+    Settings.llm = GatewayLLM(Settings.llm, llm_gateway)
 Settings.embed_model = JinaEmbedding(
     api_key=os.getenv("JINA_API_KEY"),
     model="jina-embeddings-v3",
 )
+if EMBEDDING_CACHE_ENABLED:
+    Settings.embed_model = CachedEmbedding(Settings.embed_model)
+
+retrieval_cache = (
+    ResponseCache(
+        ttl_seconds=RETRIEVAL_CACHE_TTL_SECONDS,
+        max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+        disk_path=RETRIEVAL_CACHE_PATH,
+    )
+    if RETRIEVAL_CACHE_ENABLED
+    else None
+)
 
 PDF_PATH = "data/SE_Merged.pdf"
 INDEX_PATH = "saved_index"
 
+# Bounds the number of concurrent LLM / agent calls per worker so a burst of
+# requests cannot open an unbounded number of upstream connections. The LLM
+# gateway bounds them itself, per call and in priority order; a semaphore
+# around whole agent runs would let queued bulk work block grading.
+_llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+def llm_slot():
+    if llm_gateway is not None:
+        return contextlib.nullcontext()
+    return _llm_semaphore
+
+
+def llm_in_flight() -> int:
+    if llm_gateway is not None:
+        return llm_gateway.in_flight + llm_gateway.queued_now()
+    return LLM_MAX_CONCURRENCY - _llm_semaphore._value
+
 
 def load_or_create_index():
     if os.path.exists(INDEX_PATH):
@@ -43,22 +137,55 @@ def load_or_create_index():
     return index
 
 
-def initialize_generator_agent(index):
-    query_engine = index.as_query_engine(similarity_top_k=10)
+_index_sources = weakref.WeakKeyDictionary()
 
-    tools = [
-        QueryEngineTool(
-            query_engine=query_engine,
-            metadata=ToolMetadata(
-                name="study_material_query",
-                description="Provides information from the study material PDF.",
-            ),
-        ),
-    ]
 
-    memory = ChatMemoryBuffer.from_defaults(token_limit=2048)
+def register_index(index, manifest_path, namespace):
+    """
+    Record which ingestion manifest describes index. It versions the
+    retrieval cache and locates the BM25 index; indexes not registered use
+    the main ingestion manifest.
+    """
+    _index_sources[index] = (manifest_path, namespace)
+
 
-    custom_prompt = """
+def _index_version(index):
+    manifest_path, namespace = _index_sources.get(index, (INGESTION_MANIFEST_PATH, ""))
+    return (
+        lambda: f"{namespace}:{RETRIEVAL_MODE}:{current_index_version(manifest_path)}"
+    )
+
+
+def _retriever(index, top_k):
+    if RETRIEVAL_MODE != "hybrid":
+        return index.as_retriever(similarity_top_k=top_k)
+    manifest_path, _ = _index_sources.get(index, (INGESTION_MANIFEST_PATH, ""))
+    return HybridRetriever(
+        index.as_retriever(similarity_top_k=HYBRID_VECTOR_TOP_K),
+        bm25_path(manifest_path),
+        top_k,
+    )
+
+
+def study_material_retriever(index, top_k):
+    retriever = _retriever(index, top_k)
+    if retrieval_cache is None:
+        return retriever
+    return CachedRetriever(retriever, retrieval_cache, top_k, _index_version(index))
+
+
+def study_material_query_engine(index, top_k):
+    query_engine = RetrieverQueryEngine.from_args(_retriever(index, top_k))
+    if retrieval_cache is None:
+        return query_engine
+    return CachedQueryEngine(
+        query_engine, retrieval_cache, top_k, _index_version(index)
+    )
+
+
+_AGENT_TOOL_INSTRUCTION = "Always use the study_material_query tool to gather relevant information before generating questions."
+
+GENERATOR_SYSTEM_PROMPT = """
         You are a question generator designed to create questions based on study materials. Your task is to generate {question_type} questions about {topic} from the given context. Always use the study_material_query tool to gather relevant information before generating questions.
 
         Generate {num_questions} questions along with their correct answers.
@@ -110,24 +237,67 @@ def initialize_generator_agent(index):
 
         Ensure that the questions are diverse and cover different parts of the topic. Use the context provided by the study_material_query tool to create accurate and relevant questions. Double-check that your response is a valid JSON object before submitting.
         """
+
+
+def initialize_generator_agent(index):
+    query_engine = study_material_query_engine(index, top_k=10)
+
+    tools = [
+        QueryEngineTool(
+            query_engine=query_engine,
+            metadata=ToolMetadata(
+                name="study_material_query",
+                description="Provides information from the study material PDF.",
+            ),
+        ),
+    ]
+
+    memory = ChatMemoryBuffer.from_defaults(token_limit=2048)
+
+    custom_prompt = GENERATOR_SYSTEM_PROMPT
     agent = ReActAgent.from_tools(
         tools, memory=memory, system_prompt=custom_prompt, max_iterations=15
     )
     return agent
 
 
-def generate_questions(agent, topic, question_type, num_questions):
-    prompt = f"""Generate {num_questions} {question_type} questions about {topic}. 
+def _questions_prompt(topic, question_type, num_questions):
+    return f"""Generate {num_questions} {question_type} questions about {topic}. 
     Your response must be a valid JSON object with a 'questions' key containing an array of question objects.
     Each question object should have 'type', 'question', and either 'options' and 'model_answer' for MCQs, or 'model_answer' for subjective questions.
     Ensure that your response is a properly formatted JSON object. Double-check the JSON structure before submitting.
     """
-    response = agent.chat(prompt)
 
+
+def _valid_questions(items):
+    """
+    Keep the items that validate as an MCQQuestion (when they have options)
+    or a SubjectiveQuestion, dropping the rest.
+    """
+    valid = []
+    for item in items:
+        try:
+            if not isinstance(item, dict):
+                raise TypeError(f"expected an object, got {type(item).__name__}")
+            model = MCQQuestion if item.get("options") else SubjectiveQuestion
+            model(**item)
+        except (ValueError, TypeError) as e:
+            logger.warning("Dropping invalid generated question: %s", e)
+            repair_stats.add("invalid_items")
+            continue
+        valid.append(item)
+    return valid
+
+
+def _parse_questions(text):
     try:
-        questions_data = json.loads(response.response)
-        if not isinstance(questions_data, dict) or "questions" not in questions_data:
+        questions_data = parse_llm_json(text, array_key="questions")
+        if not isinstance(questions_data, dict) or not isinstance(
+            questions_data.get("questions"), list
+        ):
             raise ValueError("Response is not in the expected format")
+        questions_data.pop("_truncated", None)
+        questions_data["questions"] = _valid_questions(questions_data["questions"])
         return questions_data
     except json.JSONDecodeError:
         raise HTTPException(
@@ -140,8 +310,189 @@ def generate_questions(agent, topic, question_type, num_questions):
         )
 
 
-def evaluate_answer(question, user_answer, correct_answer):
-    prompt = f"""Evaluate the following user answer:
+def _agent_asker(agent):
+    async def ask(prompt):
+        async with llm_slot():
+            response = await agent.achat(prompt)
+        return response.response
+
+    return ask
+
+
+async def _llm_ask(prompt):
+    async with llm_slot():
+        response = await Settings.llm.acomplete(prompt)
+    return response.text
+
+
+async def _areask_missing(ask, prompt, kept, missing, describe_key, parse):
+    """
+    Ask again (through the agent or the LLM directly) for only the items a
+    response lost, up to JSON_REASK_MAX_ATTEMPTS times. Returns whatever
+    extra items it produced.
+    """
+    extra = []
+    for _ in range(JSON_REASK_MAX_ATTEMPTS):
+        if missing <= 0:
+            break
+        repair_stats.add("reasks")
+        repair_stats.add("reask_items", missing)
+        try:
+            text = await ask(
+                missing_items_prompt(prompt, kept + extra, missing, describe_key)
+            )
+            items = parse(text)[:missing]
+        except LLMOverloaded:
+            # Out of LLM capacity: the caller decides whether to shed load.
+            raise
+        except Exception as e:
+            logger.warning("Re-asking for %d missing items failed: %s", missing, e)
+            continue
+        extra += items
+        missing -= len(items)
+    return extra
+
+
+async def _agenerate_questions_with(ask, prompt, num_questions):
+    questions_data = _parse_questions(await ask(prompt))
+    questions = questions_data["questions"]
+    if isinstance(num_questions, int) and len(questions) < num_questions:
+        questions += await _areask_missing(
+            ask,
+            prompt,
+            questions,
+            num_questions - len(questions),
+            "question",
+            lambda text: _parse_questions(text)["questions"],
+        )
+    if not questions:
+        raise HTTPException(
+            status_code=500,
+            detail="Error in question generation: no valid questions were generated",
+        )
+    return questions_data
+
+
+async def agenerate_questions(agent, topic, question_type, num_questions):
+    return await _agenerate_questions_with(
+        _agent_asker(agent),
+        _questions_prompt(topic, question_type, num_questions),
+        num_questions,
+    )
+
+
+async def _aretrieve_context(index, query, top_k=DIRECT_RAG_TOP_K):
+    """
+    One deterministic retrieval of the top_k chunks for query.
+    """
+    retriever = study_material_retriever(index, top_k)
+    nodes = await retriever.aretrieve(query)
+    return "\n\n---\n\n".join(node.get_content() for node in nodes)
+
+
+def _direct_system_prompt(topic, question_type, num_questions):
+    # The agent's instructions, minus the parts about calling the tool.
+    return (
+        GENERATOR_SYSTEM_PROMPT.replace(_AGENT_TOOL_INSTRUCTION, "")
+        .replace("the study_material_query tool", "the study material context")
+        .format(topic=topic, question_type=question_type, num_questions=num_questions)
+    )
+
+
+def _direct_prompt(context, task_prompt, system_prompt=""):
+    return f"""{system_prompt}
+Study material context:
+---------------------
+{context}
+---------------------
+
+Use only the study material context above.
+
+{task_prompt}
+"""
+
+
+async def adirect_generate_questions(index, topic, question_type, num_questions):
+    """
+    Single-pass alternative to agenerate_questions: retrieve once for the
+    topic, then make one completion, instead of running the ReAct loop.
+    """
+    context = await _aretrieve_context(index, f"{topic} {question_type}")
+    prompt = _direct_prompt(
+        context,
+        _questions_prompt(topic, question_type, num_questions),
+        _direct_system_prompt(topic, question_type, num_questions),
+    )
+    return await _agenerate_questions_with(_llm_ask, prompt, num_questions)
+
+
+def _shard_prompt(task_prompt, shard, shards):
+    if shards == 1:
+        return task_prompt
+    return f"""{task_prompt}
+This request is part {shard + 1} of {shards} being generated in parallel from the same study material. So that the parts do not overlap, base your questions mainly on part {shard + 1} of {shards} of the study material context, taking the context in the order given.
+"""
+
+
+async def _afanout(sizes, generate_shard, prompt, num_questions, describe_key, parse):
+    """
+    Generate shards concurrently, merge them, drop near-duplicates, and ask
+    for replacements if that leaves fewer than num_questions.
+    """
+
+    def text_of(item):
+        if not isinstance(item, dict):
+            return str(item)
+        if describe_key == "title":
+            return f"{item.get('title', '')} {item.get('description', '')}"
+        return str(item.get(describe_key, ""))
+
+    items = await gather_shards(
+        [generate_shard(shard, size) for shard, size in enumerate(sizes)]
+    )
+    items, dropped = dedupe(items, text_of, FANOUT_DEDUPE_SIMILARITY)
+    if len(items) < num_questions:
+        extra = await _areask_missing(
+            _llm_ask, prompt, items, num_questions - len(items), describe_key, parse
+        )
+        items, more = dedupe(items + extra, text_of, FANOUT_DEDUPE_SIMILARITY)
+        dropped += more
+    if dropped:
+        logger.info("Dropped %d near-duplicate generated questions", dropped)
+    return items[:num_questions]
+
+
+async def afanout_generate_questions(index, topic, question_type, num_questions):
+    """
+    Like adirect_generate_questions, but split into FANOUT_QUESTIONS_PER_SHARD
+    sized shards generated concurrently over one shared retrieval.
+    """
+    context = await _aretrieve_context(index, f"{topic} {question_type}")
+    sizes = shard_sizes(num_questions, FANOUT_QUESTIONS_PER_SHARD, FANOUT_MAX_SHARDS)
+
+    async def generate_shard(shard, size):
+        prompt = _direct_prompt(
+            context,
+            _shard_prompt(
+                _questions_prompt(topic, question_type, size), shard, len(sizes)
+            ),
+            _direct_system_prompt(topic, question_type, size),
+        )
+        return (await _agenerate_questions_with(_llm_ask, prompt, size))["questions"]
+
+    questions = await _afanout(
+        sizes,
+        generate_shard,
+        _direct_prompt(context, _questions_prompt(topic, question_type, num_questions)),
+        num_questions,
+        "question",
+        lambda text: _parse_questions(text)["questions"],
+    )
+    return {"questions": questions}
+
+
+def _evaluation_prompt(question, user_answer, correct_answer):
+    return f"""Evaluate the following user answer:
 Question: {question}
 User Answer: {user_answer}
 Correct Answer: {correct_answer}
@@ -154,10 +505,11 @@ Provide your evaluation as a valid JSON object with the following structure:
 
 Ensure that your response is always a valid JSON object before submitting.
 """
-    response = Settings.llm.complete(prompt)
 
+
+def _parse_evaluation(text):
     try:
-        evaluation_data = json.loads(response.text)
+        evaluation_data = parse_llm_json(text)
         if (
             not isinstance(evaluation_data, dict)
             or "grade" not in evaluation_data
@@ -176,6 +528,348 @@ Ensure that your response is always a valid JSON object before submitting.
         )
 
 
+def _grade_locally(user_answer, correct_answer, options, question_type):
+    """
+    MCQ answers are graded by matching the chosen option; no LLM call needed.
+    """
+    if is_mcq(correct_answer, options, question_type):
+        return grade_mcq(user_answer, correct_answer, options)
+    return None
+
+
+def _pregrade_texts(items):
+    """
+    Texts to embed in one batch: user then model answer of every item with a
+    non-empty answer (empty ones are rejected outright).
+    """
+    embeddable = [i for i, item in enumerate(items) if item["user_answer"].strip()]
+    texts = []
+    for i in embeddable:
+        texts += [items[i]["user_answer"], items[i]["model_answer"]]
+    return embeddable, texts
+
+
+def _pregrade_decisions(items, embeddable, embeddings):
+    similarities = {}
+    if embeddings is not None:
+        for n, i in enumerate(embeddable):
+            similarities[i] = cosine_similarity(
+                embeddings[2 * n], embeddings[2 * n + 1]
+            )
+    return [
+        pregrade_answer(item["user_answer"], item["model_answer"], similarities.get(i))
+        for i, item in enumerate(items)
+    ]
+
+
+async def _apregrade_all(items):
+    """
+    Route subjective answers by embedding similarity to their model answers.
+    If embedding fails every answer is escalated to the LLM.
+    """
+    embeddable, texts = _pregrade_texts(items)
+    embeddings = None
+    try:
+        if texts:
+            embeddings = await Settings.embed_model.aget_text_embedding_batch(texts)
+    except Exception as e:
+        logger.warning("Pre-grading embeddings failed, escalating: %s", e)
+    return _pregrade_decisions(items, embeddable, embeddings)
+
+
+def _routing_fields(decision):
+    if decision is None:
+        return {}
+    return {
+        "routing": decision["routing"],
+        "similarity": decision["similarity"],
+        "lexical_coverage": decision["lexical_coverage"],
+    }
+
+
+async def aevaluate_answer(
+    question,
+    user_answer,
+    correct_answer,
+    options=None,
+    question_type=None,
+    pregrade=PREGRADE_ENABLED,
+):
+    local = _grade_locally(user_answer, correct_answer, options, question_type)
+    if local is not None:
+        return local
+    decision = None
+    if pregrade:
+        item = {"user_answer": user_answer, "model_answer": correct_answer}
+        decision = (await _apregrade_all([item]))[0]
+        if decision["evaluation"] is not None:
+            return decision["evaluation"]
+    async with llm_slot():
+        response = await Settings.llm.acomplete(
+            _evaluation_prompt(question, user_answer, correct_answer)
+        )
+    return {
+        **_parse_evaluation(response.text),
+        "graded_by": "llm",
+        **_routing_fields(decision),
+    }
+
+
+def _explanations_prompt(items):
+    questions = "\n\n".join(
+        f"{i + 1}. Question: {item['question']}\n"
+        + "".join(f"   {option}\n" for option in item.get("options") or [])
+        + f"   Student's answer: {item['user_answer']}\n"
+        f"   Correct answer: {item['model_answer']}"
+        for i, item in enumerate(items)
+    )
+    return f"""The following multiple choice answers have already been graded. For each one, briefly explain why the correct answer is right and, if the student chose differently, why their choice is wrong.
+
+{questions}
+
+Provide your explanations as a valid JSON object with the following structure, with exactly one entry per question in the same order:
+{{
+    "explanations": ["Explanation for question 1", "Explanation for question 2"]
+}}
+
+Ensure that your response is always a valid JSON object before submitting.
+"""
+
+
+def _parse_explanations(text, expected):
+    try:
+        data = parse_llm_json(text)
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to parse the explanations. Invalid JSON format.",
+        )
+    explanations = data.get("explanations") if isinstance(data, dict) else None
+    if not isinstance(explanations, list) or len(explanations) != expected:
+        raise HTTPException(
+            status_code=500,
+            detail="Explanations do not match the submitted questions",
+        )
+    return {"explanations": [str(e) for e in explanations]}
+
+
+async def aexplain_answers(items):
+    """
+    Explain a batch of graded MCQ answers with a single LLM call.
+    """
+    if not items:
+        return {"explanations": []}
+    async with llm_slot():
+        response = await Settings.llm.acomplete(_explanations_prompt(items))
+    return _parse_explanations(response.text, len(items))
+
+
+def _estimate_tokens(text):
+    # Roughly four characters per token for English prose.
+    return len(text) // 4 + 1
+
+
+def _pack_batches(items, token_budget, max_items):
+    """
+    Greedily group (index, item) pairs so each grading prompt stays under the
+    token budget. An item larger than the budget gets a batch of its own.
+    """
+    batches, current, used = [], [], 0
+    for index, item in items:
+        cost = _estimate_tokens(
+            item["question"] + item["user_answer"] + item["model_answer"]
+        )
+        if current and (used + cost > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append((index, item))
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _batch_evaluation_prompt(batch):
+    answers = "\n\n".join(f"""[id: {index}]
+Question: {item['question']}
+User Answer: {item['user_answer']}
+Correct Answer: {item['model_answer']}""" for index, item in batch)
+    return f"""Evaluate each of the following user answers independently:
+
+{answers}
+
+Provide your evaluations as a valid JSON object with the following structure, with one entry for every id above:
+{{
+    "evaluations": [
+        {{
+            "id": 0,
+            "grade": "Grade here",
+            "feedback": "Feedback text here"
+        }}
+    ]
+}}
+
+Ensure that your response is always a valid JSON object before submitting.
+"""
+
+
+def _parse_batch_evaluation(text, ids):
+    """
+    Pick out well-formed evaluations for the expected ids; anything missing or
+    malformed is left for the caller to retry.
+    """
+    try:
+        data = parse_llm_json(text, array_key="evaluations")
+    except json.JSONDecodeError:
+        return {}
+    evaluations = data.get("evaluations") if isinstance(data, dict) else None
+    parsed = {}
+    for entry in evaluations if isinstance(evaluations, list) else []:
+        if (
+            isinstance(entry, dict)
+            and entry.get("id") in ids
+            and "grade" in entry
+            and "feedback" in entry
+        ):
+            parsed[entry["id"]] = {
+                "grade": str(entry["grade"]),
+                "feedback": str(entry["feedback"]),
+                "graded_by": "llm",
+            }
+    return parsed
+
+
+async def _aevaluate_batch(batch):
+    """
+    Returns:
+        (evaluations by id, LLMOverloaded if the gateway refused the batch)
+    """
+    ids = {index for index, _ in batch}
+    try:
+        async with llm_slot():
+            response = await Settings.llm.acomplete(_batch_evaluation_prompt(batch))
+    except LLMOverloaded as e:
+        return {}, e
+    except Exception as e:
+        logger.warning("Batch grading of %d answers failed: %s", len(batch), e)
+        return {}, None
+    return _parse_batch_evaluation(response.text, ids), None
+
+
+async def _aevaluate_item_with_retries(item, retries):
+    """
+    Returns:
+        (evaluation, error, retry_after); retry_after is set when the gateway
+        refused the call, which is not retried.
+    """
+    error = None
+    for _ in range(retries + 1):
+        try:
+            # The pre-grader already escalated this answer to the LLM.
+            evaluation = await aevaluate_answer(
+                item["question"],
+                item["user_answer"],
+                item["model_answer"],
+                pregrade=False,
+            )
+            return evaluation, None, None
+        except LLMOverloaded as e:
+            return None, e.detail, e.retry_after
+        except HTTPException as e:
+            error = e.detail
+        except Exception as e:
+            error = str(e)
+    return None, error, None
+
+
+async def aevaluate_answers(
+    items,
+    token_budget=EVAL_BATCH_TOKEN_BUDGET,
+    max_items=EVAL_BATCH_MAX_ITEMS,
+    retries=EVAL_BATCH_ITEM_RETRIES,
+    pregrade=PREGRADE_ENABLED,
+):
+    """
+    Evaluate many answers at once.
+
+    MCQs are graded locally, and clear-cut subjective answers are graded by
+    embedding similarity. The remaining answers are packed into as few
+    grading prompts as the token budget allows and the prompts run
+    concurrently; any answer a batch fails to grade is retried on its own.
+
+    Args:
+        items: List of AnswerSubmission dicts
+
+    Returns:
+        List of {"index", "evaluation", "error", "retry_after"} dicts in
+        submission order; retry_after is set for answers the LLM gateway
+        refused
+    """
+    results = [
+        {"index": i, "evaluation": None, "error": None, "retry_after": None}
+        for i in range(len(items))
+    ]
+    pending = []
+    for index, item in enumerate(items):
+        local = _grade_locally(
+            item["user_answer"],
+            item["model_answer"],
+            item.get("options"),
+            item.get("question_type"),
+        )
+        if local is not None:
+            results[index]["evaluation"] = local
+        else:
+            pending.append((index, item))
+
+    decisions = {}
+    if pregrade and pending:
+        routed = await _apregrade_all([item for _, item in pending])
+        escalated = []
+        for (index, item), decision in zip(pending, routed):
+            decisions[index] = decision
+            if decision["evaluation"] is not None:
+                results[index]["evaluation"] = decision["evaluation"]
+            else:
+                escalated.append((index, item))
+        pending = escalated
+
+    batches = _pack_batches(pending, token_budget, max_items)
+    graded = {}
+    refused = set()
+    outcomes = await asyncio.gather(*(_aevaluate_batch(b) for b in batches))
+    for batch, (parsed, overloaded) in zip(batches, outcomes):
+        graded.update(parsed)
+        if overloaded is not None:
+            # Retrying each answer on its own would only be refused again.
+            for index, _ in batch:
+                results[index]["error"] = overloaded.detail
+                results[index]["retry_after"] = overloaded.retry_after
+                refused.add(index)
+
+    missing = [
+        (index, item)
+        for index, item in pending
+        if index not in graded and index not in refused
+    ]
+    retried = await asyncio.gather(
+        *(_aevaluate_item_with_retries(item, retries) for _, item in missing)
+    )
+    for (index, _), (evaluation, error, retry_after) in zip(missing, retried):
+        if evaluation is not None:
+            graded[index] = evaluation
+        else:
+            results[index]["error"] = error
+            results[index]["retry_after"] = retry_after
+
+    for index, evaluation in graded.items():
+        results[index]["evaluation"] = {
+            **evaluation,
+            **_routing_fields(decisions.get(index)),
+        }
+    return results
+
+
 class TestCase(TypedDict):
     input: Union[List, Dict, str, int, float]
     expected: Union[List, Dict, str, int, float]
@@ -381,198 +1075,368 @@ def validate_programming_language(language: str) -> str:
 #         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
-def generate_coding_question(
-    agent,
+def _coding_questions_prompt(
     programming_language: str,
     difficulty: DifficultyLevel,
-    topic: Optional[str] = None,
-    num_questions: int = 1,
-) -> Dict:
-    try:
-        if num_questions < 1 or num_questions > 10:
-            raise ValueError("Number of questions must be between 1 and 10")
+    topic: Optional[str],
+    num_questions: int,
+) -> str:
+    if num_questions < 1 or num_questions > 10:
+        raise ValueError("Number of questions must be between 1 and 10")
+
+    programming_language = validate_programming_language(programming_language)
+    difficulty_params = get_difficulty_parameters(difficulty)
+    topic_prompt = f"about {topic}" if topic else ""
+
+    # Create a sample test case structure
+    sample_test_case = {
+        "input": {"nums": [1, 2, 3, 4, 5], "target": 9},
+        "expected": [3, 4],
+    }
 
-        programming_language = validate_programming_language(programming_language)
-        difficulty_params = get_difficulty_parameters(difficulty)
-        topic_prompt = f"about {topic}" if topic else ""
+    # Create a sample question structure
+    sample_question = {
+        "title": "Example: Find Target Sum Pair",
+        "difficulty": {
+            "level": "easy",
+            "explanation": "Basic array traversal with nested loops",
+        },
+        "description": "Example description",
+        "function_signature": "def find_pair(nums: List[int], target: int) -> List[int]:",
+        "test_cases": [sample_test_case],
+        "solution": "Example solution",
+        "time_complexity": "O(n^2)",
+        "space_complexity": "O(1)",
+        "hints": ["Consider using nested loops"],
+        "learning_points": ["Array traversal", "Brute force approach"],
+    }
 
-        # Create a sample test case structure
-        sample_test_case = {
-            "input": {"nums": [1, 2, 3, 4, 5], "target": 9},
-            "expected": [3, 4],
-        }
+    return f"""Generate {num_questions} {difficulty.value} coding {topic_prompt} questions in {programming_language}.
+    The questions should align with the following difficulty parameters:
+    - Time Complexity Target: {', '.join(difficulty_params.time_complexity)}
+    - Typical Concepts: {', '.join(difficulty_params.typical_concepts)}
+    - Expected Solving Time: {difficulty_params.expected_time}
+    - Constraints: {json.dumps(difficulty_params.constraints, indent=2)}
 
-        # Create a sample question structure
-        sample_question = {
-            "title": "Example: Find Target Sum Pair",
-            "difficulty": {
-                "level": "easy",
-                "explanation": "Basic array traversal with nested loops",
-            },
-            "description": "Example description",
-            "function_signature": "def find_pair(nums: List[int], target: int) -> List[int]:",
-            "test_cases": [sample_test_case],
-            "solution": "Example solution",
-            "time_complexity": "O(n^2)",
-            "space_complexity": "O(1)",
-            "hints": ["Consider using nested loops"],
-            "learning_points": ["Array traversal", "Brute force approach"],
-        }
+    Your response must follow this exact JSON structure (using the example format below):
 
-        prompt = f"""Generate {num_questions} {difficulty.value} coding {topic_prompt} questions in {programming_language}.
-        The questions should align with the following difficulty parameters:
-        - Time Complexity Target: {', '.join(difficulty_params.time_complexity)}
-        - Typical Concepts: {', '.join(difficulty_params.typical_concepts)}
-        - Expected Solving Time: {difficulty_params.expected_time}
-        - Constraints: {json.dumps(difficulty_params.constraints, indent=2)}
+    {json.dumps({"questions": [sample_question]}, indent=2)}
 
-        Your response must follow this exact JSON structure (using the example format below):
+    IMPORTANT REQUIREMENTS:
+    1. Each question must follow the exact structure shown above
+    2. All test cases must have 'input' as an object with named parameters
+    3. The 'expected' field in test cases must match the function's return type
+    4. Include at least 3 test cases per question, including edge cases
+    5. The function signature must match the programming language syntax
+    6. All JSON must be valid and properly formatted
 
-        {json.dumps({"questions": [sample_question]}, indent=2)}
+    Use appropriate syntax and conventions for {programming_language}.
+    Ensure all test cases are properly formatted as objects with named parameters.
+    """
 
-        IMPORTANT REQUIREMENTS:
-        1. Each question must follow the exact structure shown above
-        2. All test cases must have 'input' as an object with named parameters
-        3. The 'expected' field in test cases must match the function's return type
-        4. Include at least 3 test cases per question, including edge cases
-        5. The function signature must match the programming language syntax
-        6. All JSON must be valid and properly formatted
 
-        Use appropriate syntax and conventions for {programming_language}.
-        Ensure all test cases are properly formatted as objects with named parameters.
-        """
+def _validate_coding_question(i: int, question: Dict) -> Dict:
+    """
+    Check one generated coding question in place, cleaning its test cases.
+    """
+    # Check required fields
+    required_fields = [
+        "title",
+        "difficulty",
+        "description",
+        "function_signature",
+        "test_cases",
+        "solution",
+        "time_complexity",
+        "space_complexity",
+    ]
+    missing_fields = [field for field in required_fields if field not in question]
+    if missing_fields:
+        raise ValueError(
+            f"Question {i+1} missing required fields: {', '.join(missing_fields)}"
+        )
 
-        try:
-            response = agent.chat(prompt)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to generate questions: {str(e)}"
+    # Validate test cases
+    if not isinstance(question["test_cases"], list):
+        raise ValueError(f"Question {i+1}: Test cases must be an array")
+
+    cleaned_test_cases = []
+    for j, test_case in enumerate(question["test_cases"]):
+        if not isinstance(test_case, dict):
+            raise ValueError(f"Question {i+1}, Test case {j+1}: Must be an object")
+
+        if "input" not in test_case or "expected" not in test_case:
+            raise ValueError(
+                f"Question {i+1}, Test case {j+1}: Must have 'input' and 'expected' fields"
             )
 
-        try:
-            questions_data = json.loads(response.response)
-        except json.JSONDecodeError as e:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to parse the generated questions. Invalid JSON format. Error: {str(e)}",
+        # Ensure input is a dictionary
+        if not isinstance(test_case["input"], dict):
+            raise ValueError(
+                f"Question {i+1}, Test case {j+1}: Input must be an object with named parameters"
             )
 
-        # Validate response structure
-        if not isinstance(questions_data, dict) or "questions" not in questions_data:
-            raise ValueError("Response is missing required 'questions' field")
+        # Add cleaned test case
+        cleaned_test_cases.append(
+            {"input": test_case["input"], "expected": test_case["expected"]}
+        )
+
+    # Replace test cases with cleaned version
+    question["test_cases"] = cleaned_test_cases
+
+    # Validate difficulty format
+    if (
+        not isinstance(question["difficulty"], dict)
+        or "level" not in question["difficulty"]
+    ):
+        raise ValueError(
+            f"Question {i+1}: Difficulty must be an object with a 'level' field"
+        )
+
+    return question
+
+
+def _validate_coding_questions(text: str, strict: bool = True) -> Dict:
+    """
+    Parse and validate generated coding questions. With strict=False invalid
+    questions are dropped instead of failing the whole response.
+    """
+    try:
+        questions_data = parse_llm_json(text, array_key="questions")
+    except json.JSONDecodeError as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to parse the generated questions. Invalid JSON format. Error: {str(e)}",
+        )
+
+    # Validate response structure
+    if not isinstance(questions_data, dict) or "questions" not in questions_data:
+        raise ValueError("Response is missing required 'questions' field")
 
-        # Validate and clean each question
+    questions_data.pop("_truncated", None)
+
+    # Validate and clean each question
+    valid = []
+    with span("validation"):
         for i, question in enumerate(questions_data["questions"]):
-            # Check required fields
-            required_fields = [
-                "title",
-                "difficulty",
-                "description",
-                "function_signature",
-                "test_cases",
-                "solution",
-                "time_complexity",
-                "space_complexity",
-            ]
-            missing_fields = [
-                field for field in required_fields if field not in question
-            ]
-            if missing_fields:
-                raise ValueError(
-                    f"Question {i+1} missing required fields: {', '.join(missing_fields)}"
-                )
-
-            # Validate test cases
-            if not isinstance(question["test_cases"], list):
-                raise ValueError(f"Question {i+1}: Test cases must be an array")
-
-            cleaned_test_cases = []
-            for j, test_case in enumerate(question["test_cases"]):
-                if not isinstance(test_case, dict):
-                    raise ValueError(
-                        f"Question {i+1}, Test case {j+1}: Must be an object"
-                    )
-
-                if "input" not in test_case or "expected" not in test_case:
-                    raise ValueError(
-                        f"Question {i+1}, Test case {j+1}: Must have 'input' and 'expected' fields"
-                    )
-
-                # Ensure input is a dictionary
-                if not isinstance(test_case["input"], dict):
-                    raise ValueError(
-                        f"Question {i+1}, Test case {j+1}: Input must be an object with named parameters"
-                    )
-
-                # Add cleaned test case
-                cleaned_test_cases.append(
-                    {"input": test_case["input"], "expected": test_case["expected"]}
-                )
-
-            # Replace test cases with cleaned version
-            question["test_cases"] = cleaned_test_cases
-
-            # Validate difficulty format
-            if (
-                not isinstance(question["difficulty"], dict)
-                or "level" not in question["difficulty"]
-            ):
-                raise ValueError(
-                    f"Question {i+1}: Difficulty must be an object with a 'level' field"
-                )
+            try:
+                valid.append(_validate_coding_question(i, question))
+            except (ValueError, TypeError) as e:
+                if strict:
+                    raise
+                logger.warning("Dropping invalid coding question: %s", e)
+                repair_stats.add("invalid_items")
+    questions_data["questions"] = valid
+
+    return questions_data
+
+
+async def _agenerate_coding_questions_with(ask, prompt, num_questions):
+    try:
+        try:
+            text = await ask(prompt)
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Failed to generate questions: {str(e)}"
+            )
 
+        questions_data = _validate_coding_questions(text, strict=False)
+        questions = questions_data["questions"]
+        if len(questions) < num_questions:
+            questions += await _areask_missing(
+                ask,
+                prompt,
+                questions,
+                num_questions - len(questions),
+                "title",
+                lambda text: _validate_coding_questions(text, strict=False)[
+                    "questions"
+                ],
+            )
+        if not questions:
+            raise ValueError("No valid coding questions were generated")
         return questions_data
 
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Unexpected error: {str(e)}")
 
 
-def evaluate_coding_answer(
-    agent, question: Dict, user_code: str, programming_language: str
+async def agenerate_coding_question(
+    agent,
+    programming_language: str,
+    difficulty: DifficultyLevel,
+    topic: Optional[str] = None,
+    num_questions: int = 1,
 ) -> Dict:
-    """
-    Evaluate a user's coding answer against test cases and provide feedback.
+    try:
+        prompt = _coding_questions_prompt(
+            programming_language, difficulty, topic, num_questions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _agenerate_coding_questions_with(
+        _agent_asker(agent), prompt, num_questions
+    )
 
-    Args:
-        agent: The LLM agent to use for evaluation
-        question: The original question dictionary containing test cases
-        user_code: The user's submitted code
-        programming_language: The programming language of the solution
 
-    Returns:
-        Dict containing evaluation results and feedback
+async def adirect_generate_coding_question(
+    index,
+    programming_language: str,
+    difficulty: DifficultyLevel,
+    topic: Optional[str] = None,
+    num_questions: int = 1,
+) -> Dict:
+    """
+    Single-pass alternative to agenerate_coding_question.
+    """
+    try:
+        prompt = _coding_questions_prompt(
+            programming_language, difficulty, topic, num_questions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    context = await _aretrieve_context(
+        index, f"{topic or 'programming'} {programming_language} {difficulty.value}"
+    )
+    return await _agenerate_coding_questions_with(
+        _llm_ask, _direct_prompt(context, prompt), num_questions
+    )
 
-    Raises:
-        HTTPException: If evaluation fails
-        ValueError: If input parameters are invalid
+
+async def afanout_generate_coding_question(
+    index,
+    programming_language: str,
+    difficulty: DifficultyLevel,
+    topic: Optional[str] = None,
+    num_questions: int = 1,
+) -> Dict:
+    """
+    Like adirect_generate_coding_question, but generates the questions in
+    concurrent shards over one shared retrieval, so one bad question only
+    costs its own shard.
     """
     try:
-        # Input validation
-        if not user_code.strip():
-            raise ValueError("User code cannot be empty")
-
-        programming_language = validate_programming_language(programming_language)
-
-        # Validate question structure
-        required_fields = [
-            "difficulty",
-            "description",
-            "function_signature",
-            "test_cases",
-        ]
-        missing_fields = [field for field in required_fields if field not in question]
-        if missing_fields:
-            raise ValueError(
-                f"Question missing required fields: {', '.join(missing_fields)}"
-            )
+        prompt = _coding_questions_prompt(
+            programming_language, difficulty, topic, num_questions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    context = await _aretrieve_context(
+        index, f"{topic or 'programming'} {programming_language} {difficulty.value}"
+    )
+    sizes = shard_sizes(
+        num_questions, FANOUT_CODING_QUESTIONS_PER_SHARD, FANOUT_MAX_SHARDS
+    )
+
+    async def generate_shard(shard, size):
+        shard_prompt = _shard_prompt(
+            _coding_questions_prompt(programming_language, difficulty, topic, size),
+            shard,
+            len(sizes),
+        )
+        generated = await _agenerate_coding_questions_with(
+            _llm_ask, _direct_prompt(context, shard_prompt), size
+        )
+        return generated["questions"]
+
+    questions = await _afanout(
+        sizes,
+        generate_shard,
+        _direct_prompt(context, prompt),
+        num_questions,
+        "title",
+        lambda text: _validate_coding_questions(text, strict=False)["questions"],
+    )
+    return {"questions": questions}
+
+
+async def _astream_question_objects(agent, prompt):
+    """
+    Stream the agent's answer and yield each element of its "questions"
+    array as soon as it is complete.
+    """
+    streamer = JsonArrayStreamer("questions")
+    async with llm_slot():
+        response = await agent.astream_chat(prompt)
+        async for token in response.async_response_gen():
+            for element in streamer.feed(token):
+                yield element
+    if streamer.skipped:
+        logger.warning("Skipped %d malformed streamed questions", streamer.skipped)
 
-        difficulty_params = get_difficulty_parameters(
-            DifficultyLevel(question["difficulty"]["level"])
+
+async def astream_questions(agent, topic, question_type, num_questions):
+    async for question in _astream_question_objects(
+        agent, _questions_prompt(topic, question_type, num_questions)
+    ):
+        yield question
+
+
+async def astream_coding_questions(
+    agent,
+    programming_language: str,
+    difficulty: DifficultyLevel,
+    topic: Optional[str] = None,
+    num_questions: int = 1,
+):
+    """
+    Yield generated coding questions one at a time as they validate. Invalid
+    questions are skipped so the rest of the stream still arrives.
+    """
+    prompt = _coding_questions_prompt(
+        programming_language, difficulty, topic, num_questions
+    )
+    i = 0
+    async for question in _astream_question_objects(agent, prompt):
+        try:
+            yield _validate_coding_question(i, question)
+        except (ValueError, TypeError) as e:
+            logger.warning("Skipping invalid streamed coding question: %s", e)
+        i += 1
+
+
+def _validate_coding_submission(
+    question: Dict, user_code: str, programming_language: str
+) -> str:
+    # Input validation
+    if not user_code.strip():
+        raise ValueError("User code cannot be empty")
+
+    programming_language = validate_programming_language(programming_language)
+
+    # Validate question structure
+    required_fields = [
+        "difficulty",
+        "description",
+        "function_signature",
+        "test_cases",
+    ]
+    missing_fields = [field for field in required_fields if field not in question]
+    if missing_fields:
+        raise ValueError(
+            f"Question missing required fields: {', '.join(missing_fields)}"
         )
 
-        prompt = f"""Evaluate the following coding solution:
+    return programming_language
+
+
+def _coding_evaluation_prompt(
+    question: Dict, user_code: str, programming_language: str
+) -> str:
+    programming_language = _validate_coding_submission(
+        question, user_code, programming_language
+    )
+    difficulty_params = get_difficulty_parameters(
+        DifficultyLevel(question["difficulty"]["level"])
+    )
+
+    return f"""Evaluate the following coding solution:
 Programming Language: {programming_language}
 
 Question:
@@ -605,40 +1469,193 @@ Provide a comprehensive evaluation including:
 Return the evaluation as a valid JSON object.
 """
 
+
+def _validate_coding_evaluation(text: str) -> Dict:
+    try:
+        evaluation_data = parse_llm_json(text)
+        logger.debug("Coding evaluation: %s", evaluation_data)
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to parse evaluation results. Invalid JSON format.",
+        )
+
+    # Validate evaluation data
+    required_fields = [
+        "passed",
+        "test_results",
+        "feedback",
+        "score",
+        "difficulty_appropriate",
+    ]
+    missing_fields = [
+        field for field in required_fields if field not in evaluation_data
+    ]
+    if missing_fields:
+        raise ValueError(
+            f"Evaluation missing required fields: {', '.join(missing_fields)}"
+        )
+
+    return evaluation_data
+
+
+def _coding_feedback_prompt(
+    question: Dict, user_code: str, programming_language: str, test_results: List
+) -> str:
+    return f"""Review the following coding solution. It has already been run against the test cases; the results below are real and must not be re-judged.
+Programming Language: {programming_language}
+
+Question:
+{question['description']}
+
+Difficulty Level: {question['difficulty']['level']}
+Expected Time Complexity: {question.get('time_complexity', 'Not specified')}
+Expected Space Complexity: {question.get('space_complexity', 'Not specified')}
+
+User's Solution:
+{user_code}
+
+Test Results:
+{json.dumps(test_results, indent=2)}
+
+Provide your review as a valid JSON object with the following structure:
+{{
+    "feedback": "Overall feedback text here",
+    "difficulty_appropriate": true,
+    "time_complexity_analysis": "Analysis here",
+    "space_complexity_analysis": "Analysis here",
+    "code_quality_feedback": "Feedback on style, error handling and edge cases",
+    "improvement_suggestions": ["Suggestion 1", "Suggestion 2"]
+}}
+
+Ensure that your response is always a valid JSON object before submitting.
+"""
+
+
+def _parse_coding_feedback(text: str) -> Dict:
+    try:
+        feedback_data = parse_llm_json(text)
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=500,
+            detail="Failed to parse evaluation feedback. Invalid JSON format.",
+        )
+    if not isinstance(feedback_data, dict) or "feedback" not in feedback_data:
+        raise ValueError("Evaluation feedback is missing required 'feedback' field")
+    return feedback_data
+
+
+async def _aevaluate_with_sandbox(
+    question: Dict, user_code: str, programming_language: str, mode: str
+) -> Dict:
+    compile_info = {}
+    started = time.perf_counter()
+    if programming_language in SANDBOX_LANGUAGES:
+        test_results = await run_test_cases(
+            user_code, question["function_signature"], question["test_cases"]
+        )
+        execution_time_ms = round((time.perf_counter() - started) * 1000, 3)
+        record_stage("sandbox", execution_time_ms / 1000)
+    else:
+        run = await run_compiled_test_cases(
+            programming_language,
+            user_code,
+            question["function_signature"],
+            question["test_cases"],
+        )
+        test_results = run["test_results"]
+        execution_time_ms = run["run_time_ms"]
+        compile_info = {
+            "compile_time_ms": run["compile_time_ms"],
+            "artifact_cached": run["artifact_cached"],
+        }
+        record_stage("compile", run["compile_time_ms"] / 1000)
+        record_stage("sandbox", run["run_time_ms"] / 1000)
+    summary = summarize_results(test_results)
+    passed_count = sum(1 for r in test_results if r["passed"])
+    evaluation_data = {
+        "passed": summary["passed"],
+        "score": summary["score"],
+        "test_results": test_results,
+        "feedback": f"{passed_count} of {len(test_results)} test cases passed.",
+        "difficulty_appropriate": True,
+        "execution_time_ms": execution_time_ms,
+        **compile_info,
+    }
+    if mode == "tests_only":
+        return evaluation_data
+
+    prompt = _coding_feedback_prompt(
+        question, user_code, programming_language, test_results
+    )
+    try:
+        async with llm_slot():
+            response = await Settings.llm.acomplete(prompt)
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to evaluate answer: {str(e)}"
+        )
+    feedback_data = _parse_coding_feedback(response.text)
+    # The LLM only contributes prose; pass/fail and score stay deterministic.
+    for field in (
+        "passed",
+        "score",
+        "test_results",
+        "execution_time_ms",
+        "compile_time_ms",
+        "artifact_cached",
+    ):
+        feedback_data.pop(field, None)
+    evaluation_data.update(feedback_data)
+    return evaluation_data
+
+
+async def aevaluate_coding_answer(
+    agent_pool,
+    question: Dict,
+    user_code: str,
+    programming_language: str,
+    mode: str = "full",
+) -> Dict:
+    """
+    Evaluate a coding answer without blocking the event loop.
+
+    Python, and compiled languages with a toolchain on this host (see
+    utils/runners.py), are graded by actually running the test cases; the LLM
+    is then asked only for qualitative feedback, or skipped entirely when mode
+    is "tests_only". Anything else falls back to having an agent from
+    agent_pool judge the solution; only that path checks one out, so sandbox
+    grading never waits behind generation holding the pool.
+    """
+    try:
+        language = _validate_coding_submission(
+            question, user_code, programming_language
+        )
+        if language in SANDBOX_LANGUAGES or can_run(
+            language, question["function_signature"], question["test_cases"]
+        ):
+            return await _aevaluate_with_sandbox(question, user_code, language, mode)
+
+        prompt = _coding_evaluation_prompt(question, user_code, programming_language)
+
         try:
-            response = agent.chat(prompt)
+            async with agent_pool.agent() as agent, llm_slot():
+                response = await agent.achat(prompt)
+        except LLMOverloaded:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Failed to evaluate answer: {str(e)}"
             )
 
-        try:
-            evaluation_data = json.loads(response.response)
-            print(evaluation_data)
-        except json.JSONDecodeError:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to parse evaluation results. Invalid JSON format.",
-            )
-
-        # Validate evaluation data
-        required_fields = [
-            "passed",
-            "test_results",
-            "feedback",
-            "score",
-            "difficulty_appropriate",
-        ]
-        missing_fields = [
-            field for field in required_fields if field not in evaluation_data
-        ]
-        if missing_fields:
-            raise ValueError(
-                f"Evaluation missing required fields: {', '.join(missing_fields)}"
-            )
-
-        return evaluation_data
+        return _validate_coding_evaluation(response.response)
 
+    except LLMOverloaded:
+        raise
+    except SandboxBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from utils.config import (
+    QUESTION_BANK_PATH,
+    QUESTION_BANK_LOW_WATER,
+    QUESTION_BANK_REFILL_BATCH,
+    QUESTION_BANK_REFILL_INTERVAL,
+    QUESTION_BANK_POPULAR_BUCKETS,
+    QUESTION_BANK_DEMAND_WINDOW,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def bucket_key(
+    kind: str, *parts: Optional[str], course_id: Optional[str] = None
+) -> str:
+    """
+    Normalised bucket name, e.g. bucket_key("questions", "Agile", "MCQ").
+    Buckets of a course other than the default one end in "@course_id".
+    """
+    key = "|".join([kind] + [" ".join((p or "").lower().split()) for p in parts])
+    return f"{key}@{course_id}" if course_id else key
+
+
+def fingerprint(question: Dict) -> str:
+    """
+    Identify a question by its wording so regenerated duplicates are dropped.
+    """
+    text = question.get("question") or (
+        f"{question.get('title', '')}\n{question.get('description', '')}"
+    )
+    normalized = " ".join(str(text).lower().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class QuestionBank:
+    """
+    SQLite store of pre-generated questions, grouped into buckets.
+
+    Each question remembers which callers it was served to so nobody sees a
+    repeat, and every bucket records how often it is asked for so the refill
+    worker knows which buckets are worth topping up. Coroutines use the
+    a-prefixed methods, which run the SQLite work in a thread.
+    """
+
+    def __init__(self, path: str = QUESTION_BANK_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                bucket TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                times_served INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                UNIQUE (bucket, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS questions_stock
+                ON questions (bucket, times_served);
+            CREATE TABLE IF NOT EXISTS served (
+                client_id TEXT NOT NULL,
+                question_id INTEGER NOT NULL,
+                served_at REAL NOT NULL,
+                PRIMARY KEY (client_id, question_id)
+            );
+            CREATE TABLE IF NOT EXISTS demand (
+                bucket TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                requests INTEGER NOT NULL DEFAULT 0,
+                last_requested REAL NOT NULL
+            );
+            """)
+        self._conn.commit()
+
+    def record_demand(self, bucket: str, kind: str, params: Dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO demand (bucket, kind, params, requests, last_requested) "
+                "VALUES (?, ?, ?, 1, ?) ON CONFLICT(bucket) DO UPDATE SET "
+                "requests = requests + 1, last_requested = excluded.last_requested",
+                (bucket, kind, json.dumps(params), time.time()),
+            )
+            self._conn.commit()
+
+    def take(
+        self, bucket: str, count: int, client_id: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        """
+        Serve count questions the caller has not seen before, least served
+        first. Returns None, serving nothing, if the bucket cannot cover the
+        whole request.
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM questions WHERE bucket = ? AND id NOT IN "
+                "(SELECT question_id FROM served WHERE client_id = ?) "
+                "ORDER BY times_served, random() LIMIT ?",
+                (bucket, client_id or "", count),
+            ).fetchall()
+            if len(rows) < count:
+                return None
+            ids = [row[0] for row in rows]
+            self._mark_served(ids, client_id, now)
+            self._conn.commit()
+        return [json.loads(payload) for _, payload in rows]
+
+    def add(
+        self,
+        bucket: str,
+        questions: List[Dict],
+        served: bool = False,
+        served_to: Optional[str] = None,
+    ) -> int:
+        """
+        Store questions in a bucket, skipping ones it already holds. With
+        served, they were just handed to a caller and count as served once,
+        and with served_to they are also recorded as seen by that caller.
+
+        Returns:
+            Number of questions that were new
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            ids = []
+            for question in questions:
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO questions "
+                    "(bucket, fingerprint, payload, created_at) VALUES (?, ?, ?, ?)",
+                    (bucket, fingerprint(question), json.dumps(question), now),
+                )
+                if cursor.rowcount:
+                    added += 1
+                    ids.append(cursor.lastrowid)
+                elif served:
+                    # Already banked (e.g. served from the response cache):
+                    # the caller has still seen it now.
+                    ids.append(
+                        self._conn.execute(
+                            "SELECT id FROM questions WHERE bucket = ? AND fingerprint = ?",
+                            (bucket, fingerprint(question)),
+                        ).fetchone()[0]
+                    )
+            if served:
+                self._mark_served(ids, served_to, now)
+            self._conn.commit()
+        return added
+
+    def _mark_served(self, ids: List[int], client_id: Optional[str], now: float):
+        self._conn.executemany(
+            "UPDATE questions SET times_served = times_served + 1 WHERE id = ?",
+            [(i,) for i in ids],
+        )
+        if client_id:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO served (client_id, question_id, served_at) "
+                "VALUES (?, ?, ?)",
+                [(client_id, i, now) for i in ids],
+            )
+
+    def stock(self, bucket: str) -> int:
+        """
+        Questions in the bucket that have never been served to anyone.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE bucket = ? AND times_served = 0",
+                (bucket,),
+            ).fetchone()[0]
+
+    def popular_buckets(self, limit: int, since: float) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket, kind, params FROM demand WHERE last_requested >= ? "
+                "ORDER BY requests DESC LIMIT ?",
+                (since, limit),
+            ).fetchall()
+        return [
+            {"bucket": bucket, "kind": kind, "params": json.loads(params)}
+            for bucket, kind, params in rows
+        ]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            questions, unserved = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(times_served = 0), 0) FROM questions"
+            ).fetchone()
+            buckets = self._conn.execute("SELECT COUNT(*) FROM demand").fetchone()[0]
+        return {"questions": questions, "unserved": unserved, "buckets": buckets}
+
+    async def arecord_demand(self, bucket: str, kind: str, params: Dict) -> None:
+        await asyncio.to_thread(self.record_demand, bucket, kind, params)
+
+    async def atake(
+        self, bucket: str, count: int, client_id: Optional[str] = None
+    ) -> Optional[List[Dict]]:
+        return await asyncio.to_thread(self.take, bucket, count, client_id)
+
+    async def aadd(
+        self,
+        bucket: str,
+        questions: List[Dict],
+        served: bool = False,
+        served_to: Optional[str] = None,
+    ) -> int:
+        return await asyncio.to_thread(self.add, bucket, questions, served, served_to)
+
+    async def astock(self, bucket: str) -> int:
+        return await asyncio.to_thread(self.stock, bucket)
+
+    async def apopular_buckets(self, limit: int, since: float) -> List[Dict]:
+        return await asyncio.to_thread(self.popular_buckets, limit, since)
+
+    async def astats(self) -> Dict:
+        return await asyncio.to_thread(self.stats)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class QuestionBankRefiller:
+    """
+    Background task that keeps popular buckets above the low-water mark.
+
+    Refills only run while is_idle() says the LLM has spare capacity, so
+    interactive requests are never queued behind bulk generation.
+
+    Args:
+        bank: The question bank to fill
+        generate: async (kind, params, count) -> list of questions
+        is_idle: () -> bool, whether there is spare LLM capacity right now
+    """
+
+    def __init__(
+        self,
+        bank: QuestionBank,
+        generate: Callable[[str, Dict, int], Awaitable[List[Dict]]],
+        is_idle: Callable[[], bool],
+        low_water: int = QUESTION_BANK_LOW_WATER,
+        batch_size: int = QUESTION_BANK_REFILL_BATCH,
+        interval: float = QUESTION_BANK_REFILL_INTERVAL,
+        popular_buckets: int = QUESTION_BANK_POPULAR_BUCKETS,
+        demand_window: float = QUESTION_BANK_DEMAND_WINDOW,
+    ):
+        self.bank = bank
+        self.generate = generate
+        self.is_idle = is_idle
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.interval = interval
+        self.popular_buckets = popular_buckets
+        self.demand_window = demand_window
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refill_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Question bank refill failed")
+
+    async def refill_once(self) -> int:
+        """
+        Top up every popular bucket that is below the low-water mark.
+
+        Returns:
+            Number of questions added
+        """
+        added = 0
+        since = time.time() - self.demand_window
+        for entry in await self.bank.apopular_buckets(self.popular_buckets, since):
+            if await self.bank.astock(entry["bucket"]) >= self.low_water:
+                continue
+            if not self.is_idle():
+                break
+            questions = await self.generate(
+                entry["kind"], entry["params"], self.batch_size
+            )
+            added += await self.bank.aadd(entry["bucket"], questions)
+        return added
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.config import (
+    RESPONSE_CACHE_PATH,
+    RESPONSE_CACHE_TTL_SECONDS,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_DISK_ENTRIES,
+)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, str):
+        return " ".join(value.casefold().split())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(namespace: str, **fields: Any) -> str:
+    """
+    Cache key for a request, insensitive to string casing and whitespace.
+    """
+    payload = json.dumps(_normalize(fields), sort_keys=True, default=str)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class _DiskTier:
+    """
+    SQLite table shared by every worker on the host. Reads ignore expired
+    rows; the oldest tenth is dropped once the table outgrows max_entries.
+    Calls may come from any thread, so they are serialised on a lock.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses(expires_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+
+    def put(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(time.time())
+            self._conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                "ORDER BY expires_at LIMIT ?)",
+                (count - int(self.max_entries * 0.9),),
+            )
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache for JSON-serialisable responses.
+
+    A per-process tier is bounded by the serialised size of its entries; an
+    optional SQLite tier behind it lets uvicorn workers on the same host share
+    responses. Values are stored as JSON, so callers always get a fresh copy.
+    The a-prefixed methods run the SQLite tier in a thread, so coroutines
+    never block the event loop on it.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        max_bytes: int = RESPONSE_CACHE_MAX_BYTES,
+        disk_path: Optional[str] = RESPONSE_CACHE_PATH,
+        max_disk_entries: int = RESPONSE_CACHE_MAX_DISK_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk = _DiskTier(disk_path, max_disk_entries) if disk_path else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _get_memory(self, key: str, now: float) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(value)
+
+    def _got_from_disk(self, key: str, row) -> Optional[Any]:
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self._store(key, value, expires_at)
+            self.disk_hits += 1
+        return json.loads(value)
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        row = self._disk.get(key, now) if self._disk is not None else None
+        return self._got_from_disk(key, row)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is not None:
+            return value
+        row = None
+        if self._disk is not None:
+            row = await asyncio.to_thread(self._disk.get, key, now)
+        return self._got_from_disk(key, row)
+
+    def _set_memory(self, key: str, value: Any, ttl_seconds: Optional[float]):
+        serialized = json.dumps(value, default=str)
+        expires_at = time.time() + (
+            self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        )
+        with self._lock:
+            self._store(key, serialized, expires_at)
+        return serialized, expires_at
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        serialized, expires_at = self._set_memory(key, value, ttl_seconds)
+        if self._disk is not None:
+            self._disk.put(key, serialized, expires_at)
+
+    async def aset(
+        self, key: str, value: Any, ttl_seconds: Optional[float] = None
+    ) -> None:
+        serialized, expires_at = self._set_memory(key, value, ttl_seconds)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.put, key, serialized, expires_at)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._remove(key)
+        if self._disk is not None:
+            self._disk.delete(key)
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Any]], fresh: bool = False
+    ) -> Any:
+        """
+        Return the cached value for key, or compute and cache it. With fresh,
+        the cached value is ignored and replaced.
+        """
+        if not fresh:
+            cached = await self.aget(key)
+            if cached is not None:
+                return cached
+        value = await compute()
+        await self.aset(key, value)
+        return value
+
+    def _store(self, key: str, serialized: str, expires_at: float):
+        size = len(serialized)
+        if size > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = (expires_at, serialized)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (
+                    round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0
+                ),
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
@@ -0,0 +1,142 @@
+from typing import Any, Callable, Dict, List
+
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.base.response.schema import Response
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from utils.response_cache import ResponseCache, request_key
+
+
+def _dump_nodes(nodes: List[NodeWithScore]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": node.node.node_id,
+            "text": node.node.get_content(),
+            "metadata": node.node.metadata,
+            "score": node.score,
+        }
+        for node in nodes
+    ]
+
+
+def _load_nodes(entries: List[Dict[str, Any]]) -> List[NodeWithScore]:
+    return [
+        NodeWithScore(
+            node=TextNode(
+                id_=entry["id"], text=entry["text"], metadata=entry["metadata"]
+            ),
+            score=entry["score"],
+        )
+        for entry in entries
+    ]
+
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever that caches the nodes another retriever returns for a query.
+
+    Entries are keyed by the normalised query, top_k and the index version,
+    so a change to the index makes every older entry unreachable.
+    """
+
+    def __init__(
+        self,
+        retriever: BaseRetriever,
+        cache: ResponseCache,
+        top_k: int,
+        index_version: Callable[[], str],
+    ):
+        super().__init__(callback_manager=retriever.callback_manager)
+        self._retriever = retriever
+        self._cache = cache
+        self._top_k = top_k
+        self._index_version = index_version
+
+    def _key(self, query_bundle: QueryBundle) -> str:
+        return request_key(
+            "retrieval",
+            query=query_bundle.query_str,
+            top_k=self._top_k,
+            index_version=self._index_version(),
+        )
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        key = self._key(query_bundle)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return _load_nodes(cached)
+        nodes = self._retriever.retrieve(query_bundle)
+        self._cache.set(key, _dump_nodes(nodes))
+        return nodes
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        key = self._key(query_bundle)
+        cached = await self._cache.aget(key)
+        if cached is not None:
+            return _load_nodes(cached)
+        nodes = await self._retriever.aretrieve(query_bundle)
+        await self._cache.aset(key, _dump_nodes(nodes))
+        return nodes
+
+
+class CachedQueryEngine(BaseQueryEngine):
+    """
+    Query engine that caches the synthesised answers (and their source nodes)
+    of another query engine, keyed like CachedRetriever.
+    """
+
+    def __init__(
+        self,
+        query_engine: BaseQueryEngine,
+        cache: ResponseCache,
+        top_k: int,
+        index_version: Callable[[], str],
+    ):
+        super().__init__(callback_manager=query_engine.callback_manager)
+        self._query_engine = query_engine
+        self._cache = cache
+        self._top_k = top_k
+        self._index_version = index_version
+
+    def _get_prompt_modules(self) -> Dict[str, Any]:
+        return {"query_engine": self._query_engine}
+
+    def _key(self, query_bundle: QueryBundle) -> str:
+        return request_key(
+            "tool_answer",
+            query=query_bundle.query_str,
+            top_k=self._top_k,
+            index_version=self._index_version(),
+        )
+
+    @staticmethod
+    def _dump(response) -> Dict[str, Any]:
+        return {
+            "response": str(response),
+            "source_nodes": _dump_nodes(getattr(response, "source_nodes", [])),
+        }
+
+    @staticmethod
+    def _load(entry: Dict[str, Any]) -> Response:
+        return Response(
+            response=entry["response"], source_nodes=_load_nodes(entry["source_nodes"])
+        )
+
+    def _query(self, query_bundle: QueryBundle) -> Response:
+        key = self._key(query_bundle)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return self._load(cached)
+        response = self._query_engine.query(query_bundle)
+        self._cache.set(key, self._dump(response))
+        return response
+
+    async def _aquery(self, query_bundle: QueryBundle) -> Response:
+        key = self._key(query_bundle)
+        cached = await self._cache.aget(key)
+        if cached is not None:
+            return self._load(cached)
+        response = await self._query_engine.aquery(query_bundle)
+        await self._cache.aset(key, self._dump(response))
+        return response
@@ -0,0 +1,1096 @@
+import asyncio
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import (
+    ARTIFACT_CACHE_DIR,
+    ARTIFACT_CACHE_MAX_ENTRIES,
+    COMPILE_TIMEOUT_SECONDS,
+    SANDBOX_CPU_SECONDS,
+    SANDBOX_WALL_SECONDS,
+    SANDBOX_MEMORY_MB,
+    SANDBOX_ISOLATION,
+)
+from utils.sandbox import (
+    JOB_DIR,
+    allow_readonly_path,
+    get_sandbox_pool,
+    to_test_result,
+)
+
+# Harnesses print this byte before their JSON result so that whatever the
+# submission itself wrote to stdout can be told apart from the result.
+RESULT_MARKER = "\x1e"
+
+_MODIFIERS = {
+    "public",
+    "private",
+    "protected",
+    "static",
+    "final",
+    "virtual",
+    "inline",
+    "override",
+    "async",
+    "function",
+    "extern",
+}
+
+
+class UnsupportedSignature(ValueError):
+    """
+    Raised when a function signature uses types a harness cannot generate.
+    """
+
+
+def _which(*names: str) -> Optional[str]:
+    for name in names:
+        path = shutil.which(name) or (
+            name if os.path.isabs(name) and os.access(name, os.X_OK) else None
+        )
+        if path:
+            return path
+    return None
+
+
+def _allow_toolchain(path: Optional[str]):
+    """
+    Let isolated sandbox workers see the installation a tool belongs to,
+    e.g. /usr for /usr/bin/gcc.
+    """
+    if path:
+        allow_readonly_path(os.path.dirname(os.path.dirname(os.path.realpath(path))))
+
+
+def _split_top_level(text: str) -> List[str]:
+    parts, depth, current = [], 0, ""
+    for char in text:
+        if char in "<([{":
+            depth += 1
+        elif char in ">)]}":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+        else:
+            current += char
+    if current.strip():
+        parts.append(current)
+    return [part.strip() for part in parts]
+
+
+def parse_signature(signature: str) -> Tuple[str, str, List[Tuple[str, str]]]:
+    """
+    Split a C-family or JavaScript function signature into its return type,
+    name and (type, name) parameters. Untyped parameters get an empty type.
+    """
+    matches = list(re.finditer(r"(\w+)\s*\(([^()]*)\)", signature))
+    if not matches:
+        raise UnsupportedSignature(f"Could not parse function signature: {signature}")
+    match = matches[-1]
+    name = match.group(1)
+    prefix = re.split(r"[{};\n=]", signature[: match.start(1)])[-1]
+    return_type = " ".join(t for t in prefix.split() if t not in _MODIFIERS)
+
+    params = []
+    for param in _split_top_level(match.group(2)):
+        param = param.split("=")[0].strip()
+        if not param:
+            continue
+        param_match = re.fullmatch(r"(.*?)\s*\b(\w+)\s*", param)
+        if not param_match:
+            raise UnsupportedSignature(f"Could not parse parameter: {param}")
+        params.append((param_match.group(1).strip(), param_match.group(2)))
+    return return_type, name, params
+
+
+def _ordered_args(params: List[Tuple[str, str]], test_input: Dict) -> List:
+    """
+    Match test case inputs to parameters by name, falling back to position.
+    """
+    names = [name for _, name in params]
+    if set(names) == set(test_input):
+        return [test_input[name] for name in names]
+    if len(names) == len(test_input):
+        return list(test_input.values())
+    raise UnsupportedSignature(
+        f"Test input keys {sorted(test_input)} do not match parameters {names}"
+    )
+
+
+def _string_literal(value) -> str:
+    if not isinstance(value, str):
+        raise UnsupportedSignature(f"Expected a string, got {value!r}")
+    return json.dumps(value)
+
+
+def _char_literal(value) -> str:
+    if not isinstance(value, str) or len(value) != 1:
+        raise UnsupportedSignature(f"Expected a single character, got {value!r}")
+    return "'" + json.dumps(value)[1:-1].replace("'", "\\'") + "'"
+
+
+def _c_escape(value: str) -> str:
+    """
+    Escape UTF-8 bytes for a C or C++ literal.
+
+    json.dumps writes control characters as \\u00XX, which C rejects below
+    U+00A0. Octal escapes never run into the character that follows.
+    """
+    out = []
+    for byte in value.encode("utf-8"):
+        char = chr(byte)
+        if char in "\"'\\?":
+            out.append("\\" + char)
+        elif 0x20 <= byte < 0x7F:
+            out.append(char)
+        else:
+            out.append(f"\\{byte:03o}")
+    return "".join(out)
+
+
+def _c_string_literal(value) -> str:
+    if not isinstance(value, str):
+        raise UnsupportedSignature(f"Expected a string, got {value!r}")
+    return f'"{_c_escape(value)}"'
+
+
+def _c_char_literal(value) -> str:
+    if not isinstance(value, str) or len(value.encode("utf-8")) != 1:
+        raise UnsupportedSignature(f"Expected a single byte character, got {value!r}")
+    return f"'{_c_escape(value)}'"
+
+
+def _number_literal(value, suffix: str = "", floating: bool = False) -> str:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise UnsupportedSignature(f"Expected a number, got {value!r}")
+    if floating:
+        return repr(float(value)) + suffix
+    if isinstance(value, float) and not value.is_integer():
+        raise UnsupportedSignature(f"Expected an integer, got {value!r}")
+    return str(int(value)) + suffix
+
+
+def _bool_literal(value) -> str:
+    if not isinstance(value, bool):
+        raise UnsupportedSignature(f"Expected a boolean, got {value!r}")
+    return "true" if value else "false"
+
+
+def _list_items(value) -> List:
+    if not isinstance(value, list):
+        raise UnsupportedSignature(f"Expected a list, got {value!r}")
+    return value
+
+
+# -- C++ -----------------------------------------------------------------
+
+_CPP_HELPERS = r"""
+namespace instruct_ai_harness {
+static std::string esc(const std::string& s) {
+    std::ostringstream o;
+    o << '"';
+    for (unsigned char c : s) {
+        if (c == '"' || c == '\\') o << '\\' << c;
+        else if (c == '\n') o << "\\n";
+        else if (c < 0x20) o << "\\u" << std::hex << std::setw(4) << std::setfill('0') << int(c) << std::dec;
+        else o << c;
+    }
+    o << '"';
+    return o.str();
+}
+static void emit(std::ostream& o, bool v) { o << (v ? "true" : "false"); }
+static void emit(std::ostream& o, char v) { o << esc(std::string(1, v)); }
+static void emit(std::ostream& o, const std::string& v) { o << esc(v); }
+static void emit(std::ostream& o, const char* v) { o << esc(v); }
+template <typename T>
+static typename std::enable_if<std::is_integral<T>::value>::type emit(std::ostream& o, T v) { o << v; }
+template <typename T>
+static typename std::enable_if<std::is_floating_point<T>::value>::type emit(std::ostream& o, T v) {
+    o << std::setprecision(17) << v;
+}
+template <typename T>
+static void emit(std::ostream& o, const std::vector<T>& v) {
+    o << '[';
+    for (size_t i = 0; i < v.size(); ++i) {
+        if (i) o << ',';
+        emit(o, static_cast<T>(v[i]));
+    }
+    o << ']';
+}
+}  // namespace instruct_ai_harness
+"""
+
+
+def _cpp_type(type_name: str) -> str:
+    type_name = re.sub(r"\bconst\b|&|\bstd::", "", type_name)
+    type_name = re.sub(r"\s*([<>,])\s*", r"\1", type_name)
+    return re.sub(r"\s+", " ", type_name).strip()
+
+
+def _cpp_spell(type_name: str) -> str:
+    return re.sub(r"\b(vector|string)\b", r"std::\1", _cpp_type(type_name))
+
+
+def _cpp_literal(type_name: str, value) -> str:
+    type_name = _cpp_type(type_name)
+    inner = re.fullmatch(r"vector<(.+)>", type_name)
+    if inner:
+        items = ", ".join(_cpp_literal(inner.group(1), v) for v in _list_items(value))
+        return f"{_cpp_spell(type_name)}{{{items}}}"
+    if type_name in ("int", "short", "unsigned", "unsigned int", "size_t"):
+        return _number_literal(value)
+    if type_name in ("long", "long long", "int64_t", "long int"):
+        return _number_literal(value, "LL")
+    if type_name in ("double", "float"):
+        return _number_literal(value, floating=True)
+    if type_name == "bool":
+        return _bool_literal(value)
+    if type_name == "string":
+        # The explicit length keeps embedded NUL characters.
+        size = len(value.encode("utf-8")) if isinstance(value, str) else 0
+        return f"std::string({_c_string_literal(value)}, {size})"
+    if type_name == "char":
+        return _c_char_literal(value)
+    raise UnsupportedSignature(f"Unsupported C++ type: {type_name}")
+
+
+def _cpp_harness(user_code, name, params, test_cases) -> str:
+    target = f"instruct_ai_solution.{name}" if "class Solution" in user_code else name
+    setup = "Solution instruct_ai_solution;" if "class Solution" in user_code else ""
+    cases = []
+    for i, tc in enumerate(test_cases):
+        args = _ordered_args(params, tc["input"])
+        decls = "".join(
+            f"{_cpp_spell(t)} a{j} = {_cpp_literal(t, v)}; "
+            for j, ((t, _), v) in enumerate(zip(params, args))
+        )
+        call = f"{target}({', '.join(f'a{j}' for j in range(len(args)))})"
+        cases.append(
+            f"case {i}: {{ {setup} {decls}auto r = {call}; "
+            f'out << "{{\\"actual\\":"; instruct_ai_harness::emit(out, r); '
+            f'out << "}}"; break; }}'
+        )
+    return f"""#include <bits/stdc++.h>
+using namespace std;
+
+{user_code}
+
+{_CPP_HELPERS}
+
+int main(int argc, char** argv) {{
+    std::ostringstream out;
+    try {{
+        switch (std::atoi(argv[1])) {{
+            {chr(10).join(cases)}
+        }}
+    }} catch (const std::exception& e) {{
+        out.str("");
+        out << "{{\\"error\\":" << instruct_ai_harness::esc(e.what()) << "}}";
+    }}
+    std::cout << std::flush << "\\n" << "{RESULT_MARKER}" << out.str() << std::endl;
+    return 0;
+}}
+"""
+
+
+# -- C -------------------------------------------------------------------
+
+_C_SCALARS = {
+    "int": ("%d", _number_literal),
+    "long": ("%ld", lambda v: _number_literal(v, "L")),
+    "long long": ("%lld", lambda v: _number_literal(v, "LL")),
+    "double": ("%.17g", lambda v: _number_literal(v, floating=True)),
+    "float": ("%.9g", lambda v: _number_literal(v, floating=True)),
+    "bool": ("%s", _bool_literal),
+}
+
+
+_C_HELPERS = r"""
+static void instruct_ai_emit_string(const char* s) {
+    if (s == NULL) {
+        printf("null");
+        return;
+    }
+    putchar('"');
+    for (; *s; s++) {
+        unsigned char c = (unsigned char) *s;
+        if (c == '"' || c == '\\') printf("\\%c", c);
+        else if (c < 0x20) printf("\\u%04x", c);
+        else putchar(c);
+    }
+    putchar('"');
+}
+"""
+
+
+def _c_type(type_name: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"\bconst\b", "", type_name)).strip()
+
+
+def _c_harness(user_code, name, params, return_type, test_cases) -> str:
+    return_type = _c_type(return_type)
+    if return_type in ("char*", "char *"):
+        emit = 'printf("{\\"actual\\":"); instruct_ai_emit_string(r); printf("}");'
+    elif return_type == "bool":
+        emit = 'printf("{\\"actual\\":%s}", r ? "true" : "false");'
+    elif return_type in _C_SCALARS:
+        emit = f'printf("{{\\"actual\\":{_C_SCALARS[return_type][0]}}}", r);'
+    else:
+        raise UnsupportedSignature(f"Unsupported C return type: {return_type}")
+
+    cases = []
+    for i, tc in enumerate(test_cases):
+        args = []
+        for (t, _), v in zip(params, _ordered_args(params, tc["input"])):
+            t = _c_type(t)
+            if t in ("char*", "char *"):
+                args.append(_c_string_literal(v))
+            elif t in _C_SCALARS:
+                args.append(_C_SCALARS[t][1](v))
+            else:
+                raise UnsupportedSignature(f"Unsupported C parameter type: {t}")
+        cases.append(
+            f"case {i}: {{ {return_type} r = {name}({', '.join(args)}); "
+            f'fflush(stdout); printf("\\n{RESULT_MARKER}"); {emit} break; }}'
+        )
+    return f"""#include <stdio.h>
+#include <stdlib.h>
+#include <stdbool.h>
+#include <string.h>
+#include <math.h>
+
+{user_code}
+
+{_C_HELPERS}
+
+int main(int argc, char** argv) {{
+    switch (atoi(argv[1])) {{
+        {chr(10).join(cases)}
+    }}
+    printf("\\n");
+    return 0;
+}}
+"""
+
+
+# -- Java ------------------------------------------------------------------
+
+_JAVA_SCALARS = {
+    "int": _number_literal,
+    "Integer": _number_literal,
+    "long": lambda v: _number_literal(v, "L"),
+    "Long": lambda v: _number_literal(v, "L"),
+    "double": lambda v: _number_literal(v, floating=True),
+    "Double": lambda v: _number_literal(v, floating=True),
+    "float": lambda v: _number_literal(v, "f", floating=True),
+    "Float": lambda v: _number_literal(v, "f", floating=True),
+    "boolean": _bool_literal,
+    "Boolean": _bool_literal,
+    "String": _string_literal,
+    "char": _char_literal,
+    "Character": _char_literal,
+}
+
+_JAVA_HELPERS = r"""
+    static String esc(String s) {
+        StringBuilder b = new StringBuilder("\"");
+        for (char c : s.toCharArray()) {
+            if (c == '"' || c == '\\') b.append('\\').append(c);
+            else if (c < 0x20) b.append(String.format("\\u%04x", (int) c));
+            else b.append(c);
+        }
+        return b.append('"').toString();
+    }
+
+    static String toJson(Object o) {
+        if (o == null) return "null";
+        if (o instanceof String || o instanceof Character) return esc(o.toString());
+        if (o instanceof Number || o instanceof Boolean) return o.toString();
+        StringBuilder b = new StringBuilder("[");
+        if (o.getClass().isArray()) {
+            for (int i = 0; i < java.lang.reflect.Array.getLength(o); i++) {
+                if (i > 0) b.append(',');
+                b.append(toJson(java.lang.reflect.Array.get(o, i)));
+            }
+        } else if (o instanceof Iterable) {
+            boolean first = true;
+            for (Object item : (Iterable<?>) o) {
+                if (!first) b.append(',');
+                b.append(toJson(item));
+                first = false;
+            }
+        } else {
+            return esc(o.toString());
+        }
+        return b.append(']').toString();
+    }
+"""
+
+
+def _java_literal(type_name: str, value) -> str:
+    type_name = re.sub(r"\s+", "", type_name)
+    if type_name.endswith("[]"):
+        inner = type_name[:-2]
+        items = ", ".join(_java_literal(inner, v) for v in _list_items(value))
+        return f"new {type_name}{{{items}}}"
+    generic = re.fullmatch(
+        r"(?:java\.util\.)?(List|ArrayList|Collection)<(.+)>", type_name
+    )
+    if generic:
+        inner = generic.group(2)
+        items = ", ".join(_java_literal(inner, v) for v in _list_items(value))
+        return f"new java.util.ArrayList<{inner}>(java.util.Arrays.<{inner}>asList({items}))"
+    if type_name in _JAVA_SCALARS:
+        return _JAVA_SCALARS[type_name](value)
+    raise UnsupportedSignature(f"Unsupported Java type: {type_name}")
+
+
+def _hoist(user_code: str, keyword: str) -> Tuple[str, str]:
+    """
+    Move import/using lines to the top of the generated file.
+    """
+    pattern = re.compile(rf"^\s*{keyword}\s+[\w.*]+\s*;\s*$", re.MULTILINE)
+    hoisted = "\n".join(m.group(0).strip() for m in pattern.finditer(user_code))
+    return hoisted, pattern.sub("", user_code)
+
+
+def _java_harness(user_code, name, params, test_cases) -> str:
+    imports, body = _hoist(user_code, "import")
+    body = re.sub(r"\bpublic\s+(?=(?:final\s+)?class\b)", "", body)
+    if not re.search(r"\bclass\s+Solution\b", body):
+        body = f"class Solution {{\n{body}\n}}"
+    cases = []
+    for i, tc in enumerate(test_cases):
+        args = _ordered_args(params, tc["input"])
+        decls = "".join(
+            f"{t} a{j} = {_java_literal(t, v)}; "
+            for j, ((t, _), v) in enumerate(zip(params, args))
+        )
+        call = f"new Solution().{name}({', '.join(f'a{j}' for j in range(len(args)))})"
+        cases.append(f"case {i}: {{ {decls}r = {call}; break; }}")
+    return f"""import java.util.*;
+{imports}
+
+{body}
+
+public class Main {{
+{_JAVA_HELPERS}
+    public static void main(String[] args) {{
+        Object r = null;
+        String out;
+        try {{
+            switch (Integer.parseInt(args[0])) {{
+                {chr(10).join(cases)}
+            }}
+            out = "{{\\"actual\\":" + toJson(r) + "}}";
+        }} catch (Throwable t) {{
+            out = "{{\\"error\\":" + esc(t.toString()) + "}}";
+        }}
+        System.out.flush();
+        System.out.print("\\n\\036" + out + "\\n");
+    }}
+}}
+"""
+
+
+# -- C# --------------------------------------------------------------------
+
+_CSHARP_SCALARS = {
+    "int": _number_literal,
+    "long": lambda v: _number_literal(v, "L"),
+    "double": lambda v: _number_literal(v, floating=True),
+    "float": lambda v: _number_literal(v, "f", floating=True),
+    "bool": _bool_literal,
+    "string": _string_literal,
+    "char": _char_literal,
+}
+
+_CSHARP_HELPERS = r"""
+    static string Esc(string s) {
+        var b = new StringBuilder("\"");
+        foreach (var c in s) {
+            if (c == '"' || c == '\\') b.Append('\\').Append(c);
+            else if (c < 0x20) b.Append("\\u" + ((int) c).ToString("x4"));
+            else b.Append(c);
+        }
+        return b.Append('"').ToString();
+    }
+
+    static string ToJson(object o) {
+        if (o == null) return "null";
+        if (o is string || o is char) return Esc(o.ToString());
+        if (o is bool) return (bool) o ? "true" : "false";
+        if (o is double || o is float) return ((IFormattable) o).ToString("R", CultureInfo.InvariantCulture);
+        if (o is IFormattable) return ((IFormattable) o).ToString(null, CultureInfo.InvariantCulture);
+        if (o is IEnumerable) {
+            var items = new List<string>();
+            foreach (var item in (IEnumerable) o) items.Add(ToJson(item));
+            return "[" + string.Join(",", items) + "]";
+        }
+        return Esc(o.ToString());
+    }
+"""
+
+
+def _csharp_literal(type_name: str, value) -> str:
+    type_name = re.sub(r"\s+", "", type_name)
+    if type_name.endswith("[]"):
+        inner = type_name[:-2]
+        items = ", ".join(_csharp_literal(inner, v) for v in _list_items(value))
+        return f"new {type_name}{{{items}}}"
+    generic = re.fullmatch(r"(?:List|IList|IEnumerable)<(.+)>", type_name)
+    if generic:
+        inner = generic.group(1)
+        items = ", ".join(_csharp_literal(inner, v) for v in _list_items(value))
+        return f"new List<{inner}>{{{items}}}"
+    if type_name in _CSHARP_SCALARS:
+        return _CSHARP_SCALARS[type_name](value)
+    raise UnsupportedSignature(f"Unsupported C# type: {type_name}")
+
+
+def _csharp_harness(user_code, name, params, test_cases) -> str:
+    usings, body = _hoist(user_code, "using")
+    if not re.search(r"\bclass\s+Solution\b", body):
+        body = f"public class Solution {{\n{body}\n}}"
+    cases = []
+    for i, tc in enumerate(test_cases):
+        args = _ordered_args(params, tc["input"])
+        decls = "".join(
+            f"{t} a{j} = {_csharp_literal(t, v)}; "
+            for j, ((t, _), v) in enumerate(zip(params, args))
+        )
+        call = f"new Solution().{name}({', '.join(f'a{j}' for j in range(len(args)))})"
+        cases.append(f"case {i}: {{ {decls}r = {call}; break; }}")
+    return f"""using System;
+using System.Collections;
+using System.Collections.Generic;
+using System.Globalization;
+using System.Linq;
+using System.Text;
+{usings}
+
+{body}
+
+public static class InstructAiHarness {{
+{_CSHARP_HELPERS}
+    public static void Main(string[] args) {{
+        object r = null;
+        string output;
+        try {{
+            switch (int.Parse(args[0])) {{
+                {chr(10).join(cases)}
+            }}
+            output = "{{\\"actual\\":" + ToJson(r) + "}}";
+        }} catch (Exception e) {{
+            output = "{{\\"error\\":" + Esc(e.GetType().Name + ": " + e.Message) + "}}";
+        }}
+        Console.Out.Flush();
+        Console.Write("\\n\\u001e" + output + "\\n");
+    }}
+}}
+"""
+
+
+_CSHARP_PROJECT = """<Project Sdk="Microsoft.NET.Sdk">
+  <PropertyGroup>
+    <OutputType>Exe</OutputType>
+    <TargetFramework>net{version}</TargetFramework>
+    <Nullable>disable</Nullable>
+    <ImplicitUsings>disable</ImplicitUsings>
+    <AssemblyName>harness</AssemblyName>
+    <StartupObject>InstructAiHarness</StartupObject>
+  </PropertyGroup>
+</Project>
+"""
+
+
+# -- JavaScript ------------------------------------------------------------
+
+
+def _javascript_harness(user_code, name, params, test_cases) -> str:
+    cases = [_ordered_args(params, tc["input"]) for tc in test_cases]
+    return f"""{user_code}
+
+;(() => {{
+    const cases = {json.dumps(cases)};
+    let out;
+    try {{
+        const fn = typeof {name} === "function"
+            ? {name}
+            : (typeof Solution === "function" ? ((s) => s.{name}.bind(s))(new Solution()) : null);
+        if (!fn) throw new Error("Function '{name}' is not defined");
+        out = {{ actual: fn(...cases[Number(process.argv[2])]) }};
+    }} catch (e) {{
+        out = {{ error: String(e) }};
+    }}
+    const replacer = (k, v) => (v === undefined ? null : v instanceof Set ? [...v] : v);
+    process.stdout.write("\\n{RESULT_MARKER}" + JSON.stringify(out, replacer) + "\\n");
+}})();
+"""
+
+
+# -- Toolchains --------------------------------------------------------------
+
+
+class Runner:
+    """
+    How to build and run generated harnesses for one language.
+    """
+
+    language = ""
+    source_name = ""
+    # JIT runtimes reserve huge virtual address spaces, so instead of an
+    # RLIMIT_AS they get a heap flag in their run command.
+    limit_address_space = True
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def harness(self, user_code: str, signature: str, test_cases: List[Dict]) -> str:
+        raise NotImplementedError
+
+    def compile_command(self, workdir: str) -> Optional[List[str]]:
+        return None
+
+    def run_command(self, workdir: str, case: int, memory_mb: int) -> List[str]:
+        raise NotImplementedError
+
+    def env(self) -> Dict[str, str]:
+        return {"PATH": "/usr/bin:/bin"}
+
+
+class CppRunner(Runner):
+    language = "C++"
+    source_name = "harness.cpp"
+
+    def __init__(self):
+        self.compiler = _which("g++", "clang++")
+        _allow_toolchain(self.compiler)
+
+    def available(self):
+        return self.compiler is not None
+
+    def harness(self, user_code, signature, test_cases):
+        _, name, params = parse_signature(signature)
+        return _cpp_harness(user_code, name, params, test_cases)
+
+    def compile_command(self, workdir):
+        return [self.compiler, "-O2", "-std=c++17", "-o", "harness", self.source_name]
+
+    def run_command(self, workdir, case, memory_mb):
+        return [os.path.join(workdir, "harness"), str(case)]
+
+
+class CRunner(Runner):
+    language = "C"
+    source_name = "harness.c"
+
+    def __init__(self):
+        self.compiler = _which("gcc", "clang", "cc")
+        _allow_toolchain(self.compiler)
+
+    def available(self):
+        return self.compiler is not None
+
+    def harness(self, user_code, signature, test_cases):
+        return_type, name, params = parse_signature(signature)
+        return _c_harness(user_code, name, params, return_type, test_cases)
+
+    def compile_command(self, workdir):
+        return [
+            self.compiler,
+            "-O2",
+            "-std=c11",
+            "-o",
+            "harness",
+            self.source_name,
+            "-lm",
+        ]
+
+    def run_command(self, workdir, case, memory_mb):
+        return [os.path.join(workdir, "harness"), str(case)]
+
+
+class JavaRunner(Runner):
+    language = "Java"
+    source_name = "Main.java"
+    limit_address_space = False
+
+    def __init__(self):
+        self.javac = _which("javac")
+        self.java = _which("java")
+        _allow_toolchain(self.javac)
+        _allow_toolchain(self.java)
+        # Debian's JDKs link their conf/ files into /etc/java-<version>.
+        for path in glob.glob("/etc/java*"):
+            allow_readonly_path(path)
+
+    def available(self):
+        return self.javac is not None and self.java is not None
+
+    def harness(self, user_code, signature, test_cases):
+        _, name, params = parse_signature(signature)
+        return _java_harness(user_code, name, params, test_cases)
+
+    def compile_command(self, workdir):
+        return [self.javac, "-d", ".", self.source_name]
+
+    def run_command(self, workdir, case, memory_mb):
+        return [
+            self.java,
+            f"-Xmx{memory_mb}m",
+            "-XX:+UseSerialGC",
+            "-Xshare:auto",
+            "-cp",
+            workdir,
+            "Main",
+            str(case),
+        ]
+
+
+class CSharpRunner(Runner):
+    language = "C#"
+    limit_address_space = False
+
+    def __init__(self):
+        self.mcs = _which("mcs")
+        self.mono = _which("mono")
+        _allow_toolchain(self.mcs)
+        _allow_toolchain(self.mono)
+        self.dotnet = _which("dotnet", os.path.expanduser("~/.dotnet/dotnet"))
+        self.dotnet_version = self._dotnet_version() if self.dotnet else None
+        self.source_name = "harness.cs"
+        if self.dotnet:
+            allow_readonly_path(os.path.dirname(os.path.realpath(self.dotnet)))
+
+    def _dotnet_version(self) -> Optional[str]:
+        sdk_dir = os.path.join(os.path.dirname(os.path.realpath(self.dotnet)), "sdk")
+        versions = [
+            v
+            for v in (os.listdir(sdk_dir) if os.path.isdir(sdk_dir) else [])
+            if re.match(r"\d+\.\d+", v)
+        ]
+        if not versions:
+            return None
+        latest = max(
+            versions, key=lambda v: [int(p) for p in re.findall(r"\d+", v)[:2]]
+        )
+        return ".".join(latest.split(".")[:2])
+
+    def available(self):
+        return bool(self.mcs and self.mono) or bool(self.dotnet_version)
+
+    def harness(self, user_code, signature, test_cases):
+        _, name, params = parse_signature(signature)
+        return _csharp_harness(user_code, name, params, test_cases)
+
+    def prepare(self, workdir: str):
+        if not (self.mcs and self.mono):
+            with open(os.path.join(workdir, "harness.csproj"), "w") as f:
+                f.write(_CSHARP_PROJECT.format(version=self.dotnet_version))
+
+    def compile_command(self, workdir):
+        if self.mcs and self.mono:
+            return [self.mcs, "-optimize+", "-out:harness.exe", self.source_name]
+        return [
+            self.dotnet,
+            "build",
+            "-c",
+            "Release",
+            "-o",
+            "out",
+            "--nologo",
+            "-v",
+            "quiet",
+        ]
+
+    def run_command(self, workdir, case, memory_mb):
+        if self.mcs and self.mono:
+            return [self.mono, os.path.join(workdir, "harness.exe"), str(case)]
+        return [self.dotnet, os.path.join(workdir, "out", "harness.dll"), str(case)]
+
+    def env(self):
+        env = super().env()
+        if self.dotnet:
+            env.update(
+                DOTNET_ROOT=os.path.dirname(os.path.realpath(self.dotnet)),
+                DOTNET_CLI_HOME=(
+                    "/tmp"
+                    if SANDBOX_ISOLATION
+                    else os.path.join(ARTIFACT_CACHE_DIR, ".dotnet-home")
+                ),
+                DOTNET_CLI_TELEMETRY_OPTOUT="1",
+                DOTNET_SKIP_FIRST_TIME_EXPERIENCE="1",
+                DOTNET_NOLOGO="1",
+            )
+        return env
+
+
+class JavaScriptRunner(Runner):
+    language = "JavaScript"
+    source_name = "harness.js"
+    limit_address_space = False
+
+    def __init__(self):
+        self.node = _which("node", "nodejs")
+        _allow_toolchain(self.node)
+
+    def available(self):
+        return self.node is not None
+
+    def harness(self, user_code, signature, test_cases):
+        _, name, params = parse_signature(signature)
+        return _javascript_harness(user_code, name, params, test_cases)
+
+    def compile_command(self, workdir):
+        # Nothing to compile; a syntax check still catches errors up front.
+        return [self.node, "--check", self.source_name]
+
+    def run_command(self, workdir, case, memory_mb):
+        return [
+            self.node,
+            f"--max-old-space-size={memory_mb}",
+            os.path.join(workdir, self.source_name),
+            str(case),
+        ]
+
+
+RUNNERS: Dict[str, Runner] = {
+    runner.language: runner
+    for runner in (
+        CppRunner(),
+        CRunner(),
+        JavaRunner(),
+        CSharpRunner(),
+        JavaScriptRunner(),
+    )
+    if runner.available()
+}
+
+
+def can_run(language: str, signature: str, test_cases: List[Dict]) -> bool:
+    """
+    Whether a harness can be generated for this language and question.
+    """
+    runner = RUNNERS.get(language)
+    if runner is None:
+        return False
+    try:
+        runner.harness("", signature, test_cases)
+    except (UnsupportedSignature, KeyError, TypeError):
+        return False
+    return True
+
+
+# -- Compile cache -----------------------------------------------------------
+
+# key -> [lock, number of callers holding or waiting for it]
+_compile_locks: Dict[str, List] = {}
+
+
+def _artifact_key(language: str, source: str) -> str:
+    return hashlib.sha256(f"{language}\0{source}".encode("utf-8")).hexdigest()
+
+
+def _prune_artifacts():
+    entries = [
+        os.path.join(ARTIFACT_CACHE_DIR, name)
+        for name in os.listdir(ARTIFACT_CACHE_DIR)
+        if not name.startswith(".")
+    ]
+    if len(entries) <= ARTIFACT_CACHE_MAX_ENTRIES:
+        return
+    entries.sort(key=os.path.getmtime)
+    for path in entries[: len(entries) - ARTIFACT_CACHE_MAX_ENTRIES]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+async def _compile(runner: Runner, source: str) -> Tuple[str, Optional[str], bool]:
+    """
+    Build a harness once per distinct source, reusing the cached artifact.
+
+    Returns:
+        (artifact directory, compile error or None, whether it was cached)
+    """
+    key = _artifact_key(runner.language, source)
+    artifact_dir = os.path.join(ARTIFACT_CACHE_DIR, key)
+    entry = _compile_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            if os.path.exists(os.path.join(artifact_dir, "ok")):
+                os.utime(artifact_dir)
+                return artifact_dir, None, True
+            error_path = os.path.join(artifact_dir, "compile_error.txt")
+            if os.path.exists(error_path):
+                with open(error_path) as f:
+                    return artifact_dir, f.read(), True
+
+            os.makedirs(ARTIFACT_CACHE_DIR, exist_ok=True)
+            build_dir = f"{artifact_dir}.{os.getpid()}.tmp"
+            shutil.rmtree(build_dir, ignore_errors=True)
+            os.makedirs(build_dir)
+            with open(os.path.join(build_dir, runner.source_name), "w") as f:
+                f.write(source)
+            if hasattr(runner, "prepare"):
+                runner.prepare(build_dir)
+
+            # Compilers run in the sandbox too: a submission must not be able
+            # to #include a file of the server into its compile errors.
+            workdir = JOB_DIR if SANDBOX_ISOLATION else build_dir
+            pool = await get_sandbox_pool()
+            [output] = await pool.run(
+                [
+                    {
+                        "command": runner.compile_command(workdir),
+                        "cwd": workdir,
+                        "job_dir": os.path.abspath(build_dir),
+                        "writable": True,
+                        "merge_stderr": True,
+                        "env": runner.env(),
+                        "cpu_seconds": math.ceil(COMPILE_TIMEOUT_SECONDS),
+                        "wall_seconds": COMPILE_TIMEOUT_SECONDS,
+                        "memory_mb": None,
+                    }
+                ]
+            )
+            if output["status"] != "ok":
+                # A timeout or crash may be the host, not the source: don't
+                # cache it, so the next submission of this source retries.
+                shutil.rmtree(build_dir, ignore_errors=True)
+                if output["status"] in ("wall_timeout", "cpu_timeout"):
+                    return (
+                        artifact_dir,
+                        f"Compilation timed out after {COMPILE_TIMEOUT_SECONDS}s",
+                        False,
+                    )
+                return artifact_dir, output["error"], False
+            if output["exit_code"] != 0:
+                error = output["stdout"][-4000:] or (
+                    f"Compiler exited with status {output['exit_code']}"
+                )
+            else:
+                error = None
+
+            with open(
+                os.path.join(build_dir, "compile_error.txt" if error else "ok"), "w"
+            ) as f:
+                f.write(error or "")
+            # Another worker process may have won the race; keep theirs.
+            try:
+                os.rename(build_dir, artifact_dir)
+            except OSError:
+                shutil.rmtree(build_dir, ignore_errors=True)
+            _prune_artifacts()
+            return artifact_dir, error, False
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            _compile_locks.pop(key, None)
+
+
+def _parse_output(output: Dict) -> Dict:
+    """
+    Turn a command job's raw stdout into the shape of a Python job result.
+    """
+    if output["status"] != "ok":
+        return output
+    stdout = output["stdout"]
+    if RESULT_MARKER not in stdout:
+        return {
+            "status": "crashed",
+            "actual": None,
+            "error": f"Process exited with status {output['exit_code']}",
+            "duration_ms": output.get("duration_ms"),
+        }
+    try:
+        payload = json.loads(stdout.rsplit(RESULT_MARKER, 1)[1].strip())
+        if not isinstance(payload, dict):
+            raise ValueError("result is not an object")
+    except ValueError:
+        # e.g. a crash halfway through printing, a NaN printed by the C
+        # harness, or a submission writing the marker itself at exit.
+        return {
+            "status": "crashed",
+            "actual": None,
+            "error": f"Malformed result (exit status {output['exit_code']})",
+            "duration_ms": output.get("duration_ms"),
+        }
+    return {
+        "status": "ok",
+        "actual": payload.get("actual"),
+        "error": payload.get("error"),
+        "duration_ms": output.get("duration_ms"),
+    }
+
+
+async def run_compiled_test_cases(
+    language: str,
+    user_code: str,
+    function_signature: str,
+    test_cases: List[Dict],
+    cpu_seconds: int = SANDBOX_CPU_SECONDS,
+    wall_seconds: float = SANDBOX_WALL_SECONDS,
+    memory_mb: int = SANDBOX_MEMORY_MB,
+) -> Dict:
+    """
+    Compile (or reuse) a harness for the submission and run each test case
+    on the sandbox pool.
+
+    Returns:
+        Dict with test_results, compile_time_ms, run_time_ms and
+        artifact_cached
+    """
+    runner = RUNNERS[language]
+    source = runner.harness(user_code, function_signature, test_cases)
+
+    started = time.perf_counter()
+    artifact_dir, compile_error, cached = await _compile(runner, source)
+    compile_time_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    started = time.perf_counter()
+    if compile_error:
+        outputs = [
+            {
+                "status": "ok",
+                "actual": None,
+                "error": f"Compilation failed:\n{compile_error}",
+            }
+            for _ in test_cases
+        ]
+    else:
+        # Isolated jobs see the artifact directory, read-only, at JOB_DIR.
+        workdir = JOB_DIR if SANDBOX_ISOLATION else artifact_dir
+        jobs = [
+            {
+                "command": runner.run_command(workdir, i, memory_mb),
+                "cwd": workdir,
+                "job_dir": os.path.abspath(artifact_dir),
+                "env": runner.env(),
+                "cpu_seconds": cpu_seconds,
+                "wall_seconds": wall_seconds,
+                "memory_mb": memory_mb if runner.limit_address_space else None,
+            }
+            for i in range(len(test_cases))
+        ]
+        pool = await get_sandbox_pool()
+        outputs = [_parse_output(output) for output in await pool.run(jobs)]
+    run_time_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    return {
+        "test_results": [
+            to_test_result(tc, output, cpu_seconds, wall_seconds)
+            for tc, output in zip(test_cases, outputs)
+        ],
+        "compile_time_ms": compile_time_ms,
+        "run_time_ms": run_time_ms,
+        "artifact_cached": cached,
+    }
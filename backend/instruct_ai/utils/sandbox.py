@@ -0,0 +1,383 @@
+import asyncio
+import json
+import math
+import os
+import re
+import signal
+import sys
+import tempfile
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from utils.config import (
+    ARTIFACT_CACHE_DIR,
+    SANDBOX_CPU_SECONDS,
+    SANDBOX_WALL_SECONDS,
+    SANDBOX_MEMORY_MB,
+    SANDBOX_POOL_SIZE,
+    SANDBOX_MAX_RUNS_PER_WORKER,
+    SANDBOX_MAX_QUEUE_DEPTH,
+    SANDBOX_ISOLATION,
+    SANDBOX_UID,
+    SANDBOX_MAX_PROCESSES,
+    SANDBOX_TMP_MB,
+    SANDBOX_READONLY_PATHS,
+)
+
+WORKER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py"
+)
+
+# Where an isolated job sees its own directory under ARTIFACT_CACHE_DIR.
+JOB_DIR = "/job"
+
+# What an isolated worker can see of the host, all of it read-only: the
+# system's programs and libraries and this interpreter's standard library.
+# Runners add their toolchains with allow_readonly_path().
+_readonly_paths = [
+    "/usr",
+    "/bin",
+    "/sbin",
+    "/lib",
+    "/lib32",
+    "/lib64",
+    "/etc/alternatives",
+    "/etc/ld.so.cache",
+    os.path.realpath(sys.base_prefix),
+    *SANDBOX_READONLY_PATHS,
+]
+
+
+def allow_readonly_path(path: str):
+    """
+    Make a host path visible, read-only, to isolated workers started from
+    now on.
+    """
+    path = os.path.realpath(path)
+    if path not in _readonly_paths:
+        _readonly_paths.append(path)
+
+
+# Languages the warm workers execute directly; compiled languages go through
+# utils/runners.py, and anything else is evaluated by the LLM.
+SUPPORTED_LANGUAGES = {"Python"}
+
+
+def extract_function_name(function_signature: str) -> str:
+    """
+    Pull the callable's name out of a question's function_signature.
+    """
+    match = re.search(r"def\s+(\w+)\s*\(", function_signature) or re.search(
+        r"(\w+)\s*\(", function_signature
+    )
+    if not match:
+        raise ValueError(
+            f"Could not find a function name in signature: {function_signature}"
+        )
+    return match.group(1)
+
+
+def outputs_match(actual: Any, expected: Any) -> bool:
+    """
+    Compare a returned value to the expected one, treating tuples as lists and
+    allowing for floating point error.
+    """
+    if isinstance(expected, float) or isinstance(actual, float):
+        if isinstance(actual, bool) or isinstance(expected, bool):
+            return actual == expected
+        if isinstance(actual, (int, float)) and isinstance(expected, (int, float)):
+            return math.isclose(actual, expected, rel_tol=1e-6, abs_tol=1e-9)
+        return False
+    if isinstance(expected, (list, tuple)) and isinstance(actual, (list, tuple)):
+        return len(actual) == len(expected) and all(
+            outputs_match(a, e) for a, e in zip(actual, expected)
+        )
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        return actual.keys() == expected.keys() and all(
+            outputs_match(actual[k], v) for k, v in expected.items()
+        )
+    return actual == expected
+
+
+class SandboxBusy(Exception):
+    """
+    Raised when the sandbox queue is full and a submission cannot be accepted.
+    """
+
+
+class _Worker:
+    """
+    One warm sandbox_worker.py process. Every job runs in a fresh fork of it.
+    """
+
+    def __init__(self, max_runs: int, workdir: str, uid: int):
+        self.max_runs = max_runs
+        self.workdir = workdir
+        self.uid = uid
+        self.runs = 0
+        self.proc = None
+
+    def _isolation_config(self) -> List[str]:
+        if not SANDBOX_ISOLATION:
+            return []
+        config = {
+            "uid": self.uid,
+            "readonly_paths": _readonly_paths,
+            "jobs_root": os.path.abspath(ARTIFACT_CACHE_DIR),
+            "job_dir": JOB_DIR,
+            "tmp_mb": SANDBOX_TMP_MB,
+            "max_processes": SANDBOX_MAX_PROCESSES,
+        }
+        return [json.dumps(config)]
+
+    async def start(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-I",
+            "-S",
+            WORKER_PATH,
+            *self._isolation_config(),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            cwd=self.workdir,
+            env={"PATH": "/usr/bin:/bin"},
+            # New session so stopping the worker takes its children with it.
+            start_new_session=True,
+        )
+        self.runs = 0
+        line = await self.proc.stdout.readline()
+        try:
+            ready = json.loads(line)
+        except ValueError:
+            ready = {"ready": False, "error": "worker exited during startup"}
+        if not ready.get("ready"):
+            await self.stop()
+            raise RuntimeError(
+                f"Could not start a sandbox worker: {ready.get('error')}. "
+                "Isolation needs Linux user, mount, PID and network namespaces "
+                "(or root); set SANDBOX_ISOLATION=false to run without it."
+            )
+
+    async def stop(self):
+        if self.proc is None or self.proc.returncode is not None:
+            return
+        try:
+            os.killpg(self.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await self.proc.wait()
+
+    async def run(self, job: Dict) -> Dict:
+        try:
+            if self.proc is None or self.proc.returncode is not None:
+                await self.start()
+            elif self.runs >= self.max_runs:
+                await self.stop()
+                await self.start()
+        except RuntimeError as e:
+            return {"status": "crashed", "actual": None, "error": str(e)}
+        self.runs += 1
+        self.proc.stdin.write(json.dumps(job).encode("utf-8") + b"\n")
+        try:
+            await self.proc.stdin.drain()
+            # The worker enforces the wall clock itself; this is only a
+            # backstop in case the worker process wedges.
+            line = await asyncio.wait_for(
+                self.proc.stdout.readline(), timeout=job["wall_seconds"] + 5
+            )
+            if not line:
+                raise ConnectionError("sandbox worker exited")
+            return json.loads(line)
+        except (asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            await self.stop()
+            return {
+                "status": "crashed",
+                "actual": None,
+                "error": f"Sandbox worker failed: {e!r}",
+            }
+
+
+class _Submission:
+    def __init__(self, jobs: List[Dict]):
+        self.pending = deque(enumerate(jobs))
+        self.results: List[Optional[Dict]] = [None] * len(jobs)
+        self.remaining = len(jobs)
+        self.done = asyncio.get_running_loop().create_future()
+
+
+class SandboxPool:
+    """
+    Pre-forked pool of warm sandbox workers.
+
+    The test cases of one submission run in parallel across workers, and
+    submissions are served round-robin one test case at a time, so a large
+    submission cannot starve the ones queued behind it.
+    """
+
+    def __init__(
+        self,
+        size: int = SANDBOX_POOL_SIZE,
+        max_runs_per_worker: int = SANDBOX_MAX_RUNS_PER_WORKER,
+        max_queue_depth: int = SANDBOX_MAX_QUEUE_DEPTH,
+    ):
+        self.size = size
+        self.max_queue_depth = max_queue_depth
+        self._workdir = tempfile.TemporaryDirectory(prefix="sandbox-")
+        # One uid per worker, so the process limit of one worker's jobs does
+        # not count those of the others.
+        self._workers = [
+            _Worker(max_runs_per_worker, self._workdir.name, SANDBOX_UID + i)
+            for i in range(size)
+        ]
+        self._ready = deque()
+        self._queued = 0
+        self._wakeup = asyncio.Condition()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        os.makedirs(ARTIFACT_CACHE_DIR, exist_ok=True)
+        await asyncio.gather(*(worker.start() for worker in self._workers))
+        self._tasks = [
+            asyncio.create_task(self._serve(worker)) for worker in self._workers
+        ]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await asyncio.gather(*(worker.stop() for worker in self._workers))
+        self._workdir.cleanup()
+
+    async def _next_job(self):
+        async with self._wakeup:
+            while not self._ready:
+                await self._wakeup.wait()
+            submission = self._ready.popleft()
+            index, job = submission.pending.popleft()
+            if submission.pending:
+                self._ready.append(submission)
+            self._queued -= 1
+            return submission, index, job
+
+    async def _serve(self, worker: _Worker):
+        while True:
+            submission, index, job = await self._next_job()
+            result = await worker.run(job)
+            submission.results[index] = result
+            submission.remaining -= 1
+            if submission.remaining == 0 and not submission.done.done():
+                submission.done.set_result(submission.results)
+
+    async def run(self, jobs: List[Dict]) -> List[Dict]:
+        if not jobs:
+            return []
+        if self._queued + len(jobs) > self.max_queue_depth:
+            raise SandboxBusy("Code execution queue is full, try again shortly")
+        submission = _Submission(jobs)
+        async with self._wakeup:
+            self._queued += len(jobs)
+            self._ready.append(submission)
+            self._wakeup.notify(len(jobs))
+        try:
+            return await submission.done
+        except asyncio.CancelledError:
+            # The client went away: drop whatever has not started yet.
+            if submission in self._ready:
+                self._ready.remove(submission)
+                self._queued -= len(submission.pending)
+                submission.pending.clear()
+            raise
+
+    def stats(self) -> Dict:
+        return {
+            "size": self.size,
+            "queued": self._queued,
+            "active_submissions": len(self._ready),
+        }
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = SandboxPool()
+            await pool.start()
+            _pool = pool
+    return _pool
+
+
+async def shutdown_sandbox_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def to_test_result(
+    test_case: Dict, output: Dict, cpu_seconds: int, wall_seconds: float
+) -> Dict:
+    result = {
+        "passed": False,
+        "input": test_case["input"],
+        "expected": test_case["expected"],
+        "actual": output.get("actual"),
+        "error": output.get("error"),
+        "duration_ms": output.get("duration_ms"),
+    }
+    if output["status"] == "wall_timeout":
+        result["error"] = f"Time limit exceeded ({wall_seconds}s wall clock)"
+    elif output["status"] == "cpu_timeout":
+        result["error"] = f"Time limit exceeded ({cpu_seconds}s CPU)"
+    else:
+        result["passed"] = output["status"] == "ok" and (
+            result["error"] is None
+            and outputs_match(result["actual"], test_case["expected"])
+        )
+    return result
+
+
+async def run_test_cases(
+    user_code: str,
+    function_signature: str,
+    test_cases: List[Dict],
+    cpu_seconds: int = SANDBOX_CPU_SECONDS,
+    wall_seconds: float = SANDBOX_WALL_SECONDS,
+    memory_mb: int = SANDBOX_MEMORY_MB,
+) -> List[Dict]:
+    """
+    Run every test case of a submission on the warm sandbox pool.
+
+    Returns:
+        List of dicts shaped like TestResult, in test case order
+    """
+    function_name = extract_function_name(function_signature)
+    jobs = [
+        {
+            "code": user_code,
+            "function_name": function_name,
+            "input": tc["input"],
+            "cpu_seconds": cpu_seconds,
+            "wall_seconds": wall_seconds,
+            "memory_mb": memory_mb,
+        }
+        for tc in test_cases
+    ]
+    pool = await get_sandbox_pool()
+    outputs = await pool.run(jobs)
+    return [
+        to_test_result(tc, output, cpu_seconds, wall_seconds)
+        for tc, output in zip(test_cases, outputs)
+    ]
+
+
+def summarize_results(test_results: List[Dict]) -> Dict:
+    passed = sum(1 for r in test_results if r["passed"])
+    total = len(test_results)
+    return {
+        "passed": total > 0 and passed == total,
+        "score": round(100.0 * passed / total, 2) if total else 0.0,
+    }
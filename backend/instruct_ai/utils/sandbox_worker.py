@@ -0,0 +1,496 @@
+"""
+Warm sandbox worker for running test cases of submitted Python solutions.
+
+Executed as a standalone script (``python -I -S sandbox_worker.py``) by
+utils/sandbox.py, so it must not import anything from the instruct_ai
+package. The process stays alive and reads one JSON job per line from stdin.
+Each job runs in a freshly forked child that limits its own resources, so
+nothing a submission does can leak into the next job. A job either carries
+Python source to exec, or a command (a compiled test harness) to exec into.
+One JSON result line is written to stdout per job; anything a Python
+submission prints is discarded, while a command's stdout is returned.
+
+Given a JSON config as its argument, the worker first moves itself into new
+user (unless it runs as root), mount, PID, IPC, UTS and network namespaces
+and pivots into a root that only holds read-only binds of the configured
+paths. It then serves jobs as PID 1 of its namespace. Each job gets a private
+/tmp, sees only its own job directory (at config["job_dir"]), and drops to
+an unprivileged uid without capabilities before any submitted code runs.
+Whatever a job leaves running is killed before the next one starts. The
+first line on stdout reports whether this setup worked.
+"""
+
+import ctypes
+import io
+import json
+import os
+import resource
+import select
+import signal
+import sys
+import time
+import traceback
+
+# Imported once here so forked children start warm.
+import bisect, collections, functools, heapq, itertools, math, re, string, typing  # noqa
+
+_PRELUDE = compile("from typing import *", "<prelude>", "exec")
+
+# Only the tail of a job's output is kept; the result is always written last.
+_MAX_OUTPUT = 1 << 20
+
+# From <sched.h>, <sys/mount.h>, <sys/prctl.h> and <linux/capability.h>.
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_NOATIME = 0x400
+MS_NODIRATIME = 0x800
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MS_RELATIME = 0x200000
+MNT_DETACH = 0x2
+PR_SET_PDEATHSIG = 1
+PR_SET_DUMPABLE = 4
+PR_SET_NO_NEW_PRIVS = 38
+_LINUX_CAPABILITY_VERSION_3 = 0x20080522
+_SYS_PIVOT_ROOT = {"x86_64": 155, "aarch64": 41, "riscv64": 41}
+
+# Where the host directory holding the job directories is mounted; each job
+# unmounts it after binding its own directory.
+_JOBS_MOUNT = "/.jobs"
+_DEVICES = ("null", "zero", "full", "random", "urandom")
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+# The worker's config once it has isolated itself, else None.
+_sandbox = None
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [("version", ctypes.c_uint32), ("pid", ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [
+        ("effective", ctypes.c_uint32),
+        ("permitted", ctypes.c_uint32),
+        ("inheritable", ctypes.c_uint32),
+    ]
+
+
+def _check(result, what):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"{what}: {os.strerror(errno)}")
+
+
+def _bytes(value):
+    return None if value is None else os.fsencode(value)
+
+
+def _mount(source, target, fstype=None, flags=0, data=None):
+    _check(
+        _libc.mount(
+            _bytes(source),
+            _bytes(target),
+            _bytes(fstype),
+            ctypes.c_ulong(flags),
+            _bytes(data),
+        ),
+        f"mount {target}",
+    )
+
+
+def _umount(target):
+    _check(_libc.umount2(_bytes(target), MNT_DETACH), f"umount {target}")
+
+
+def _locked_flags(path):
+    # Inside a user namespace a bind mount must keep the flags of the mount
+    # it was made from, so a remount has to repeat them.
+    flags = os.statvfs(path).f_flag
+    kept = 0
+    for st_flag, ms_flag in (
+        (os.ST_NOEXEC, MS_NOEXEC),
+        (os.ST_NOATIME, MS_NOATIME),
+        (os.ST_NODIRATIME, MS_NODIRATIME),
+        (os.ST_RELATIME, MS_RELATIME),
+    ):
+        if flags & st_flag:
+            kept |= ms_flag
+    return kept
+
+
+def _bind(source, target, readonly=True):
+    if os.path.isdir(source):
+        os.makedirs(target, exist_ok=True)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        open(target, "a").close()
+    _mount(source, target, flags=MS_BIND | MS_REC)
+    if readonly:
+        _mount(
+            None,
+            target,
+            flags=MS_BIND
+            | MS_REMOUNT
+            | MS_RDONLY
+            | MS_NOSUID
+            | MS_NODEV
+            | _locked_flags(target),
+        )
+
+
+def _add_path(root, path):
+    if not os.path.lexists(path) or os.path.lexists(root + path):
+        return
+    if os.path.islink(path):
+        # e.g. /bin -> usr/bin on merged-/usr systems.
+        os.makedirs(os.path.dirname(root + path), exist_ok=True)
+        os.symlink(os.readlink(path), root + path)
+    else:
+        _bind(path, root + path)
+
+
+def _enter_namespaces(config):
+    """
+    Unshare everything and fork: only children of the unsharing process join
+    the new PID namespace, so the child becomes its PID 1 and carries on as
+    the worker, while the parent stays behind to pass on its exit status.
+    """
+    uid, gid = os.geteuid(), os.getegid()
+    flags = CLONE_NEWNS | CLONE_NEWPID | CLONE_NEWNET | CLONE_NEWIPC | CLONE_NEWUTS
+    if uid != 0:
+        flags |= CLONE_NEWUSER
+    _check(_libc.unshare(flags), "unshare")
+    if uid != 0:
+        # Our own uid is the only one we may map; inside it becomes the
+        # sandbox uid, and we keep the namespace's capabilities until a job
+        # drops them.
+        for name, line in (
+            ("setgroups", "deny"),
+            ("uid_map", f"{config['uid']} {uid} 1"),
+            ("gid_map", f"{config['uid']} {gid} 1"),
+        ):
+            with open(f"/proc/self/{name}", "w") as f:
+                f.write(line)
+    pid = os.fork()
+    if pid:
+        _, status = os.waitpid(pid, 0)
+        os._exit(0 if status == 0 else 1)
+    _check(_libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0), "prctl")
+    # Without a user namespace of their own, jobs share our uid; this keeps
+    # them from ptracing the worker and taking over its capabilities.
+    _check(_libc.prctl(PR_SET_DUMPABLE, 0, 0, 0, 0), "prctl")
+    # Signals from inside the namespace only reach PID 1 through handlers,
+    # and Python installs one for SIGINT.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _build_root(config):
+    _mount(None, "/", flags=MS_REC | MS_PRIVATE)
+    # The worker's cwd is a scratch directory of the pool; cover it with the
+    # new root so nothing from the host is left in it.
+    root = os.getcwd()
+    _mount("tmpfs", root, "tmpfs", MS_NOSUID | MS_NODEV, "mode=0755,size=1m")
+    for path in config["readonly_paths"]:
+        _add_path(root, path)
+    for device in _DEVICES:
+        _bind(f"/dev/{device}", f"{root}/dev/{device}", readonly=False)
+    for fd, name in enumerate(("stdin", "stdout", "stderr")):
+        os.symlink(f"/proc/self/fd/{fd}", f"{root}/dev/{name}")
+    os.symlink("/proc/self/fd", f"{root}/dev/fd")
+    # Some toolchains (MSBuild, for one) insist on a name for their uid.
+    os.makedirs(f"{root}/etc", exist_ok=True)
+    uid = config["uid"]
+    with open(f"{root}/etc/passwd", "w") as f:
+        f.write(
+            f"root:x:0:0::/:/sbin/nologin\nsandbox:x:{uid}:{uid}::/tmp:/sbin/nologin\n"
+        )
+    with open(f"{root}/etc/group", "w") as f:
+        f.write(f"root:x:0:\nsandbox:x:{uid}:\n")
+    os.makedirs(root + config["job_dir"])
+    os.mkdir(f"{root}/tmp")
+    # Writable, as compile jobs get their build directory read-write; no job
+    # can see it, as each one unmounts it before dropping privileges.
+    _bind(config["jobs_root"], root + _JOBS_MOUNT, readonly=False)
+    os.mkdir(f"{root}/proc")
+    try:
+        _mount("proc", f"{root}/proc", "proc", MS_NOSUID | MS_NODEV | MS_NOEXEC)
+    except OSError:
+        # Container runtimes that mask parts of the host's /proc forbid new
+        # proc mounts in a user namespace; jobs then run without /proc.
+        pass
+
+    os.chdir(root)
+    os.mkdir(".old")
+    _check(
+        _libc.syscall(_SYS_PIVOT_ROOT[os.uname().machine], b".", b".old"),
+        "pivot_root",
+    )
+    os.chdir("/")
+    _umount("/.old")
+    os.rmdir("/.old")
+    _mount(None, "/", flags=MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+
+
+def isolate(config):
+    global _sandbox
+    _enter_namespaces(config)
+    _build_root(config)
+    _sandbox = config
+
+
+def _enter_sandbox(job):
+    """
+    In a job's child: give it a private /tmp and its own job directory
+    only, then drop every privilege before submitted code runs.
+    """
+    _check(_libc.unshare(CLONE_NEWNS), "unshare")
+    _mount(
+        "tmpfs",
+        "/tmp",
+        "tmpfs",
+        MS_NOSUID | MS_NODEV,
+        f"mode=1777,size={_sandbox['tmp_mb']}m",
+    )
+    if job.get("job_dir"):
+        relative = os.path.relpath(job["job_dir"], _sandbox["jobs_root"])
+        if relative in (".", "..") or relative.startswith("../"):
+            raise ValueError(f"Job directory outside {_sandbox['jobs_root']}")
+        source = os.path.join(_JOBS_MOUNT, relative)
+        if job.get("writable"):
+            os.chown(source, _sandbox["uid"], _sandbox["uid"])
+        _bind(source, _sandbox["job_dir"], readonly=not job.get("writable"))
+    _umount(_JOBS_MOUNT)
+    os.chdir(job.get("cwd") or "/tmp")
+
+    resource.setrlimit(
+        resource.RLIMIT_NPROC,
+        (_sandbox["max_processes"], _sandbox["max_processes"]),
+    )
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "prctl")
+    if os.geteuid() == 0:
+        uid = _sandbox["uid"]
+        os.setgroups([])
+        os.setresgid(uid, uid, uid)
+        os.setresuid(uid, uid, uid)
+    else:
+        # Already the sandbox uid in our own user namespace, but still
+        # holding that namespace's capabilities.
+        header = _CapHeader(_LINUX_CAPABILITY_VERSION_3, 0)
+        _check(_libc.capset(ctypes.byref(header), (_CapData * 2)()), "capset")
+
+
+def _kill_leftovers():
+    """
+    As PID 1 of the namespace, kill whatever the last job left behind (e.g.
+    a daemonised or forked process) and reap it.
+    """
+    try:
+        os.kill(-1, signal.SIGKILL)
+    except ProcessLookupError:
+        return
+    while True:
+        try:
+            os.waitpid(-1, 0)
+        except ChildProcessError:
+            return
+
+
+def _jsonable(value):
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+
+def _resolve(namespace, function_name):
+    if callable(namespace.get(function_name)):
+        return namespace[function_name]
+    # LeetCode-style submissions wrap the function in a Solution class.
+    solution = namespace.get("Solution")
+    if solution is not None and hasattr(solution, function_name):
+        return getattr(solution(), function_name)
+    raise NameError(f"Function '{function_name}' is not defined")
+
+
+def _limit_resources(cpu_seconds, memory_mb):
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    # JIT runtimes reserve far more address space than they use, so their
+    # jobs pass memory_mb=None and cap the heap with a runtime flag instead.
+    if memory_mb is not None:
+        memory = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (1 << 20, 1 << 20))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _exec_child(job, write_fd):
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(write_fd, 1)
+    os.dup2(write_fd if job.get("merge_stderr") else devnull, 2)
+    try:
+        if _sandbox is not None:
+            _enter_sandbox(job)
+        else:
+            os.chdir(job.get("cwd") or ".")
+        _limit_resources(job["cpu_seconds"], job["memory_mb"])
+        os.execve(job["command"][0], job["command"], job.get("env") or {})
+    finally:
+        os._exit(127)
+
+
+def _run_child(job, write_fd):
+    if "command" in job:
+        _exec_child(job, write_fd)
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    sys.stdout = io.StringIO()
+    sys.stderr = io.StringIO()
+    try:
+        if _sandbox is not None:
+            _enter_sandbox(job)
+        _limit_resources(job["cpu_seconds"], job["memory_mb"])
+        namespace = {"__name__": "__sandbox__"}
+        exec(_PRELUDE, namespace)
+        exec(compile(job["code"], "<submission>", "exec"), namespace)
+        function = _resolve(namespace, job["function_name"])
+        result = {"actual": _jsonable(function(**job["input"])), "error": None}
+    except BaseException as e:
+        result = {
+            "actual": None,
+            "error": "".join(traceback.format_exception_only(type(e), e)).strip(),
+        }
+    try:
+        payload = json.dumps(result).encode("utf-8")
+    except BaseException as e:
+        payload = json.dumps({"actual": None, "error": repr(e)}).encode("utf-8")
+    with os.fdopen(write_fd, "wb") as out:
+        out.write(payload)
+    os._exit(0)
+
+
+def run_job(job):
+    read_fd, write_fd = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        _run_child(job, write_fd)
+    os.close(write_fd)
+
+    output = bytearray()
+    deadline = started + job["wall_seconds"]
+    timed_out = False
+    status = usage = None
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            timed_out = True
+            break
+        if _sandbox is None:
+            ready, _, _ = select.select([read_fd], [], [], remaining)
+        else:
+            # Processes the job left behind may hold the pipe open after the
+            # job itself exited; killing them lets us read to the end.
+            ready, _, _ = select.select([read_fd], [], [], min(remaining, 0.05))
+            if not ready and status is None:
+                exited, status, usage = os.wait4(pid, os.WNOHANG)
+                if exited:
+                    _kill_leftovers()
+                else:
+                    status = None
+        if not ready:
+            continue
+        chunk = os.read(read_fd, 1 << 16)
+        if not chunk:
+            break
+        output += chunk
+        if len(output) > _MAX_OUTPUT:
+            del output[: len(output) - _MAX_OUTPUT]
+    os.close(read_fd)
+
+    if timed_out:
+        # The child may not have reached setsid() yet, so kill it directly too.
+        for kill in (os.killpg, os.kill):
+            try:
+                kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+    if status is None:
+        _, status, usage = os.wait4(pid, 0)
+    duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    if _sandbox is not None:
+        _kill_leftovers()
+
+    if timed_out:
+        result = {"status": "wall_timeout", "actual": None, "error": None}
+    elif os.WIFSIGNALED(status) and (
+        os.WTERMSIG(status) == signal.SIGXCPU
+        or usage.ru_utime + usage.ru_stime >= job["cpu_seconds"]
+    ):
+        # Past the soft CPU limit the kernel sends SIGXCPU, and SIGKILL at the
+        # hard limit if the job caught or ignored it.
+        result = {"status": "cpu_timeout", "actual": None, "error": None}
+    elif os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGKILL:
+        # Not the CPU limit, so most likely the OOM killer.
+        result = {
+            "status": "killed",
+            "actual": None,
+            "error": "Process was killed (out of memory?)",
+        }
+    elif "command" in job:
+        result = {
+            "status": "ok",
+            "stdout": bytes(output).decode("utf-8", "replace"),
+            "exit_code": os.waitstatus_to_exitcode(status),
+        }
+    else:
+        try:
+            result = {"status": "ok", **json.loads(bytes(output))}
+        except ValueError:
+            exit_code = os.waitstatus_to_exitcode(status)
+            result = {
+                "status": "crashed",
+                "actual": None,
+                "error": f"Process exited with status {exit_code}",
+            }
+    result["duration_ms"] = duration_ms
+    return result
+
+
+def main():
+    out = sys.stdout
+    try:
+        if len(sys.argv) > 1:
+            isolate(json.loads(sys.argv[1]))
+    except Exception as e:
+        out.write(json.dumps({"ready": False, "error": repr(e)}) + "\n")
+        out.flush()
+        os._exit(1)
+    out.write(json.dumps({"ready": True}) + "\n")
+    out.flush()
+    for line in sys.stdin:
+        out.write(json.dumps(run_job(json.loads(line))) + "\n")
+        out.flush()
+
+
+if __name__ == "__main__":
+    main()
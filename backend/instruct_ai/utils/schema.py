@@ -1,29 +1,101 @@
 from pydantic import BaseModel, Field
-from fastapi import UploadFile
 from typing import List, Union, Literal, Optional, Dict, Any
 from enum import Enum
 
+# Course ids are the slugs /upload_file/ derives from course names.
+COURSE_ID_PATTERN = r"^[a-z0-9][a-z0-9-]{0,63}$"
+
+
+class PipelineMode(str, Enum):
+    AGENT = "agent"  # ReAct agent with the study material tool
+    DIRECT = "direct"  # one retrieval, one completion
+    FANOUT = "fanout"  # one retrieval, concurrent completions for shards
+
 
 class QuestionRequest(BaseModel):
     topic: str
     question_type: str
     num_questions: int
+    # Identifies the caller (e.g. a student) so banked questions are not repeated.
+    client_id: Optional[str] = None
+    # Skip the question bank and response cache and generate new questions.
+    fresh: bool = False
+    # Defaults to the PIPELINE_MODE setting.
+    mode: Optional[PipelineMode] = None
+    # Course whose study material to use (see /upload_file/); None is the
+    # built-in course.
+    course_id: Optional[str] = Field(default=None, pattern=COURSE_ID_PATTERN)
 
 
 class AnswerSubmission(BaseModel):
     question: str
     user_answer: str
     model_answer: str
+    # Sent for MCQs so answers can be matched by option text as well as letter.
+    options: Optional[List[str]] = None
+    question_type: Optional[str] = None
 
 
 class EvaluationResponse(BaseModel):
     grade: str
     feedback: str
+    # "rule" (local MCQ grading), "similarity" (pre-grader) or "llm"
+    graded_by: Optional[str] = None
+    # Pre-grader routing decision ("auto_correct", "auto_incorrect" or
+    # "escalated") and the features it was based on.
+    routing: Optional[str] = None
+    similarity: Optional[float] = None
+    lexical_coverage: Optional[float] = None
+
+
+class BatchEvaluationRequest(BaseModel):
+    answers: List[AnswerSubmission] = Field(..., min_length=1, max_length=200)
+
+
+class BatchEvaluationItem(BaseModel):
+    index: int
+    evaluation: Optional[EvaluationResponse] = None
+    error: Optional[str] = None
+    # Seconds to wait before resubmitting, when the LLM was at its rate limit.
+    retry_after: Optional[int] = None
+
+
+class BatchEvaluationResponse(BaseModel):
+    results: List[BatchEvaluationItem]
+    succeeded: int
+    failed: int
+
 
+class ExplanationRequest(BaseModel):
+    answers: List[AnswerSubmission] = Field(..., min_length=1, max_length=50)
 
-class FileSchema(BaseModel):
+
+class ExplanationResponse(BaseModel):
+    explanations: List[str]
+
+
+class IngestionStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class IngestionJobResponse(BaseModel):
+    job_id: str
+    course_id: str
     course_name: str
-    file: UploadFile
+    filename: str
+    bytes: int
+    status: IngestionStatus
+    pages_total: Optional[int] = None
+    pages_done: int = 0
+    chunks_total: int = 0
+    chunks_new: int = 0
+    chunks_removed: int = 0
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
 
 
 class MCQQuestion(BaseModel):
@@ -49,6 +121,11 @@ class DifficultyLevel(str, Enum):
     HARD = "hard"
 
 
+class StreamFormat(str, Enum):
+    NDJSON = "ndjson"
+    SSE = "sse"
+
+
 class TestCase(BaseModel):
     input: Dict[str, Any]  # Changed to Dict[str, Any] to handle various input types
     expected: Any  # Changed to Any to handle various output types
@@ -59,6 +136,10 @@ class CodingQuestionRequest(BaseModel):
     difficulty: DifficultyLevel
     topic: Optional[str] = None
     num_questions: int = Field(default=1, ge=1, le=10)
+    client_id: Optional[str] = None
+    fresh: bool = False
+    mode: Optional[PipelineMode] = None
+    course_id: Optional[str] = Field(default=None, pattern=COURSE_ID_PATTERN)
 
 
 class QuestionDifficulty(BaseModel):
@@ -89,12 +170,18 @@ class CodingQuestionsResponse(BaseModel):
         extra = "allow"  # Allow additional fields in the response
 
 
+class EvaluationMode(str, Enum):
+    FULL = "full"  # run the test cases, then ask the LLM for feedback
+    TESTS_ONLY = "tests_only"  # run the test cases, no LLM call
+
+
 class CodingAnswerSubmission(BaseModel):
     question: Dict[
         str, Any
     ]  # Changed to Dict[str, Any] to handle various question formats
     user_code: str
     programming_language: str
+    mode: EvaluationMode = EvaluationMode.FULL
 
 
 class TestResult(BaseModel):
@@ -103,6 +190,7 @@ class TestResult(BaseModel):
     expected: Any
     actual: Any
     error: Optional[str] = None
+    duration_ms: Optional[float] = None
 
 
 class CodingEvaluationResponse(BaseModel):
@@ -115,6 +203,9 @@ class CodingEvaluationResponse(BaseModel):
     space_complexity_analysis: Optional[str] = None
     code_quality_feedback: Optional[str] = None
     improvement_suggestions: Optional[List[str]] = None
+    execution_time_ms: Optional[float] = None
+    compile_time_ms: Optional[float] = None
+    artifact_cached: Optional[bool] = None
 
     class Config:
         extra = "allow"  # Allow additional fields in the response
@@ -0,0 +1,182 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.llm import (
+    LLMChatEndEvent,
+    LLMCompletionEndEvent,
+)
+
+# Latency samples kept per label for percentiles.
+_MAX_SAMPLES = 1000
+
+
+class Usage:
+    """
+    LLM calls and tokens spent while handling one request.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated = False
+        self.latency_ms: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "mode": self.label,
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "tokens_estimated": self.estimated,
+            "latency_ms": self.latency_ms,
+        }
+
+
+_current: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar(
+    "llm_usage", default=None
+)
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def response_token_counts(response: Any) -> Optional[Dict[str, int]]:
+    """
+    Prompt and completion tokens an LLM response reports, or None.
+    """
+    extra = getattr(response, "additional_kwargs", None) or {}
+    if "prompt_tokens" in extra:
+        return {
+            "prompt_tokens": int(extra.get("prompt_tokens") or 0),
+            "completion_tokens": int(extra.get("completion_tokens") or 0),
+        }
+    raw = getattr(response, "raw", None)
+    usage = getattr(raw, "usage", None)
+    if usage is None and isinstance(raw, dict):
+        usage = raw.get("usage")
+    if usage is not None:
+        get = usage.get if isinstance(usage, dict) else (lambda k: getattr(usage, k))
+        return {
+            "prompt_tokens": int(get("prompt_tokens") or 0),
+            "completion_tokens": int(get("completion_tokens") or 0),
+        }
+    return None
+
+
+def llm_token_counts(event: BaseEvent) -> Optional[Dict[str, Any]]:
+    """
+    Prompt and completion tokens of an LLM end event (None for other events),
+    estimated from the text when the provider does not report usage.
+    """
+    if isinstance(event, LLMCompletionEndEvent):
+        prompt = event.prompt
+    elif isinstance(event, LLMChatEndEvent):
+        prompt = "\n".join(str(m.content or "") for m in event.messages)
+    else:
+        return None
+    counts = response_token_counts(event.response)
+    if counts is not None:
+        return {**counts, "estimated": False}
+    return {
+        "prompt_tokens": _estimate_tokens(prompt),
+        "completion_tokens": _estimate_tokens(
+            getattr(event.response, "text", None)
+            or str(getattr(event.response, "message", ""))
+        ),
+        "estimated": True,
+    }
+
+
+class UsageEventHandler(BaseEventHandler):
+    """
+    Adds every LLM call's token usage to the Usage of the current request.
+    Providers that do not report usage get a character-based estimate.
+    """
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "UsageEventHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        usage = _current.get()
+        if usage is None:
+            return
+        counts = llm_token_counts(event)
+        if counts is None:
+            return
+        usage.llm_calls += 1
+        usage.estimated = usage.estimated or counts["estimated"]
+        usage.prompt_tokens += counts["prompt_tokens"]
+        usage.completion_tokens += counts["completion_tokens"]
+
+
+class UsageStats:
+    """
+    Running per-label totals and latency percentiles of tracked requests.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._labels: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, usage: Usage):
+        with self._lock:
+            entry = self._labels.setdefault(
+                usage.label,
+                {"requests": 0, "llm_calls": 0, "tokens": 0, "latencies": []},
+            )
+            entry["requests"] += 1
+            entry["llm_calls"] += usage.llm_calls
+            entry["tokens"] += usage.prompt_tokens + usage.completion_tokens
+            latencies: List[float] = entry["latencies"]
+            latencies.append(usage.latency_ms)
+            if len(latencies) > _MAX_SAMPLES:
+                del latencies[0]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for label, entry in self._labels.items():
+                latencies = sorted(entry["latencies"])
+                requests = entry["requests"]
+                result[label] = {
+                    "requests": requests,
+                    "avg_llm_calls": round(entry["llm_calls"] / requests, 2),
+                    "avg_tokens": round(entry["tokens"] / requests, 1),
+                    "p50_latency_ms": latencies[len(latencies) // 2],
+                    "p95_latency_ms": latencies[
+                        min(len(latencies) - 1, int(len(latencies) * 0.95))
+                    ],
+                }
+            return result
+
+
+usage_stats = UsageStats()
+get_dispatcher().add_event_handler(UsageEventHandler())
+
+
+@contextmanager
+def track_usage(label: str):
+    """
+    Collect LLM calls, tokens and wall time for the enclosed block under
+    label, and add them to usage_stats when it completes successfully.
+    """
+    usage = Usage(label)
+    token = _current.set(usage)
+    started = time.perf_counter()
+    try:
+        yield usage
+    finally:
+        _current.reset(token)
+        usage.latency_ms = round((time.perf_counter() - started) * 1000, 3)
+    usage_stats.record(usage)
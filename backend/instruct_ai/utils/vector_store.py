@@ -0,0 +1,456 @@
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
+
+from utils.config import (
+    VECTOR_STORE_BACKEND,
+    PINECONE_INDEX_NAME,
+    LOCAL_VECTOR_STORE_DIR,
+    LOCAL_VECTOR_STORE_QUANTIZE,
+    COURSES_DIR,
+)
+
+# Rows scored per matrix product; bounds the temporary score buffer.
+_SCAN_BLOCK = 65536
+
+
+class MmapVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by a float32 (or int8 + per-row scale) matrix on disk.
+
+    Rows are L2-normalised so a dot product is a cosine similarity. The matrix
+    is opened with np.memmap in read-only mode, so every worker process on the
+    host shares the same page-cache copy. Writers append rows and then bump
+    meta.json; readers notice the new generation on their next query.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    persist_dir: str
+    quantize: bool = False
+
+    _generation: Optional[tuple] = PrivateAttr(default=None)
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _records: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _row_of: Dict[str, int] = PrivateAttr(default_factory=dict)
+    _matrix: Optional[np.ndarray] = PrivateAttr(default=None)
+    _scales: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, persist_dir: str, quantize: bool = False, **kwargs: Any):
+        super().__init__(persist_dir=persist_dir, quantize=quantize, **kwargs)
+        os.makedirs(persist_dir, exist_ok=True)
+        meta = self._read_meta()
+        if meta is not None and meta["quantized"] != quantize:
+            raise ValueError(
+                f"Local index at {persist_dir} was built with quantize={meta['quantized']}"
+            )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "MmapVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    # -- on-disk layout -------------------------------------------------
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.persist_dir, name)
+
+    def _files(self, meta: Optional[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Paths of the vectors, scales and records of meta's generation. A
+        rewrite writes a whole new generation next to the current one and
+        switches to it by replacing meta.json, so a reader never pairs one
+        generation's meta with another's files.
+        """
+        generation = meta.get("generation", 0) if meta else 0
+        suffix = f".{generation}" if generation else ""
+        return {
+            "vectors": self._path(
+                f"vectors{suffix}." + ("i8" if self.quantize else "f32")
+            ),
+            "scales": self._path(f"scales{suffix}.f32"),
+            "records": self._path(f"nodes{suffix}.jsonl"),
+        }
+
+    def _read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path("meta.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, count: int, dim: int, generation: int) -> None:
+        tmp_path = self._path("meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {
+                    "count": count,
+                    "dim": dim,
+                    "quantized": self.quantize,
+                    "generation": generation,
+                },
+                f,
+            )
+        os.replace(tmp_path, self._path("meta.json"))
+
+    def _refresh(self) -> None:
+        """
+        (Re)open the memory maps if another process has written since.
+        """
+        while True:
+            try:
+                with open(self._path("meta.json")) as f:
+                    # meta.json is always replaced, never edited, so a new
+                    # inode means a new generation even if two writes land
+                    # within the same mtime tick.
+                    stat = os.fstat(f.fileno())
+                    generation = (stat.st_ino, stat.st_mtime_ns)
+                    if generation == self._generation:
+                        return
+                    meta = json.load(f)
+            except FileNotFoundError:
+                return
+            try:
+                self._load(meta)
+            except FileNotFoundError:
+                # A rewrite replaced this generation while we were opening
+                # it; its meta.json is already in place, so read that one.
+                continue
+            self._generation = generation
+            return
+
+    def _load(self, meta: Dict[str, Any]) -> None:
+        files = self._files(meta)
+        count, dim = meta["count"], meta["dim"]
+        records = []
+        with open(files["records"]) as f:
+            for line in f:
+                if len(records) == count:
+                    break
+                records.append(json.loads(line))
+
+        if count:
+            dtype = np.int8 if self.quantize else np.float32
+            matrix = np.memmap(
+                files["vectors"], dtype=dtype, mode="r", shape=(count, dim)
+            )
+            scales = (
+                np.memmap(files["scales"], dtype=np.float32, mode="r", shape=(count,))
+                if self.quantize
+                else None
+            )
+        else:
+            matrix, scales = None, None
+
+        self._matrix, self._scales = matrix, scales
+        self._records = records
+        self._ids = [record["id"] for record in records]
+        self._row_of = {node_id: row for row, node_id in enumerate(self._ids)}
+
+    def _encode(self, vectors: np.ndarray):
+        vectors = vectors / np.maximum(
+            np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12
+        )
+        if not self.quantize:
+            return vectors.astype(np.float32), None
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _rewrite(self, records: List[Dict[str, Any]], rows: np.ndarray, scales) -> None:
+        meta = self._read_meta()
+        dim = rows.shape[1] if rows.size else (meta["dim"] if meta else 0)
+        old_files = self._files(meta)
+        generation = (meta.get("generation", 0) if meta else 0) + 1
+        files = self._files({"generation": generation})
+        np.ascontiguousarray(rows).tofile(files["vectors"])
+        if scales is not None:
+            np.ascontiguousarray(scales).tofile(files["scales"])
+        with open(files["records"], "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        self._write_meta(len(records), dim, generation)
+        # Readers still mapping the old generation keep their open copies.
+        for path in old_files.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _drop_uncommitted_tail(self) -> None:
+        """
+        Discard rows a crashed writer appended without committing meta.json.
+        """
+        meta = self._read_meta()
+        files = self._files(meta)
+        if meta is None:
+            for path in files.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+        itemsize = 1 if self.quantize else 4
+        if os.path.getsize(files["vectors"]) != meta["count"] * meta["dim"] * itemsize:
+            self._rewrite(
+                self._records,
+                (
+                    np.asarray(self._matrix)
+                    if self._matrix is not None
+                    else np.empty((0, meta["dim"]))
+                ),
+                np.asarray(self._scales) if self._scales is not None else None,
+            )
+            self._generation = None
+            self._refresh()
+
+    def disk_usage(self) -> Dict[str, int]:
+        """
+        Bytes on disk of the vector matrix and of the node records.
+        """
+        files = self._files(self._read_meta())
+        usage = {}
+        for key, path in (
+            ("vectors", files["vectors"]),
+            ("records", files["records"]),
+        ):
+            usage[key] = os.path.getsize(path) if os.path.exists(path) else 0
+        return usage
+
+    # -- vector store protocol -------------------------------------------
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        self._refresh()
+        self._drop_uncommitted_tail()
+        existing = [node.node_id for node in nodes if node.node_id in self._row_of]
+        if existing:
+            self.delete_nodes(node_ids=existing)
+
+        codes, scales = self._encode(
+            np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        )
+        meta = self._read_meta()
+        files = self._files(meta)
+        # Append-only: rows and records land first, and readers only look at
+        # the first meta["count"] of them, so a concurrent reader never sees
+        # a half-written row.
+        with open(files["vectors"], "ab") as f:
+            codes.tofile(f)
+        if scales is not None:
+            with open(files["scales"], "ab") as f:
+                scales.tofile(f)
+        with open(files["records"], "a") as f:
+            for node in nodes:
+                f.write(json.dumps(self._to_record(node)) + "\n")
+        self._write_meta(
+            len(self._ids) + len(nodes),
+            codes.shape[1],
+            meta.get("generation", 0) if meta else 0,
+        )
+        self._refresh()
+        return [node.node_id for node in nodes]
+
+    def _to_record(self, node: BaseNode) -> Dict[str, Any]:
+        return {
+            "id": node.node_id,
+            "ref_doc_id": node.ref_doc_id,
+            "metadata": node_to_metadata_dict(
+                node, remove_text=False, flat_metadata=self.flat_metadata
+            ),
+        }
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._refresh()
+        self._delete_rows(
+            [
+                row
+                for row, r in enumerate(self._records)
+                if r["ref_doc_id"] == ref_doc_id
+            ]
+        )
+
+    def delete_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        self._refresh()
+        rows = set(range(len(self._ids)))
+        if node_ids is not None:
+            rows &= {self._row_of[i] for i in node_ids if i in self._row_of}
+        if filters is not None:
+            rows &= set(np.flatnonzero(self._filter_mask(filters)).tolist())
+        self._delete_rows(sorted(rows))
+
+    def clear(self) -> None:
+        self._refresh()
+        self._delete_rows(list(range(len(self._ids))))
+
+    def _delete_rows(self, rows: List[int]) -> None:
+        if not rows:
+            return
+        keep = np.setdiff1d(np.arange(len(self._ids)), rows)
+        records = [self._records[row] for row in keep]
+        matrix = np.asarray(self._matrix[keep])
+        scales = np.asarray(self._scales[keep]) if self.quantize else None
+        # Drop our maps before the files underneath them are replaced.
+        self._matrix, self._scales = None, None
+        self._rewrite(records, matrix, scales)
+        self._refresh()
+
+    def get_nodes(
+        self,
+        node_ids: Optional[List[str]] = None,
+        filters: Optional[MetadataFilters] = None,
+    ) -> List[BaseNode]:
+        self._refresh()
+        rows = range(len(self._ids))
+        if node_ids is not None:
+            rows = [self._row_of[i] for i in node_ids if i in self._row_of]
+        if filters is not None:
+            mask = self._filter_mask(filters)
+            rows = [row for row in rows if mask[row]]
+        return [self._to_node(row) for row in rows]
+
+    def _to_node(self, row: int) -> BaseNode:
+        return metadata_dict_to_node(self._records[row]["metadata"])
+
+    def _filter_mask(self, filters: MetadataFilters) -> np.ndarray:
+        checks = []
+        for f in filters.filters:
+            if isinstance(f, MetadataFilters):
+                raise NotImplementedError("Nested metadata filters are not supported")
+            if f.operator == FilterOperator.EQ:
+                checks.append(lambda m, f=f: m.get(f.key) == f.value)
+            elif f.operator == FilterOperator.IN:
+                checks.append(lambda m, f=f: m.get(f.key) in f.value)
+            else:
+                raise NotImplementedError(f"Unsupported filter operator: {f.operator}")
+        combine = all if filters.condition in (None, "and") else any
+        return np.array(
+            [combine(check(r["metadata"]) for check in checks) for r in self._records],
+            dtype=bool,
+        )
+
+    def top_k(self, queries: np.ndarray, k: int, mask: Optional[np.ndarray] = None):
+        """
+        Batched exact top-k by cosine similarity.
+
+        Args:
+            queries: (q, dim) array of query embeddings
+            k: Number of results per query
+            mask: Optional boolean row mask restricting the candidates
+
+        Returns:
+            (rows, scores) arrays of shape (q, <=k), best first
+        """
+        self._refresh()
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(
+            np.linalg.norm(queries, axis=1, keepdims=True), 1e-12
+        )
+        n = len(self._ids)
+        if n == 0 or k <= 0:
+            empty = np.empty((len(queries), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            block = self._matrix[start : start + _SCAN_BLOCK]
+            scores = (block.astype(np.float32) @ queries.T).T
+            if self.quantize:
+                scores *= self._scales[start : start + _SCAN_BLOCK]
+            if mask is not None:
+                scores[:, ~mask[start : start + _SCAN_BLOCK]] = -np.inf
+            rows = np.broadcast_to(
+                np.arange(start, start + block.shape[0]), scores.shape
+            )
+            best_rows = np.concatenate([best_rows, rows], axis=1)
+            best_scores = np.concatenate([best_scores, scores], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return best_rows, best_scores
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        self._refresh()
+        mask = None
+        if query.filters is not None:
+            mask = self._filter_mask(query.filters)
+        if query.node_ids:
+            allowed = np.zeros(len(self._ids), dtype=bool)
+            allowed[[self._row_of[i] for i in query.node_ids if i in self._row_of]] = (
+                True
+            )
+            mask = allowed if mask is None else mask & allowed
+        if query.doc_ids:
+            doc_ids = set(query.doc_ids)
+            allowed = np.array(
+                [r["ref_doc_id"] in doc_ids for r in self._records], dtype=bool
+            )
+            mask = allowed if mask is None else mask & allowed
+
+        rows, scores = self.top_k(
+            np.asarray(query.query_embedding), query.similarity_top_k, mask
+        )
+        hits = [
+            (int(row), float(score))
+            for row, score in zip(rows[0], scores[0])
+            if np.isfinite(score)
+        ]
+        return VectorStoreQueryResult(
+            nodes=[self._to_node(row) for row, _ in hits],
+            similarities=[score for _, score in hits],
+            ids=[self._ids[row] for row, _ in hits],
+        )
+
+
+def build_vector_store(
+    backend: str = VECTOR_STORE_BACKEND, course_id: Optional[str] = None
+):
+    """
+    Build the vector store selected by VECTOR_STORE_BACKEND. With course_id
+    it is scoped to that course: its own directory under COURSES_DIR locally,
+    its own namespace on Pinecone.
+    """
+    if backend == "local":
+        return MmapVectorStore(
+            persist_dir=(
+                os.path.join(COURSES_DIR, course_id, "index")
+                if course_id
+                else LOCAL_VECTOR_STORE_DIR
+            ),
+            quantize=LOCAL_VECTOR_STORE_QUANTIZE,
+        )
+    if backend == "pinecone":
+        from pinecone import Pinecone
+        from llama_index.vector_stores.pinecone import PineconeVectorStore
+
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        return PineconeVectorStore(
+            pinecone_index=pc.Index(PINECONE_INDEX_NAME), namespace=course_id
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
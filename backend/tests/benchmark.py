@@ -0,0 +1,641 @@
+"""
+Offline load test of every route in main.py.
+
+The app runs in process against the stand-ins in tests/stubs.py (no Groq,
+Jina or Pinecone access needed) with its local state in a temporary
+directory. Each scenario sends --requests requests to one route, at most
+--concurrency at a time, and records p50/p95/p99 latency, requests per
+second, status codes and the peak RSS seen while it ran. Results are written
+as JSON; --compare checks them against an earlier run and exits non-zero on
+a regression.
+
+Run from backend/:
+
+    python -m tests.benchmark --requests 200 --concurrency 16 --output bench.json
+    python -m tests.benchmark --scenarios generate_questions_direct,evaluate_answers
+    python -m tests.benchmark --compare baseline.json --threshold 0.2
+
+App settings (PIPELINE_MODE, LLM_MAX_CONCURRENCY, ...) are read from the
+environment as usual.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BACKEND_DIR, "instruct_ai")
+
+TOPICS = [
+    "software process models",
+    "requirements engineering",
+    "software testing",
+    "cost estimation with COCOMO",
+    "software design principles",
+    "configuration management",
+    "agile development",
+    "risk management",
+]
+
+CODING_ANSWER = "def solve(nums):\n    return sum(nums)\n"
+
+
+@dataclass
+class Scenario:
+    """
+    One route under load. request(i) gives the httpx request arguments of
+    the i-th request; after(client, results) runs once the scenario is done.
+    """
+
+    name: str
+    method: str
+    path: str
+    request: Callable[[int], Dict[str, Any]]
+    after: Optional[Callable] = None
+
+
+@dataclass
+class RunState:
+    """
+    Values scenarios hand to later ones.
+    """
+
+    sample_pdf: bytes = b""
+    job_ids: List[str] = field(default_factory=list)
+    ingestion: Dict[str, Any] = field(default_factory=dict)
+    course_id: Optional[str] = None
+
+
+def _question_request(mode: str, fresh: bool = True, course_id=None):
+    def request(i):
+        return {
+            "json": {
+                "topic": TOPICS[i % len(TOPICS)],
+                "question_type": "MCQ" if i % 2 else "Subjective",
+                "num_questions": 5,
+                "mode": mode,
+                "fresh": fresh,
+                "course_id": course_id,
+            }
+        }
+
+    return request
+
+
+def _coding_request(i):
+    return {
+        "json": {
+            "programming_language": "python",
+            "difficulty": ("easy", "medium", "hard")[i % 3],
+            "topic": TOPICS[i % len(TOPICS)],
+            "num_questions": 2,
+            "fresh": True,
+        }
+    }
+
+
+def _answer(i):
+    return {
+        "question": f"Explain {TOPICS[i % len(TOPICS)]}.",
+        "user_answer": f"It is about {TOPICS[(i + i // 3) % len(TOPICS)]} and planning.",
+        "model_answer": f"{TOPICS[i % len(TOPICS)].capitalize()} structures the work.",
+        "question_type": "Subjective",
+    }
+
+
+def _mcq_answer(i):
+    return {
+        "question": f"Which statement about {TOPICS[i % len(TOPICS)]} is true?",
+        "user_answer": "ABCD"[i % 4],
+        "model_answer": "B",
+        "options": ["A) one", "B) two", "C) three", "D) four"],
+        "question_type": "MCQ",
+    }
+
+
+def _coding_submission(i):
+    return {
+        "json": {
+            "question": {
+                "title": "Sum",
+                "difficulty": {"level": "easy"},
+                "description": "Return the sum of nums.",
+                "function_signature": "def solve(nums: List[int]) -> int:",
+                "test_cases": [
+                    {"input": {"nums": [1, 2, 3]}, "expected": 6},
+                    {"input": {"nums": []}, "expected": 0},
+                    {"input": {"nums": [i, -i, i]}, "expected": i},
+                ],
+                "time_complexity": "O(n)",
+                "space_complexity": "O(1)",
+            },
+            "user_code": CODING_ANSWER,
+            "programming_language": "python",
+            "mode": "full",
+        }
+    }
+
+
+def _sample_pdf(path: str, pages: int) -> bytes:
+    """
+    The first pages of the course PDF, as a small upload.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for page in reader.pages[:pages]:
+        writer.add_page(page)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+async def _wait_for_jobs(client, state: RunState, timeout: float) -> None:
+    """
+    Poll the uploaded jobs until they finish and summarise how long they took.
+    """
+    deadline = time.monotonic() + timeout
+    pending = set(state.job_ids)
+    jobs = {}
+    while pending and time.monotonic() < deadline:
+        for job_id in list(pending):
+            job = (await client.get(f"/ingestion_jobs/{job_id}")).json()
+            if job["status"] in ("done", "failed"):
+                jobs[job_id] = job
+                pending.discard(job_id)
+        if pending:
+            await asyncio.sleep(0.25)
+    durations = sorted(
+        job["updated_at"] - job["created_at"]
+        for job in jobs.values()
+        if job["status"] == "done"
+    )
+    state.ingestion = {
+        "jobs": len(state.job_ids),
+        "done": len(durations),
+        "failed": sum(job["status"] == "failed" for job in jobs.values()),
+        "timed_out": len(pending),
+        "seconds": _summary(durations),
+    }
+    if durations:
+        state.course_id = next(iter(jobs.values()))["course_id"]
+
+
+def scenarios(state: RunState, args) -> List[Scenario]:
+    def upload(i):
+        return {
+            "data": {"course_name": "Benchmark Course"},
+            "files": {"file": ("sample.pdf", state.sample_pdf, "application/pdf")},
+        }
+
+    def job(i):
+        return {"url": f"/ingestion_jobs/{state.job_ids[i % len(state.job_ids)]}"}
+
+    def course_questions(i):
+        return _question_request("direct", course_id=state.course_id)(i)
+
+    async def after_upload(client, results):
+        state.job_ids = [
+            r["body"]["job_id"] for r in results if r["status"] == 202 and r["body"]
+        ]
+        await _wait_for_jobs(client, state, args.ingestion_timeout)
+
+    return [
+        Scenario(
+            "generate_questions_direct",
+            "POST",
+            "/generate_questions",
+            _question_request("direct"),
+        ),
+        Scenario(
+            "generate_questions_fanout",
+            "POST",
+            "/generate_questions",
+            _question_request("fanout"),
+        ),
+        Scenario(
+            "generate_questions_agent",
+            "POST",
+            "/generate_questions",
+            _question_request("agent"),
+        ),
+        Scenario(
+            "generate_questions_cached",
+            "POST",
+            "/generate_questions",
+            _question_request("direct", fresh=False),
+        ),
+        Scenario(
+            "generate_questions_stream",
+            "POST",
+            "/generate_questions/stream",
+            _question_request("agent"),
+        ),
+        Scenario(
+            "generate_coding_questions",
+            "POST",
+            "/generate_coding_questions",
+            _coding_request,
+        ),
+        Scenario(
+            "generate_coding_questions_stream",
+            "POST",
+            "/generate_coding_questions/stream",
+            _coding_request,
+        ),
+        Scenario(
+            "evaluate_answer",
+            "POST",
+            "/evaluate_answer",
+            lambda i: {"json": _answer(i)},
+        ),
+        Scenario(
+            "evaluate_answers",
+            "POST",
+            "/evaluate_answers",
+            lambda i: {"json": {"answers": [_answer(i * 10 + j) for j in range(10)]}},
+        ),
+        Scenario(
+            "explain_answers",
+            "POST",
+            "/explain_answers",
+            lambda i: {"json": {"answers": [_mcq_answer(i * 5 + j) for j in range(5)]}},
+        ),
+        Scenario(
+            "evaluate_coding_answer",
+            "POST",
+            "/evaluate_coding_answer",
+            _coding_submission,
+        ),
+        Scenario("upload_file", "POST", "/upload_file/", upload, after_upload),
+        Scenario("ingestion_jobs", "GET", "/ingestion_jobs/{job_id}", job),
+        Scenario(
+            "generate_questions_course", "POST", "/generate_questions", course_questions
+        ),
+        Scenario("cache_stats", "GET", "/cache_stats", lambda i: {}),
+        Scenario("pipeline_stats", "GET", "/pipeline_stats", lambda i: {}),
+        Scenario("llm_gateway_stats", "GET", "/llm_gateway_stats", lambda i: {}),
+        Scenario("metrics", "GET", "/metrics", lambda i: {}),
+    ]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    # Linear interpolation between closest ranks; values are sorted.
+    position = (len(values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def _summary(values: List[float], scale: float = 1.0) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(v * scale for v in values)
+    return {
+        "p50": round(_percentile(values, 0.50), 3),
+        "p95": round(_percentile(values, 0.95), 3),
+        "p99": round(_percentile(values, 0.99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # ru_maxrss is in KiB on Linux and bytes on macOS.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """
+    Peak resident set size of this process, sampled while a scenario runs.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, _rss_bytes())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak = _rss_bytes()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> int:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        return max(self.peak, _rss_bytes())
+
+
+async def _send(client, scenario: Scenario, i: int) -> Dict[str, Any]:
+    kwargs = scenario.request(i)
+    url = kwargs.pop("url", scenario.path)
+    started = time.perf_counter()
+    try:
+        response = await client.request(scenario.method, url, **kwargs)
+        status = response.status_code
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+    except Exception as e:
+        status, body = f"exception: {type(e).__name__}", None
+    return {"status": status, "seconds": time.perf_counter() - started, "body": body}
+
+
+async def run_scenario(client, scenario: Scenario, args, state: RunState) -> Dict:
+    for i in range(args.warmup):
+        await _send(client, scenario, -1 - i)
+
+    queue = iter(range(args.requests))
+    results = []
+
+    async def worker():
+        for i in queue:
+            results.append(await _send(client, scenario, i))
+
+    sampler = RssSampler()
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    peak_rss = await sampler.stop()
+
+    if scenario.after is not None:
+        await scenario.after(client, results)
+
+    statuses = Counter(str(r["status"]) for r in results)
+    ok = sum(isinstance(r["status"], int) and r["status"] < 400 for r in results)
+    return {
+        "method": scenario.method,
+        "route": scenario.path,
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "errors": len(results) - ok,
+        "status_counts": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "latency_ms": _summary([r["seconds"] for r in results], 1000),
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+    }
+
+
+def _skip_reason(scenario: Scenario, state: RunState) -> Optional[str]:
+    if scenario.name == "upload_file" and not state.sample_pdf:
+        return "no sample PDF"
+    if scenario.name == "ingestion_jobs" and not state.job_ids:
+        return "no ingestion jobs (run upload_file first)"
+    if scenario.name == "generate_questions_course" and state.course_id is None:
+        return "no ingested course (run upload_file first)"
+    return None
+
+
+async def run(args, main, options) -> Dict:
+    import httpx
+
+    state = RunState()
+    if os.path.exists(main.PDF_PATH):
+        state.sample_pdf = _sample_pdf(main.PDF_PATH, args.upload_pages)
+
+    selected = set(args.scenarios.split(",")) if args.scenarios else None
+    results, skipped = {}, {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=None
+        ) as client:
+            for scenario in scenarios(state, args):
+                if selected is not None and scenario.name not in selected:
+                    continue
+                reason = _skip_reason(scenario, state)
+                if reason is not None:
+                    skipped[scenario.name] = reason
+                    continue
+                results[scenario.name] = await run_scenario(
+                    client, scenario, args, state
+                )
+                _print_row(scenario.name, results[scenario.name])
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    kib = 1 if sys.platform == "darwin" else 1024
+    return {
+        "started_at": args.started_at,
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "stubs": asdict(options),
+            "app_env": {
+                name: os.environ[name]
+                for name in sorted(os.environ)
+                if name in _APP_ENV or name.startswith(("PIPELINE_", "LLM_"))
+            },
+        },
+        "startup_seconds": args.startup_seconds,
+        "scenarios": results,
+        "skipped": skipped,
+        "ingestion": state.ingestion,
+        "peak_rss_mb": round(self_usage.ru_maxrss * kib / 2**20, 1),
+        "children_peak_rss_mb": round(children_usage.ru_maxrss * kib / 2**20, 1),
+    }
+
+
+_APP_ENV = {
+    "VECTOR_STORE_BACKEND",
+    "RETRIEVAL_MODE",
+    "QUESTION_BANK_ENABLED",
+    "RESPONSE_CACHE_ENABLED",
+    "RETRIEVAL_CACHE_ENABLED",
+    "EMBEDDING_CACHE_ENABLED",
+    "AGENT_POOL_SIZE",
+    "SANDBOX_POOL_SIZE",
+}
+
+
+def _print_row(name: str, result: Dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{name:34} {result['requests']:6d} req {result['errors']:4d} err "
+        f"{result['rps']:9.2f} rps  p50 {latency.get('p50', 0):9.1f}  "
+        f"p95 {latency.get('p95', 0):9.1f}  p99 {latency.get('p99', 0):9.1f} ms  "
+        f"rss {result['peak_rss_mb']:7.1f} MB",
+        flush=True,
+    )
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Scenarios whose p95 latency rose, or whose throughput fell, by more than
+    threshold (a fraction) relative to baseline.
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or not base["latency_ms"] or not result["latency_ms"]:
+            continue
+        p95, base_p95 = result["latency_ms"]["p95"], base["latency_ms"]["p95"]
+        if base_p95 and p95 > base_p95 * (1 + threshold):
+            regressions.append(f"{name}: p95 {base_p95:.1f} -> {p95:.1f} ms")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: {base['rps']:.2f} -> {result['rps']:.2f} rps")
+        if result["errors"] > base["errors"]:
+            regressions.append(f"{name}: errors {base['errors']} -> {result['errors']}")
+    return regressions
+
+
+def parse_args(argv=None):
+    from tests.stubs import StubOptions
+
+    defaults = StubOptions()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--requests", type=int, default=50, help="requests per scenario"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--warmup", type=int, default=2, help="unrecorded requests per scenario"
+    )
+    parser.add_argument(
+        "--scenarios", help="comma-separated scenario names (default: all)"
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument(
+        "--compare", metavar="BASELINE", help="earlier results to check against"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed relative regression"
+    )
+    parser.add_argument(
+        "--storage-dir", help="app state directory (default: a fresh temporary one)"
+    )
+    parser.add_argument(
+        "--upload-pages", type=int, default=3, help="pages in the uploaded sample PDF"
+    )
+    parser.add_argument("--ingestion-timeout", type=float, default=300.0)
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=defaults.llm_latency,
+        help="seconds per LLM call",
+    )
+    parser.add_argument(
+        "--llm-seconds-per-token", type=float, default=defaults.llm_seconds_per_token
+    )
+    parser.add_argument(
+        "--embed-latency",
+        type=float,
+        default=defaults.embed_latency,
+        help="seconds per embedding request",
+    )
+    parser.add_argument(
+        "--vector-latency",
+        type=float,
+        default=defaults.vector_latency,
+        help="seconds per vector query",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=defaults.jitter,
+        help="latency variation, as a fraction",
+    )
+    parser.add_argument(
+        "--words",
+        type=int,
+        default=defaults.words,
+        help="words per generated text field",
+    )
+    parser.add_argument("--embed-dim", type=int, default=defaults.embed_dim)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    sys.path.insert(0, BACKEND_DIR)
+    args = parse_args(argv)
+    args.started_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app reads its settings at import time and resolves its data files
+    # relative to its own directory.
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("JINA_API_KEY", "benchmark")
+    os.environ["VECTOR_STORE_BACKEND"] = "local"
+    os.environ["STORAGE_DIR"] = args.storage_dir or tempfile.mkdtemp(
+        prefix="instruct-ai-bench-"
+    )
+    # Background refills would compete with the measured requests.
+    os.environ.setdefault("QUESTION_BANK_ENABLED", "false")
+    # The stand-ins have no rate limits; set lower LLM_RPM_LIMIT and
+    # LLM_TPM_LIMIT to load-test the gateway's queueing and 429s.
+    os.environ.setdefault("LLM_RPM_LIMIT", "1000000")
+    os.environ.setdefault("LLM_TPM_LIMIT", "1000000000")
+    os.chdir(APP_DIR)
+    sys.path.insert(0, APP_DIR)
+
+    from tests import stubs
+
+    options = stubs.StubOptions(
+        llm_latency=args.llm_latency,
+        llm_seconds_per_token=args.llm_seconds_per_token,
+        embed_latency=args.embed_latency,
+        vector_latency=args.vector_latency,
+        jitter=args.jitter,
+        words=args.words,
+        embed_dim=args.embed_dim,
+    )
+    import utils.pipeline  # noqa: F401
+
+    stubs.install(options)
+    started = time.perf_counter()
+    import main as app_main
+    from utils.course_ingest import IngestionRunner
+
+    args.startup_seconds = round(time.perf_counter() - started, 3)
+    app_main.ingestion_runner = IngestionRunner(
+        app_main.ingestion_jobs,
+        initializer=stubs.install_in_worker,
+        initargs=(asdict(options),),
+    )
+
+    results = asyncio.run(run(args, app_main, options))
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline_path is None:
+        return 0
+    with open(baseline_path) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+"""
+Shared setup for the unit tests. Run from backend/:
+
+    python -m pytest -q tests
+
+The app reads its settings at import time, so they are set here before any
+test imports it; local state goes to a temporary directory.
+"""
+
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(BACKEND_DIR, "instruct_ai")
+
+os.environ.setdefault("GROQ_API_KEY", "test")
+os.environ.setdefault("JINA_API_KEY", "test")
+os.environ["VECTOR_STORE_BACKEND"] = "local"
+os.environ["STORAGE_DIR"] = tempfile.mkdtemp(prefix="instruct-ai-tests-")
+os.environ.setdefault("QUESTION_BANK_ENABLED", "false")
+sys.path.insert(0, APP_DIR)
@@ -0,0 +1,493 @@
+"""
+Deterministic local stand-ins for the remote services the app calls: the
+Groq LLM, Jina embeddings and the Pinecone vector store.
+
+Responses are derived from the prompt alone, so the same request always
+gets the same answer, and every stand-in sleeps for a configurable latency
+so the app's concurrency limits behave as they would against the real
+services.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+import numpy as np
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    CompletionResponse,
+    LLMMetadata,
+    MessageRole,
+)
+from llama_index.core.llms.callbacks import (
+    llm_chat_callback,
+    llm_completion_callback,
+)
+from llama_index.core.llms.llm import LLM
+from llama_index.core.vector_stores.types import (
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+
+_FALLBACK_WORDS = """abstraction coupling cohesion module interface requirement
+specification validation verification iteration prototype increment baseline
+estimate schedule milestone risk review inspection defect refactoring pattern
+architecture component deployment release maintenance testing coverage
+integration regression acceptance stakeholder scope effort metric quality
+process lifecycle agile scrum sprint backlog velocity design""".split()
+
+# Marks the stub's own tool call in the agent's chat history.
+_TOOL_THOUGHT = "Thought: I need the study material to answer this."
+
+
+@dataclass
+class StubOptions:
+    """
+    Latency (seconds) and output size of the stand-ins. LLM calls take
+    llm_latency plus llm_seconds_per_token for each generated token, varied
+    by up to +/- jitter (a fraction) per prompt.
+    """
+
+    llm_latency: float = 0.5
+    llm_seconds_per_token: float = 0.0
+    embed_latency: float = 0.05
+    vector_latency: float = 0.02
+    jitter: float = 0.2
+    words: int = 24
+    embed_dim: int = 256
+
+
+def _rng(text: str) -> random.Random:
+    return random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+
+
+def _vocabulary(prompt: str) -> List[str]:
+    words = sorted(set(re.findall(r"[a-z]{4,}", prompt.lower())))
+    return words if len(words) >= 50 else words + _FALLBACK_WORDS
+
+
+def _sentence(rng: random.Random, vocabulary: Sequence[str], words: int) -> str:
+    return " ".join(rng.choice(vocabulary) for _ in range(max(words, 1))).capitalize()
+
+
+def _count(task: str) -> int:
+    more = re.search(r"Generate only (\d+) more", task)
+    if more:
+        return int(more.group(1))
+    counts = re.findall(r"Generate (\d+) ", task)
+    return int(counts[-1]) if counts else 1
+
+
+def _question(rng, vocabulary, words, question_type):
+    text = _sentence(rng, vocabulary, words // 2) + "?"
+    if question_type.lower() == "mcq":
+        return {
+            "type": "MCQ",
+            "question": text,
+            "options": [
+                f"{letter}) {_sentence(rng, vocabulary, 4)}" for letter in "ABCD"
+            ],
+            "model_answer": rng.choice("ABCD"),
+        }
+    return {
+        "type": "Subjective",
+        "question": text,
+        "model_answer": _sentence(rng, vocabulary, words),
+    }
+
+
+def _coding_question(rng, vocabulary, words, difficulty):
+    return {
+        "title": _sentence(rng, vocabulary, 4),
+        "difficulty": {"level": difficulty, "explanation": "Single pass"},
+        "description": _sentence(rng, vocabulary, words) + ". Return the sum of nums.",
+        "function_signature": "def solve(nums: List[int]) -> int:",
+        "test_cases": [
+            {"input": {"nums": nums}, "expected": sum(nums)}
+            for nums in ([1, 2, 3], [], [rng.randint(-50, 50) for _ in range(5)])
+        ],
+        "solution": "def solve(nums):\n    return sum(nums)",
+        "time_complexity": "O(n)",
+        "space_complexity": "O(1)",
+        "hints": [_sentence(rng, vocabulary, 6)],
+        "learning_points": [_sentence(rng, vocabulary, 4)],
+    }
+
+
+def respond(task: str, words: int = 24) -> str:
+    """
+    A well-formed answer to one of the app's prompts, shaped after the JSON
+    structure the prompt asks for; plain prose for anything else (e.g.
+    query engine synthesis).
+    """
+    rng = _rng(task)
+    vocabulary = _vocabulary(task)
+    if "[id: " in task:
+        ids = [int(i) for i in re.findall(r"\[id: (\d+)\]", task)]
+        data = {
+            "evaluations": [
+                {
+                    "id": i,
+                    "grade": rng.choice("ABC"),
+                    "feedback": _sentence(rng, vocabulary, words),
+                }
+                for i in ids
+            ]
+        }
+    elif '"explanations"' in task:
+        data = {
+            "explanations": [
+                _sentence(rng, vocabulary, words)
+                for _ in range(task.count("Student's answer:"))
+            ]
+        }
+    elif "Test Results:" in task:
+        data = {
+            "feedback": _sentence(rng, vocabulary, words),
+            "difficulty_appropriate": True,
+            "time_complexity_analysis": "O(n)",
+            "space_complexity_analysis": "O(1)",
+            "code_quality_feedback": _sentence(rng, vocabulary, words // 2),
+            "improvement_suggestions": [_sentence(rng, vocabulary, 6)],
+        }
+    elif "Evaluate the following coding solution" in task:
+        data = {
+            "passed": True,
+            "test_results": [],
+            "feedback": _sentence(rng, vocabulary, words),
+            "score": 1.0,
+            "difficulty_appropriate": True,
+        }
+    elif '"grade"' in task:
+        data = {
+            "grade": rng.choice("ABC"),
+            "feedback": _sentence(rng, vocabulary, words),
+        }
+    elif "function_signature" in task:
+        difficulty = re.search(r"Generate \d+ (easy|medium|hard) coding", task)
+        data = {
+            "questions": [
+                _coding_question(
+                    rng,
+                    vocabulary,
+                    words,
+                    difficulty.group(1) if difficulty else "easy",
+                )
+                for _ in range(_count(task))
+            ]
+        }
+    elif "questions" in task:
+        question_type = re.findall(r"Generate \d+ (\w+) questions", task)
+        data = {
+            "questions": [
+                _question(
+                    rng,
+                    vocabulary,
+                    words,
+                    question_type[-1] if question_type else "MCQ",
+                )
+                for _ in range(_count(task))
+            ]
+        }
+    else:
+        return _sentence(rng, vocabulary, words) + "."
+    return json.dumps(data, indent=2)
+
+
+def _react_turn(messages: Sequence[ChatMessage], words: int) -> Optional[str]:
+    """
+    The next ReAct step when messages are an agent's chat: one call to the
+    study material tool, then the answer. None for plain chats.
+    """
+    if not any(
+        m.role == MessageRole.SYSTEM and "Action Input" in (m.content or "")
+        for m in messages
+    ):
+        return None
+    task_at = max(
+        i
+        for i, m in enumerate(messages)
+        if m.role == MessageRole.USER
+        and not (m.content or "").startswith("Observation:")
+    )
+    task = messages[task_at].content or ""
+    if any(_TOOL_THOUGHT in (m.content or "") for m in messages[task_at + 1 :]):
+        return (
+            "Thought: I can answer without using any more tools.\nAnswer: "
+            + respond(task, words)
+        )
+    topic = re.search(r"questions about (.+?)\.", task)
+    query = topic.group(1) if topic else task[:200]
+    return (
+        f"{_TOOL_THOUGHT}\nAction: study_material_query\n"
+        f"Action Input: {json.dumps({'input': query})}"
+    )
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class StubLLM(LLM):
+    """
+    Stands in for Groq. Agents get ReAct turns (one tool call, then the
+    answer); everything else gets respond(prompt). Usage is reported like
+    Groq's, so token accounting is not marked as estimated.
+    """
+
+    options: StubOptions
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=131072, num_output=8192, model_name="stub-llm"
+        )
+
+    def _delay(self, prompt: str, text: str) -> float:
+        options = self.options
+        base = options.llm_latency + options.llm_seconds_per_token * _tokens(text)
+        return max(0.0, base * (1 + _rng(prompt).uniform(-1, 1) * options.jitter))
+
+    def _completion(self, prompt: str, text: str, **kwargs: Any) -> CompletionResponse:
+        usage = {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text)}
+        return CompletionResponse(text=text, raw={"usage": usage}, **kwargs)
+
+    def _chat_text(self, messages: Sequence[ChatMessage]):
+        prompt = self.messages_to_prompt(messages)
+        text = _react_turn(messages, self.options.words)
+        return prompt, text if text is not None else respond(prompt, self.options.words)
+
+    def _chat(self, prompt: str, text: str, **kwargs: Any) -> ChatResponse:
+        usage = {"prompt_tokens": _tokens(prompt), "completion_tokens": _tokens(text)}
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=text),
+            raw={"usage": usage},
+            **kwargs,
+        )
+
+    def _chunks(self, text: str) -> List[str]:
+        return re.findall(r"\S*\s*", text)[:-1] or [text]
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        text = respond(prompt, self.options.words)
+        time.sleep(self._delay(prompt, text))
+        return self._completion(prompt, text)
+
+    @llm_completion_callback()
+    async def acomplete(self, prompt: str, formatted: bool = False, **kwargs: Any):
+        text = respond(prompt, self.options.words)
+        await asyncio.sleep(self._delay(prompt, text))
+        return self._completion(prompt, text)
+
+    @llm_completion_callback()
+    def stream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> Iterator[CompletionResponse]:
+        text = respond(prompt, self.options.words)
+        chunks = self._chunks(text)
+        pause = self._delay(prompt, text) / len(chunks)
+
+        def gen():
+            sent = ""
+            for chunk in chunks:
+                time.sleep(pause)
+                sent += chunk
+                yield self._completion(prompt, sent, delta=chunk)
+
+        return gen()
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> AsyncIterator[CompletionResponse]:
+        text = respond(prompt, self.options.words)
+        chunks = self._chunks(text)
+        pause = self._delay(prompt, text) / len(chunks)
+
+        async def gen():
+            sent = ""
+            for chunk in chunks:
+                await asyncio.sleep(pause)
+                sent += chunk
+                yield self._completion(prompt, sent, delta=chunk)
+
+        return gen()
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        prompt, text = self._chat_text(messages)
+        time.sleep(self._delay(prompt, text))
+        return self._chat(prompt, text)
+
+    @llm_chat_callback()
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponse:
+        prompt, text = self._chat_text(messages)
+        await asyncio.sleep(self._delay(prompt, text))
+        return self._chat(prompt, text)
+
+    @llm_chat_callback()
+    def stream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> Iterator[ChatResponse]:
+        prompt, text = self._chat_text(messages)
+        chunks = self._chunks(text)
+        pause = self._delay(prompt, text) / len(chunks)
+
+        def gen():
+            sent = ""
+            for chunk in chunks:
+                time.sleep(pause)
+                sent += chunk
+                yield self._chat(prompt, sent, delta=chunk)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> AsyncIterator[ChatResponse]:
+        prompt, text = self._chat_text(messages)
+        chunks = self._chunks(text)
+        pause = self._delay(prompt, text) / len(chunks)
+
+        async def gen():
+            sent = ""
+            for chunk in chunks:
+                await asyncio.sleep(pause)
+                sent += chunk
+                yield self._chat(prompt, sent, delta=chunk)
+
+        return gen()
+
+
+class StubEmbedding(BaseEmbedding):
+    """
+    Stands in for Jina: a normalised hashed bag of words, so texts sharing
+    words are similar, with one latency per request (a batch is one request).
+    """
+
+    latency: float = 0.0
+    dim: int = 256
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "StubEmbedding"
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"[a-z0-9]+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dim] += 1.0
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        time.sleep(self.latency)
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(query)
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency)
+        return self._vector(text)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+
+
+def stub_vector_store(options: StubOptions):
+    """
+    build_vector_store replacement standing in for Pinecone: the local
+    memory-mapped store, with a round trip's latency added to every query.
+    """
+    from utils.config import (
+        COURSES_DIR,
+        LOCAL_VECTOR_STORE_DIR,
+        LOCAL_VECTOR_STORE_QUANTIZE,
+    )
+    from utils.vector_store import MmapVectorStore
+
+    class StubVectorStore(MmapVectorStore):
+        def query(
+            self, query: VectorStoreQuery, **kwargs: Any
+        ) -> VectorStoreQueryResult:
+            time.sleep(options.vector_latency)
+            return super().query(query, **kwargs)
+
+        async def aquery(
+            self, query: VectorStoreQuery, **kwargs: Any
+        ) -> VectorStoreQueryResult:
+            await asyncio.sleep(options.vector_latency)
+            return await asyncio.to_thread(super().query, query, **kwargs)
+
+    def build(backend: str = "local", course_id: Optional[str] = None):
+        return StubVectorStore(
+            persist_dir=(
+                os.path.join(COURSES_DIR, course_id, "index")
+                if course_id
+                else LOCAL_VECTOR_STORE_DIR
+            ),
+            quantize=LOCAL_VECTOR_STORE_QUANTIZE,
+        )
+
+    return build
+
+
+def install(options: StubOptions) -> None:
+    """
+    Point the app at the stand-ins. Must run after utils.pipeline is
+    imported (it configures the real services) and before main is.
+    """
+    import utils.vector_store
+    from utils.config import EMBEDDING_CACHE_ENABLED
+    from utils.embedding_cache import CachedEmbedding
+    from utils.llm_gateway import GatewayLLM
+    from utils.pipeline import llm_gateway
+
+    Settings.llm = StubLLM(options=options)
+    if llm_gateway is not None:
+        Settings.llm = GatewayLLM(Settings.llm, llm_gateway)
+    Settings.embed_model = StubEmbedding(
+        latency=options.embed_latency, dim=options.embed_dim
+    )
+    if EMBEDDING_CACHE_ENABLED:
+        Settings.embed_model = CachedEmbedding(Settings.embed_model)
+    utils.vector_store.build_vector_store = stub_vector_store(options)
+
+
+def install_in_worker(options: dict) -> None:
+    """
+    IngestionRunner initializer: use the stand-ins in ingestion processes.
+    """
+    import utils.pipeline  # noqa: F401
+
+    install(StubOptions(**options))
@@ -0,0 +1,201 @@
+import asyncio
+import json
+
+import pytest
+from llama_index.core.base.llms.types import CompletionResponse
+from llama_index.core.llms import MockLLM
+
+from utils.grading import (
+    grade_mcq,
+    is_mcq,
+    lexical_coverage,
+    pregrade_answer,
+    resolve_choice,
+)
+from utils.llm_gateway import LLMOverloaded
+from utils.pipeline import (
+    Settings,
+    _pregrade_decisions,
+    _pregrade_texts,
+    aevaluate_answers,
+)
+
+OPTIONS = ["A) Waterfall", "B) Spiral model", "C) V-model", "D) Big bang"]
+
+
+@pytest.mark.parametrize(
+    "answer",
+    ["B", "b", "(b)", "B)", "b.", "Option B", "Answer: B", "The correct answer is B"],
+)
+def test_resolve_choice_reads_option_letters(answer):
+    assert resolve_choice(answer, OPTIONS) == 1
+
+
+@pytest.mark.parametrize("answer", ["Spiral model", "spiral MODEL.", "B. Spiral model"])
+def test_resolve_choice_reads_option_text(answer):
+    assert resolve_choice(answer, OPTIONS) == 1
+
+
+@pytest.mark.parametrize("answer", ["", "  ", "E", "Spiral", "maybe"])
+def test_resolve_choice_rejects_ambiguous_or_unknown_answers(answer):
+    assert resolve_choice(answer, OPTIONS) is None
+
+
+def test_resolve_choice_without_options_assumes_four():
+    assert resolve_choice("c") == 2
+    assert resolve_choice("E") is None
+
+
+def test_is_mcq():
+    assert is_mcq("B")
+    assert is_mcq("anything", options=OPTIONS)
+    assert is_mcq("The spiral model", question_type="MCQ")
+    assert not is_mcq("B", question_type="subjective")
+    assert not is_mcq("The spiral model")
+
+
+def test_grade_mcq_correct():
+    result = grade_mcq("b)", "B", OPTIONS)
+    assert result["grade"] == "Correct"
+    assert result["graded_by"] == "rule"
+    assert "B (Spiral model)" in result["feedback"]
+
+
+def test_grade_mcq_wrong_option():
+    result = grade_mcq("Waterfall", "B", OPTIONS)
+    assert result["grade"] == "Incorrect"
+    assert "You chose A (Waterfall)" in result["feedback"]
+
+
+def test_grade_mcq_unmatched_answer():
+    result = grade_mcq("Agile", "B", OPTIONS)
+    assert result["grade"] == "Incorrect"
+    assert "does not match any of the options" in result["feedback"]
+
+
+def test_grade_mcq_defers_when_the_key_is_unclear():
+    assert grade_mcq("B", "Either spiral or waterfall", OPTIONS) is None
+
+
+def test_pregrade_short_correct_answer_is_correct():
+    decision = pregrade_answer("Spiral", "Spiral", 1.0)
+    assert decision["routing"] == "auto_correct"
+    assert decision["evaluation"]["grade"] == "Correct"
+
+
+def test_pregrade_empty_answer_is_incorrect_without_similarity():
+    decision = pregrade_answer("   ", "The spiral model", None)
+    assert decision["routing"] == "auto_incorrect"
+    assert decision["evaluation"]["grade"] == "Incorrect"
+
+
+def test_pregrade_short_dissimilar_answer_is_incorrect():
+    decision = pregrade_answer("Banana", "The spiral model", 0.1)
+    assert decision["routing"] == "auto_incorrect"
+    assert "too short" in decision["evaluation"]["feedback"]
+
+
+def test_pregrade_short_answer_in_between_is_escalated():
+    decision = pregrade_answer("Spiral", "The spiral model", 0.7)
+    assert decision["routing"] == "escalated"
+    assert decision["evaluation"] is None
+
+
+def test_pregrade_needs_coverage_as_well_as_similarity():
+    model = "Cohesion measures how closely related the responsibilities of a module are"
+    decision = pregrade_answer("It is about modules", model, 0.95)
+    assert decision["routing"] == "escalated"
+    decision = pregrade_answer(
+        "Cohesion measures how related the responsibilities in a module are",
+        model,
+        0.95,
+    )
+    assert decision["routing"] == "auto_correct"
+
+
+def test_pregrade_low_similarity_is_incorrect():
+    decision = pregrade_answer(
+        "Testing finds defects", "Cohesion measures module focus", 0.2
+    )
+    assert decision["routing"] == "auto_incorrect"
+    assert "Cohesion measures module focus" in decision["evaluation"]["feedback"]
+
+
+def test_pregrade_without_similarity_is_escalated():
+    decision = pregrade_answer("Cohesion measures module focus", "Cohesion", None)
+    assert decision["routing"] == "escalated"
+
+
+def test_lexical_coverage_ignores_stopwords_and_case():
+    assert lexical_coverage("the WATERFALL model", "Waterfall model") == 1.0
+    assert lexical_coverage("waterfall", "Waterfall model") == 0.5
+    assert lexical_coverage("anything", "the of a") == 1.0
+
+
+def test_pregrade_embeds_every_non_empty_answer():
+    items = [
+        {"user_answer": "Spiral", "model_answer": "Spiral"},
+        {"user_answer": "", "model_answer": "Waterfall"},
+    ]
+    embeddable, texts = _pregrade_texts(items)
+    assert embeddable == [0]
+    assert texts == ["Spiral", "Spiral"]
+    decisions = _pregrade_decisions(items, embeddable, [[1.0, 0.0], [1.0, 0.0]])
+    assert [d["routing"] for d in decisions] == ["auto_correct", "auto_incorrect"]
+
+
+BATCH = [
+    {
+        "question": "What is cohesion?",
+        "user_answer": "How related a module's parts are.",
+        "model_answer": "How closely related a module's responsibilities are.",
+    },
+    {
+        "question": "What is coupling?",
+        "user_answer": "How much modules depend on each other.",
+        "model_answer": "The degree of interdependence between modules.",
+    },
+    {
+        "question": "Which model is risk-driven?",
+        "user_answer": "B",
+        "model_answer": "B",
+    },
+]
+
+
+def evaluate_overloaded(monkeypatch, refuse_batches):
+    """
+    Grade BATCH with an LLM that grades only answer 0 of a batch prompt (or
+    refuses batches too) and refuses every other call.
+    """
+    prompts = []
+
+    class OverloadedLLM(MockLLM):
+        async def acomplete(self, prompt, formatted=False, **kwargs):
+            prompts.append(prompt)
+            if "[id: 0]" in prompt and not refuse_batches:
+                evaluation = {"id": 0, "grade": "Correct", "feedback": "Good."}
+                text = json.dumps({"evaluations": [evaluation]})
+                return CompletionResponse(text=text)
+            raise LLMOverloaded(7)
+
+    monkeypatch.setattr(Settings, "llm", OverloadedLLM())
+    return asyncio.run(aevaluate_answers(BATCH, pregrade=False)), prompts
+
+
+def test_refused_retries_fail_only_their_answer(monkeypatch):
+    results, prompts = evaluate_overloaded(monkeypatch, refuse_batches=False)
+    assert results[0]["evaluation"]["grade"] == "Correct"
+    assert results[1]["evaluation"] is None
+    assert results[1]["retry_after"] == 7
+    assert "rate limit" in results[1]["error"]
+    assert results[2]["evaluation"]["graded_by"] == "rule"
+    # A refused call is not retried.
+    assert len(prompts) == 2
+
+
+def test_refused_batches_keep_locally_graded_answers(monkeypatch):
+    results, prompts = evaluate_overloaded(monkeypatch, refuse_batches=True)
+    assert [r["retry_after"] for r in results] == [7, 7, None]
+    assert results[2]["evaluation"]["grade"] == "Correct"
+    assert len(prompts) == 1
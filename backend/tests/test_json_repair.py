@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from utils.json_repair import parse_llm_json
+from utils.llm_gateway import LLMOverloaded
+from utils.pipeline import _agenerate_questions_with, _areask_missing, _parse_questions
+
+MCQ = {
+    "type": "MCQ",
+    "question": "Which model is risk-driven?",
+    "options": ["A) Waterfall", "B) Spiral"],
+    "model_answer": "B",
+}
+SUBJECTIVE = {
+    "type": "Subjective",
+    "question": "What is cohesion?",
+    "model_answer": "How closely related a module's responsibilities are.",
+}
+
+
+def test_parse_clean_json():
+    assert parse_llm_json('{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        'Here you go:\n```json\n{"a": [1, 2]}\n```\nEnjoy!',
+        '{"a": [1, 2,],}',
+        'Sure! {"a": [1, 2]} Hope that helps.',
+    ],
+)
+def test_repairs_wrappers_and_trailing_commas(text):
+    assert parse_llm_json(text) == {"a": [1, 2]}
+
+
+def test_repairs_python_literals_and_raw_newlines():
+    text = '{"ok": True, "missing": None, "off": False, "text": "two\nlines"}'
+    assert parse_llm_json(text) == {
+        "ok": True,
+        "missing": None,
+        "off": False,
+        "text": "two\nlines",
+    }
+
+
+def test_literals_inside_strings_are_left_alone():
+    assert parse_llm_json('{"text": "True or None",}') == {"text": "True or None"}
+
+
+def test_salvages_complete_items_of_a_truncated_array():
+    text = '{"questions": [{"q": 1}, {"q": 2}, {"q": 3, "opt'
+    assert parse_llm_json(text, array_key="questions") == {
+        "questions": [{"q": 1}, {"q": 2}],
+        "_truncated": True,
+    }
+
+
+def test_unrecoverable_text_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_llm_json("no json here", array_key="questions")
+
+
+def test_parse_questions_drops_invalid_items():
+    text = json.dumps(
+        {
+            "questions": [
+                MCQ,
+                {"type": "MCQ", "question": "No answer?", "options": ["A", "B"]},
+                "just a string",
+                {"question": 42, "model_answer": "x"},
+                SUBJECTIVE,
+            ]
+        }
+    )
+    assert _parse_questions(text) == {"questions": [MCQ, SUBJECTIVE]}
+
+
+def test_parse_questions_rejects_the_wrong_shape():
+    with pytest.raises(HTTPException):
+        _parse_questions('{"questions": "none"}')
+    with pytest.raises(HTTPException):
+        _parse_questions("not json")
+
+
+def asker(*responses):
+    calls = []
+
+    async def ask(prompt):
+        calls.append(prompt)
+        response = responses[len(calls) - 1]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    ask.calls = calls
+    return ask
+
+
+def test_reasks_for_invalid_items():
+    ask = asker(
+        json.dumps({"questions": [MCQ, {"question": "broken"}]}),
+        json.dumps({"questions": [SUBJECTIVE]}),
+    )
+    result = asyncio.run(_agenerate_questions_with(ask, "prompt", 2))
+    assert result == {"questions": [MCQ, SUBJECTIVE]}
+    assert len(ask.calls) == 2
+    assert MCQ["question"] in ask.calls[1]
+
+
+def test_no_valid_questions_is_an_error():
+    ask = asker(
+        json.dumps({"questions": [{"question": "broken"}]}),
+        json.dumps({"questions": [{"question": "still broken"}]}),
+    )
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(_agenerate_questions_with(ask, "prompt", 1))
+    assert "no valid questions" in raised.value.detail
+
+
+def test_reask_failures_are_tolerated():
+    ask = asker(ValueError("bad response"))
+    extra = asyncio.run(
+        _areask_missing(ask, "prompt", [MCQ], 1, "question", lambda text: [])
+    )
+    assert extra == []
+
+
+def test_reask_lets_llm_overloaded_through():
+    ask = asker(LLMOverloaded(5))
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(
+            _areask_missing(ask, "prompt", [MCQ], 1, "question", lambda text: [])
+        )
@@ -0,0 +1,194 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from llama_index.core.llms import MockLLM
+from openai import RateLimitError
+
+from utils.llm_gateway import (
+    GatewayLLM,
+    LLMGateway,
+    LLMOverloaded,
+    Priority,
+    llm_priority,
+)
+
+
+def gateway(**kwargs):
+    settings = dict(
+        rpm=1_000_000,
+        tpm=1_000_000_000,
+        max_concurrency=1,
+        max_wait=5,
+        max_queue=100,
+        completion_tokens=0,
+    )
+    settings.update(kwargs)
+    return LLMGateway(**settings)
+
+
+def rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else {}
+    response = httpx.Response(
+        429, headers=headers, request=httpx.Request("POST", "http://llm.test")
+    )
+    return RateLimitError("Rate limit reached", response=response, body=None)
+
+
+def test_queued_calls_are_admitted_by_priority_then_arrival():
+    llm = gateway()
+    admitted = []
+
+    async def call(name, priority):
+        with llm_priority(priority):
+            await llm.acquire(1)
+        admitted.append(name)
+        llm.release(1)
+
+    async def run():
+        await llm.acquire(1)
+        tasks = []
+        for name, priority in [
+            ("bulk", Priority.BULK),
+            ("interactive 1", Priority.INTERACTIVE),
+            ("grading", Priority.GRADING),
+            ("interactive 2", Priority.INTERACTIVE),
+        ]:
+            tasks.append(asyncio.create_task(call(name, priority)))
+            await asyncio.sleep(0)
+        assert llm.stats()["waiting"] == {"grading": 1, "interactive": 2, "bulk": 1}
+        llm.release(1)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert admitted == ["grading", "interactive 1", "interactive 2", "bulk"]
+
+
+def test_calls_beyond_the_token_budget_wait_for_it_to_refill():
+    # 600 tokens a minute refill at 10 a second.
+    llm = gateway(tpm=600, max_concurrency=10)
+
+    async def run():
+        await llm.acquire(600)
+        started = time.monotonic()
+        await llm.acquire(3)
+        return time.monotonic() - started
+
+    assert 0.2 <= asyncio.run(run()) < 2
+
+
+def test_calls_that_would_wait_too_long_are_refused():
+    llm = gateway(rpm=1, max_concurrency=10, max_wait=1)
+
+    async def run():
+        await llm.acquire(1)
+        with pytest.raises(LLMOverloaded) as refused:
+            await llm.acquire(1)
+        return refused.value
+
+    refused = asyncio.run(run())
+    assert refused.status_code == 429
+    assert 55 <= refused.retry_after <= 60
+    assert refused.headers["Retry-After"] == str(refused.retry_after)
+    assert llm.stats()["rejected"] == 1
+
+
+def test_calls_are_refused_when_the_queue_is_full():
+    llm = gateway(max_queue=1)
+
+    async def run():
+        await llm.acquire(1)
+        waiter = asyncio.create_task(llm.acquire(1))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMOverloaded):
+            await llm.acquire(1)
+        llm.release(1)
+        await waiter
+        llm.release(1)
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiters_give_up_their_place():
+    llm = gateway()
+
+    async def run():
+        await llm.acquire(1)
+        waiter = asyncio.create_task(llm.acquire(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        llm.release(1)
+        await asyncio.wait_for(llm.acquire(1), 1)
+        return llm.stats()
+
+    stats = asyncio.run(run())
+    assert stats["in_flight"] == 1
+    assert sum(stats["waiting"].values()) == 0
+
+
+def test_cancelled_waiters_do_not_fill_the_queue():
+    llm = gateway(max_queue=1)
+
+    async def run():
+        await llm.acquire(1)
+        waiter = asyncio.create_task(llm.acquire(1))
+        # Let the pump start and go to sleep while the slot is taken.
+        for _ in range(3):
+            await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        # The pump has not popped the cancelled waiter yet.
+        assert llm._waiters
+        queued = asyncio.create_task(llm.acquire(1))
+        await asyncio.sleep(0)
+        assert not queued.done()
+        llm.release(1)
+        await asyncio.wait_for(queued, 1)
+
+    asyncio.run(run())
+    assert llm.stats()["rejected"] == 0
+
+
+def test_provider_429_pauses_every_call_for_retry_after():
+    llm = gateway(max_concurrency=10, max_wait=1)
+    overloaded = llm.rate_limited(rate_limit_error("30"))
+    assert overloaded.retry_after == 30
+    assert 29 <= llm.stats()["paused_for"] <= 30
+    with pytest.raises(LLMOverloaded):
+        llm.check("any prompt")
+    with pytest.raises(LLMOverloaded):
+        asyncio.run(llm.acquire(1))
+
+
+def test_provider_429_without_retry_after_uses_the_default_backoff():
+    llm = gateway()
+    assert llm.rate_limited(rate_limit_error()).retry_after == 10
+
+
+def test_short_provider_backoff_is_waited_out():
+    llm = gateway(max_concurrency=10)
+    llm.rate_limited(rate_limit_error("0.3"))
+
+    async def run():
+        started = time.monotonic()
+        await llm.acquire(1)
+        return time.monotonic() - started
+
+    assert 0.2 <= asyncio.run(run()) < 2
+    assert llm.stats()["provider_rate_limited"] == 1
+
+
+def test_gateway_llm_turns_provider_429_into_llm_overloaded():
+    llm = gateway()
+    wrapped = GatewayLLM(MockLLM(), llm)
+
+    async def provider_call():
+        raise rate_limit_error("12")
+
+    with pytest.raises(LLMOverloaded) as raised:
+        asyncio.run(wrapped._acall("prompt", provider_call))
+    assert raised.value.retry_after == 12
+    # The slot was given back.
+    assert llm.stats()["in_flight"] == 0
@@ -0,0 +1,53 @@
+import pytest
+
+from utils.question_bank import QuestionBank
+
+
+def questions(*names):
+    return [{"question": f"What is {name}?"} for name in names]
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    yield bank
+    bank.close()
+
+
+def test_stocking_does_not_count_as_served(bank):
+    assert bank.add("b", questions("cohesion", "coupling")) == 2
+    assert bank.stock("b") == 2
+    assert bank.add("b", questions("cohesion")) == 0
+
+
+def test_anonymous_serves_are_counted(bank):
+    bank.add("b", questions("cohesion", "coupling"), served=True)
+    assert bank.stock("b") == 0
+    assert bank.stats()["unserved"] == 0
+
+
+def test_serving_banked_questions_counts_them_again(bank):
+    bank.add("b", questions("cohesion"))
+    bank.add("b", questions("cohesion", "coupling"), served=True, served_to="alice")
+    assert bank.stock("b") == 0
+    # Alice has seen both; Bob gets them.
+    assert bank.take("b", 1, client_id="alice") is None
+    assert len(bank.take("b", 2, client_id="bob")) == 2
+
+
+def test_take_serves_least_served_first_and_never_repeats(bank):
+    bank.add("b", questions("cohesion", "coupling", "testing"))
+    bank.add("b", questions("cohesion", "coupling"), served=True)
+    assert bank.take("b", 1, client_id="alice") == questions("testing")
+    second = bank.take("b", 2, client_id="alice")
+    assert sorted(q["question"] for q in second) == [
+        "What is cohesion?",
+        "What is coupling?",
+    ]
+    assert bank.take("b", 1, client_id="alice") is None
+
+
+def test_take_serves_nothing_unless_it_covers_the_request(bank):
+    bank.add("b", questions("cohesion"))
+    assert bank.take("b", 2) is None
+    assert bank.stock("b") == 1
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.response_cache import ResponseCache, request_key
+from utils.schema import DifficultyLevel
+
+
+@pytest.fixture
+def disk_path(tmp_path):
+    return str(tmp_path / "responses.sqlite3")
+
+
+def test_request_key_ignores_case_whitespace_and_field_order():
+    assert request_key("q", topic="Software  Testing", n=5) == request_key(
+        "q", n=5, topic=" software testing"
+    )
+    assert request_key("q", topic="testing") != request_key("coding", topic="testing")
+    assert request_key("q", topic="testing", n=5) != request_key(
+        "q", topic="testing", n=6
+    )
+
+
+def test_request_key_reads_enums_by_value():
+    assert request_key("q", difficulty=DifficultyLevel.HARD) == request_key(
+        "q", difficulty="hard"
+    )
+
+
+def test_values_are_copies():
+    cache = ResponseCache(disk_path=None)
+    value = {"questions": [1]}
+    cache.set("k", value)
+    value["questions"].append(2)
+    cached = cache.get("k")
+    assert cached == {"questions": [1]}
+    cached["questions"].append(3)
+    assert cache.get("k") == {"questions": [1]}
+
+
+def test_entries_expire(monkeypatch):
+    cache = ResponseCache(ttl_seconds=10, disk_path=None)
+    cache.set("k", 1)
+    cache.set("short", 2, ttl_seconds=1)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 5)
+    assert cache.get("k") == 1
+    assert cache.get("short") is None
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get("k") is None
+
+
+def test_memory_tier_evicts_least_recently_used_by_size():
+    cache = ResponseCache(max_bytes=30, disk_path=None)
+    cache.set("a", "x" * 10)
+    cache.set("b", "y" * 10)
+    cache.get("a")
+    cache.set("c", "z" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 10
+    assert cache.get("c") == "z" * 10
+    assert cache.stats()["bytes"] <= 30
+    # Too big to keep in memory at all.
+    cache.set("big", "w" * 100)
+    assert cache.get("big") is None
+
+
+def test_disk_tier_is_shared_between_caches(disk_path):
+    writer = ResponseCache(disk_path=disk_path)
+    reader = ResponseCache(disk_path=disk_path)
+    writer.set("k", {"v": 1})
+    assert reader.get("k") == {"v": 1}
+    assert reader.get("k") == {"v": 1}
+    stats = reader.stats()
+    assert (stats["disk_hits"], stats["hits"], stats["misses"]) == (1, 1, 0)
+    writer.invalidate("k")
+    assert ResponseCache(disk_path=disk_path).get("k") is None
+
+
+def test_get_or_compute_computes_once_unless_fresh(disk_path):
+    cache = ResponseCache(disk_path=disk_path)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"n": len(calls)}
+
+    async def run():
+        first = await cache.get_or_compute("k", compute)
+        second = await cache.get_or_compute("k", compute)
+        third = await cache.get_or_compute("k", compute, fresh=True)
+        return first, second, third, await cache.aget("k")
+
+    assert asyncio.run(run()) == ({"n": 1}, {"n": 1}, {"n": 2}, {"n": 2})
+    assert len(calls) == 2
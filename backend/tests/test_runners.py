@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+
+from utils import runners
+from utils.runners import (
+    RESULT_MARKER,
+    RUNNERS,
+    _compile,
+    _parse_output,
+    run_compiled_test_cases,
+)
+from utils.sandbox import get_sandbox_pool, shutdown_sandbox_pool
+
+TRICKY_STRING = 'say "hi"\n\tto C:\\temp \u00e9'
+
+SOLUTIONS = {
+    "C": {
+        "add": ("int add(int a, int b)", "int add(int a, int b) { return a + b; }"),
+        "echo": ("char* echo(char* s)", "char* echo(char* s) { return s; }"),
+    },
+    "C++": {
+        "add": ("int add(int a, int b)", "int add(int a, int b) { return a + b; }"),
+        "echo": ("string echo(string s)", "string echo(string s) { return s; }"),
+    },
+    "Java": {
+        "add": (
+            "public int add(int a, int b)",
+            "public int add(int a, int b) { return a + b; }",
+        ),
+        "echo": (
+            "public String echo(String s)",
+            "public String echo(String s) { return s; }",
+        ),
+    },
+    "C#": {
+        "add": (
+            "public int add(int a, int b)",
+            "public int add(int a, int b) { return a + b; }",
+        ),
+        "echo": (
+            "public string echo(string s)",
+            "public string echo(string s) { return s; }",
+        ),
+    },
+    "JavaScript": {
+        "add": ("function add(a, b)", "function add(a, b) { return a + b; }"),
+        "echo": ("function echo(s)", "function echo(s) { return s; }"),
+    },
+}
+
+
+def run_compiled(language, user_code, signature, test_cases):
+    async def run():
+        try:
+            return await run_compiled_test_cases(
+                language, user_code, signature, test_cases
+            )
+        finally:
+            await shutdown_sandbox_pool()
+
+    return asyncio.run(run())["test_results"]
+
+
+def require(language):
+    if language not in RUNNERS:
+        pytest.skip(f"no {language} toolchain")
+
+
+@pytest.mark.parametrize("language", sorted(SOLUTIONS))
+def test_harness_runs_each_test_case(language):
+    require(language)
+    signature, code = SOLUTIONS[language]["add"]
+    results = run_compiled(
+        language,
+        code,
+        signature,
+        [
+            {"input": {"a": 1, "b": 2}, "expected": 3},
+            {"input": {"a": -5, "b": 2}, "expected": -3},
+            {"input": {"a": 2, "b": 2}, "expected": 5},
+        ],
+    )
+    assert [r["passed"] for r in results] == [True, True, False]
+    assert results[2]["actual"] == 4
+
+
+@pytest.mark.parametrize("language", sorted(SOLUTIONS))
+def test_harness_escapes_strings(language):
+    require(language)
+    signature, code = SOLUTIONS[language]["echo"]
+    [result] = run_compiled(
+        language,
+        code,
+        signature,
+        [{"input": {"s": TRICKY_STRING}, "expected": TRICKY_STRING}],
+    )
+    assert result["error"] is None
+    assert result["actual"] == TRICKY_STRING
+    assert result["passed"]
+
+
+@pytest.mark.parametrize("language", ["C", "C++"])
+def test_c_harnesses_escape_control_characters(language):
+    require(language)
+    value = "\x01bell\x07 \x1f7 ??= \U0001f600"
+    signature, code = SOLUTIONS[language]["echo"]
+    [result] = run_compiled(
+        language, code, signature, [{"input": {"s": value}, "expected": value}]
+    )
+    assert result["error"] is None
+    assert result["passed"]
+
+
+@pytest.mark.parametrize("language", sorted(SOLUTIONS))
+def test_harness_reports_compile_errors(language):
+    require(language)
+    signature, _ = SOLUTIONS[language]["add"]
+    [result] = run_compiled(
+        language,
+        "this is not code (",
+        signature,
+        [{"input": {"a": 1, "b": 2}, "expected": 3}],
+    )
+    assert not result["passed"]
+    assert result["error"].startswith("Compilation failed")
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        {"status": "wall_timeout", "actual": None, "error": None},
+        {"status": "crashed", "actual": None, "error": "Sandbox worker died"},
+    ],
+)
+def test_compile_timeouts_and_crashes_are_not_cached(monkeypatch, failure):
+    require("C")
+    source = f"int main(void) {{ return 0; }} /* {failure['status']} */"
+
+    class FailingPool:
+        async def run(self, jobs):
+            return [dict(failure, duration_ms=1.0)]
+
+    async def failing_pool():
+        return FailingPool()
+
+    async def run():
+        try:
+            monkeypatch.setattr(runners, "get_sandbox_pool", failing_pool)
+            _, first_error, _ = await _compile(RUNNERS["C"], source)
+            monkeypatch.setattr(runners, "get_sandbox_pool", get_sandbox_pool)
+            _, retry_error, cached = await _compile(RUNNERS["C"], source)
+            return first_error, retry_error, cached
+        finally:
+            await shutdown_sandbox_pool()
+
+    first_error, retry_error, cached = asyncio.run(run())
+    assert first_error
+    assert retry_error is None
+    assert not cached
+
+
+def test_c_crash_in_user_function_is_reported_per_test():
+    require("C")
+    results = run_compiled(
+        "C",
+        "int add(int a, int b) {\n"
+        '    printf("thinking...");\n'
+        "    if (a < 0) abort();\n"
+        "    return a + b;\n"
+        "}",
+        "int add(int a, int b)",
+        [
+            {"input": {"a": -1, "b": 2}, "expected": 1},
+            {"input": {"a": 1, "b": 2}, "expected": 3},
+        ],
+    )
+    assert not results[0]["passed"]
+    assert results[0]["error"].startswith("Process exited with status")
+    assert results[1]["passed"]
+
+
+def test_parse_output_reads_the_last_result():
+    output = _parse_output(
+        {
+            "status": "ok",
+            "stdout": f'noise{RESULT_MARKER}fake\n{RESULT_MARKER}{{"actual": [1, 2]}}\n',
+            "exit_code": 0,
+            "duration_ms": 1.0,
+        }
+    )
+    assert output == {
+        "status": "ok",
+        "actual": [1, 2],
+        "error": None,
+        "duration_ms": 1.0,
+    }
+
+
+@pytest.mark.parametrize(
+    "payload", ['{"actual": "unterminated', '{"actual": nan}', "42", ""]
+)
+def test_parse_output_reports_malformed_results_as_crashes(payload):
+    output = _parse_output(
+        {
+            "status": "ok",
+            "stdout": f"\n{RESULT_MARKER}{payload}",
+            "exit_code": 0,
+            "duration_ms": 1.0,
+        }
+    )
+    assert output["status"] == "crashed"
+    assert output["actual"] is None
+    assert "Malformed result" in output["error"]
+
+
+def test_parse_output_without_a_result():
+    output = _parse_output(
+        {"status": "ok", "stdout": "partial", "exit_code": 134, "duration_ms": 1.0}
+    )
+    assert output["status"] == "crashed"
+    assert output["error"] == "Process exited with status 134"
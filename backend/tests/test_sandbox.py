@@ -0,0 +1,192 @@
+import asyncio
+import os
+
+import pytest
+
+from utils.config import SANDBOX_ISOLATION, SANDBOX_MAX_PROCESSES, SANDBOX_UID
+from utils.sandbox import SandboxPool, shutdown_sandbox_pool
+
+
+def run_jobs(jobs):
+    async def run():
+        pool = SandboxPool(size=1)
+        await pool.start()
+        try:
+            return await pool.run(jobs)
+        finally:
+            await pool.close()
+
+    return asyncio.run(run())
+
+
+def run_python(code, cpu_seconds=2, wall_seconds=5, memory_mb=256):
+    [result] = run_jobs(
+        [
+            {
+                "code": code,
+                "function_name": "solve",
+                "input": {},
+                "cpu_seconds": cpu_seconds,
+                "wall_seconds": wall_seconds,
+                "memory_mb": memory_mb,
+            }
+        ]
+    )
+    return result
+
+
+@pytest.fixture(scope="module")
+def isolation():
+    if not SANDBOX_ISOLATION:
+        pytest.skip("SANDBOX_ISOLATION is off")
+    try:
+        run_python("def solve():\n    return 1")
+    except RuntimeError as e:
+        pytest.skip(str(e))
+
+
+def test_returns_the_result():
+    result = run_python("def solve():\n    return [1, 2.5, 'x']")
+    assert result["status"] == "ok"
+    assert result["actual"] == [1, 2.5, "x"]
+
+
+def test_cpu_limit():
+    result = run_python("def solve():\n    while True:\n        pass", cpu_seconds=1)
+    assert result["status"] == "cpu_timeout"
+
+
+def test_other_kills_are_not_reported_as_cpu_timeouts():
+    result = run_python(
+        "import os, signal\ndef solve():\n    os.kill(os.getpid(), signal.SIGKILL)"
+    )
+    assert result["status"] == "killed"
+    assert result["actual"] is None
+
+
+def test_wall_clock_limit():
+    result = run_python(
+        "import time\ndef solve():\n    time.sleep(30)", wall_seconds=0.5
+    )
+    assert result["status"] == "wall_timeout"
+
+
+def test_memory_limit():
+    result = run_python(
+        "def solve():\n    return len(bytearray(1 << 30))", memory_mb=128
+    )
+    assert result["actual"] is None
+    assert "MemoryError" in result["error"]
+
+
+@pytest.mark.usefixtures("isolation")
+def test_cannot_read_files_outside_the_job_dir(tmp_path):
+    secret = tmp_path / "secret.env"
+    secret.write_text("API_KEY=hunter2")
+    for path in (str(secret), os.path.abspath(__file__)):
+        result = run_python(f"def solve():\n    return open({path!r}).read()")
+        assert result["actual"] is None
+        assert "FileNotFoundError" in result["error"]
+
+
+@pytest.mark.usefixtures("isolation")
+def test_compilers_cannot_include_files_outside_the_job_dir(tmp_path):
+    from utils.runners import RUNNERS, run_compiled_test_cases
+
+    if "C" not in RUNNERS:
+        pytest.skip("no C compiler")
+    secret = tmp_path / "secret.h"
+    secret.write_text("int api_key = 1234567;")
+
+    async def run():
+        try:
+            return await run_compiled_test_cases(
+                "C",
+                f'#include "{secret}"\nint add(int a, int b) {{ return a + b; }}',
+                "int add(int a, int b)",
+                [{"input": {"a": 1, "b": 2}, "expected": 3}],
+            )
+        finally:
+            await shutdown_sandbox_pool()
+
+    [result] = asyncio.run(run())["test_results"]
+    assert not result["passed"]
+    assert "No such file or directory" in result["error"]
+    assert "1234567" not in result["error"]
+
+
+@pytest.mark.usefixtures("isolation")
+def test_file_system_is_read_only_except_tmp():
+    result = run_python(
+        "def solve():\n"
+        "    with open('/tmp/scratch', 'w') as f:\n"
+        "        f.write('ok')\n"
+        "    with open('/tmp/scratch') as f:\n"
+        "        scratch = f.read()\n"
+        "    try:\n"
+        "        open('/usr/owned', 'w')\n"
+        "    except OSError as e:\n"
+        "        return [scratch, e.errno]\n"
+    )
+    assert result["actual"] == ["ok", 30]  # EROFS
+
+
+@pytest.mark.usefixtures("isolation")
+def test_runs_as_unprivileged_user():
+    result = run_python("import os\ndef solve():\n    return os.getuid()")
+    assert result["actual"] == SANDBOX_UID
+
+
+@pytest.mark.usefixtures("isolation")
+def test_network_is_unreachable():
+    result = run_python(
+        "import socket\n"
+        "def solve():\n"
+        "    socket.create_connection(('1.1.1.1', 80), timeout=2)\n"
+        "    return 'connected'"
+    )
+    assert result["actual"] is None
+    assert "OSError" in result["error"]
+
+
+@pytest.mark.usefixtures("isolation")
+def test_cannot_see_or_signal_host_processes():
+    result = run_python(f"import os\ndef solve():\n    os.kill({os.getpid()}, 9)")
+    assert "ProcessLookupError" in result["error"]
+
+
+@pytest.mark.usefixtures("isolation")
+def test_fork_bomb_is_bounded_and_cleaned_up():
+    fork_bomb = (
+        "import os, time\n"
+        "def solve():\n"
+        "    forked = 0\n"
+        "    try:\n"
+        "        while True:\n"
+        "            if os.fork() == 0:\n"
+        "                time.sleep(60)\n"
+        "                os._exit(0)\n"
+        "            forked += 1\n"
+        "    except OSError:\n"
+        "        return forked\n"
+    )
+    count_processes = (
+        "import os\ndef solve():\n"
+        "    return sum(name.isdigit() for name in os.listdir('/proc'))"
+    )
+    jobs = [
+        {
+            "code": code,
+            "function_name": "solve",
+            "input": {},
+            "cpu_seconds": 2,
+            "wall_seconds": 10,
+            "memory_mb": 256,
+        }
+        for code in (fork_bomb, count_processes)
+    ]
+    bomb, after = run_jobs(jobs)
+    assert bomb["status"] == "ok"
+    assert bomb["actual"] < SANDBOX_MAX_PROCESSES
+    # The worker and the job itself; everything the bomb forked is gone.
+    assert after["actual"] == 2
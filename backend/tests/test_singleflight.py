@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def counting(result=None, error=None, delay=0.05):
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    fn.calls = calls
+    return fn
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    fn = counting({"questions": [1, 2]})
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(fn.calls) == 1
+    assert results == [{"questions": [1, 2]}] * 5
+    # Each caller gets its own copy.
+    results[0]["questions"].append(3)
+    assert results[1] == {"questions": [1, 2]}
+    assert flight.stats() == {"executions": 1, "collapsed": 4, "in_flight": 0}
+
+
+def test_different_keys_and_later_calls_execute_separately():
+    flight = SingleFlight()
+    fn = counting(1)
+
+    async def run():
+        await asyncio.gather(flight.do("a", fn), flight.do("b", fn))
+        await flight.do("a", fn)
+
+    asyncio.run(run())
+    assert len(fn.calls) == 3
+
+
+def test_every_waiter_gets_the_exception():
+    flight = SingleFlight()
+    fn = counting(error=ValueError("boom"))
+
+    async def run():
+        return await asyncio.gather(
+            *(flight.do("k", fn) for _ in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert len(fn.calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_one_caller_cancelling_does_not_cancel_the_others():
+    flight = SingleFlight()
+    fn = counting("done", delay=0.1)
+
+    async def run():
+        first = asyncio.create_task(flight.do("k", fn))
+        second = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+    assert len(fn.calls) == 1
+
+
+def test_work_is_cancelled_once_every_caller_has_gone():
+    flight = SingleFlight()
+    finished = []
+
+    async def fn():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+
+    async def run():
+        caller = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        assert flight.stats()["in_flight"] == 0
+        # A new caller starts over instead of joining the cancelled work.
+        await flight.do("k", counting("again", delay=0))
+        await asyncio.sleep(0.15)
+
+    asyncio.run(run())
+    assert finished == []